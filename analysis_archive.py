@@ -0,0 +1,441 @@
+"""
+Analysis Archive for Kredit Lab
+===============================
+Versioned storage of every analysis of a company, with a "what changed
+since last review" diff by bank and parameter.
+
+Each company (matched on normalized ``company.reg_no``, as in
+``entity_index.py``) has an append-only JSONL log. The first analysis is
+stored in full; later ones are stored as structural deltas against the
+previous version (only the fields that changed), with a full snapshot every
+``snapshot_interval`` versions, or whenever the delta would be large, so any
+version is rebuilt from at most a few deltas.
+
+An analysis whose company has neither a registration number nor a name is
+not archived, since its versions could not be told apart from another
+company's. Logs are re-read from where this process last read them before
+every append (under an exclusive file lock where ``fcntl`` is available), so
+the app and the CLI can write to the same archive.
+
+``diff_analyses(old, new)`` compares two analyses bank by bank and parameter
+by parameter. Pass the result to ``generate_html_report(data, changes=...)``
+to add a "Changes Since Last Review" section after the bank-by-bank summary.
+
+Usage:
+    python analysis_archive.py add archive.jsonl analyses/*.json
+    python analysis_archive.py versions 123456-X
+    python analysis_archive.py diff 123456-X                  # latest vs. the version before it
+    python analysis_archive.py diff 123456-X --old 1 --new 3
+    python analysis_archive.py show 123456-X --version 2 > v2.json
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from analysis_schema import BANK_NAMES, loads, normalize_analysis
+from entity_index import company_key
+from html_generator import CCRIS_PARAM_NAMES, CTOS_PARAM_NAMES
+
+DEFAULT_ARCHIVE_DIR = "analysis_archive"
+SNAPSHOT_INTERVAL = 8
+
+# A delta larger than this fraction of the full analysis is stored as a snapshot instead.
+MAX_DELTA_RATIO = 0.5
+
+_PARAM_FIELDS = ("status", "classification", "criteria", "evidence")
+_BANK_FIELDS = ("final_grade", "raw_grade", "score")
+_CONSOLIDATED_FIELDS = ("final_grade", "raw_grade", "score")
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def analysis_digest(data: Dict) -> str:
+    return hashlib.sha1(_dumps(data).encode("utf-8")).hexdigest()
+
+
+# =============================================================================
+# STRUCTURAL DELTAS
+# =============================================================================
+
+def make_delta(old: Any, new: Any, path: Tuple = ()) -> List[List]:
+    """Operations that turn ``old`` into ``new``: ``["set", path, value]`` and ``["del", path]``.
+
+    Dicts and equal-length lists are compared member by member; anything
+    else that differs is replaced whole.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [["del", [*path, key]] for key in old if key not in new]
+        for key, value in new.items():
+            if key in old:
+                ops.extend(make_delta(old[key], value, (*path, key)))
+            else:
+                ops.append(["set", [*path, key], value])
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for i, (a, b) in enumerate(zip(old, new)):
+            ops.extend(make_delta(a, b, (*path, i)))
+        return ops
+    return [["set", list(path), new]]
+
+
+def apply_delta(doc: Any, ops: List[List]) -> Any:
+    """Apply ``make_delta`` operations to ``doc`` in place; returns the result."""
+    for op in ops:
+        path = op[1]
+        if not path:
+            doc = op[2]
+            continue
+        target = doc
+        for key in path[:-1]:
+            target = target[key]
+        if op[0] == "set":
+            target[path[-1]] = op[2]
+        else:
+            del target[path[-1]]
+    return doc
+
+
+# =============================================================================
+# DIFF
+# =============================================================================
+
+def _changed(old: Dict, new: Dict, fields: Iterable[str]) -> Dict[str, List]:
+    return {f: [old.get(f), new.get(f)] for f in fields if old.get(f) != new.get(f)}
+
+
+def diff_analyses(old: Dict, new: Dict) -> Dict:
+    """What changed from ``old`` to ``new``, by bank and by parameter.
+
+    Parameter changes that are identical across banks (e.g. new CCRIS
+    evidence, which every bank sees) are grouped into one entry listing the
+    banks. Every field change is an ``[old, new]`` pair; the result is plain
+    JSON, so it can be cached and passed to the report renderer.
+    """
+    old, new = normalize_analysis(old), normalize_analysis(new)
+    banks = []
+    parameters: Dict[str, Dict] = {}
+    for bn in BANK_NAMES:
+        ob, nb = old["banks"].get(bn), new["banks"].get(bn)
+        if ob is None or nb is None:
+            if ob is not nb:
+                banks.append({"bank": bn, "changes": {"final_grade": [ob and ob["final_grade"], nb and nb["final_grade"]]}})
+            continue
+        changes = _changed(ob, nb, _BANK_FIELDS)
+        if changes:
+            banks.append({"bank": bn, "changes": changes})
+        for source, key, names in (("CCRIS", "ccris", CCRIS_PARAM_NAMES), ("CTOS", "ctos", CTOS_PARAM_NAMES)):
+            old_params, new_params = ob[key], nb[key]
+            for i in range(max(len(old_params), len(new_params))):
+                op = old_params[i] if i < len(old_params) else {}
+                np_ = new_params[i] if i < len(new_params) else {}
+                changes = _changed(op, np_, _PARAM_FIELDS)
+                if not changes:
+                    continue
+                name = names[i] if i < len(names) else f"{source} Param {i + 1}"
+                group_key = _dumps([source, i, changes])
+                entry = parameters.get(group_key)
+                if entry is None:
+                    entry = parameters[group_key] = {"source": source, "parameter": name, "banks": [],
+                                                     "changes": changes}
+                entry["banks"].append(bn)
+
+    def list_changes(field: str) -> Dict[str, List[str]]:
+        before, after = old[field], new[field]
+        return {"added": [x for x in after if x not in before], "removed": [x for x in before if x not in after]}
+
+    return {
+        "previous_report_date": old["meta"]["report_date"],
+        "report_date": new["meta"]["report_date"],
+        "consolidated": _changed(old["consolidated"], new["consolidated"], _CONSOLIDATED_FIELDS),
+        "banks": banks,
+        "parameters": list(parameters.values()),
+        "strengths": list_changes("strengths"),
+        "attention_items": list_changes("attention_items"),
+    }
+
+
+def has_changes(changes: Dict) -> bool:
+    return bool(changes["consolidated"] or changes["banks"] or changes["parameters"]
+                or any(changes[f]["added"] or changes[f]["removed"] for f in ("strengths", "attention_items")))
+
+
+# =============================================================================
+# ARCHIVE
+# =============================================================================
+
+class AnalysisArchive:
+    """Per-company version logs of full snapshots and structural deltas."""
+
+    def __init__(self, directory: str = DEFAULT_ARCHIVE_DIR, snapshot_interval: int = SNAPSHOT_INTERVAL):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.RLock()
+        # Company key -> version metadata (with each record's file offset), loaded on first use.
+        self._versions: Dict[str, List[Dict]] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+
+    def add(self, data: Dict) -> int:
+        """Archive ``data`` as the company's next version; returns its version number.
+
+        An analysis identical to the company's latest version is not stored
+        again. Returns 0, storing nothing, for a company without a
+        registration number or name.
+        """
+        data = normalize_analysis(data)
+        key = company_key(data["company"])
+        if not key:
+            return 0
+        digest = analysis_digest(data)
+        with self._lock, open(self._path(key), "ab") as f:
+            if fcntl is not None:
+                # Released when the file closes. Another process may have appended since our last read.
+                fcntl.flock(f, fcntl.LOCK_EX)
+            versions = self._load(key)
+            if versions and versions[-1]["digest"] == digest:
+                return versions[-1]["version"]
+            number = len(versions) + 1
+            full = _dumps(data)
+            record = {"version": number, "report_date": data["meta"]["report_date"],
+                      "analysis_date": data["meta"]["analysis_date"], "digest": digest,
+                      "full_bytes": len(full.encode("utf-8"))}
+            since_snapshot = next((number - v["version"] for v in reversed(versions) if v["snapshot"]), number)
+            if versions and since_snapshot < self.snapshot_interval:
+                delta = make_delta(self._get(key, versions[-1]["version"]), data)
+                encoded = _dumps(delta)
+                if len(encoded) <= len(full) * MAX_DELTA_RATIO:
+                    record["delta"] = delta
+            if "delta" not in record:
+                record["snapshot"] = data
+            line = (_dumps(record) + "\n").encode("utf-8")
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+            f.flush()
+            versions.append(self._meta(record, offset, len(line)))
+            return number
+
+    def add_many(self, analyses: Iterable[Dict]) -> int:
+        """Archive several analyses in order; returns how many were stored."""
+        stored = 0
+        with self._lock:
+            for data in analyses:
+                data = normalize_analysis(data)
+                key = company_key(data["company"])
+                if not key:
+                    continue
+                before = len(self._load(key))
+                stored += self.add(data) > before
+        return stored
+
+    # -------------------------------------------------------------------------
+    # Reading
+    # -------------------------------------------------------------------------
+
+    def versions(self, company: Any) -> List[Dict]:
+        """Version metadata for a company (an analysis, a ``company`` dict, or a registration number)."""
+        with self._lock:
+            return [{k: v for k, v in meta.items() if k != "offset"} for meta in self._load(self._key(company))]
+
+    def get(self, company: Any, version: Optional[int] = None) -> Optional[Dict]:
+        """Rebuild a version (the latest by default); None if it does not exist."""
+        key = self._key(company)
+        with self._lock:
+            versions = self._load(key)
+            if not versions:
+                return None
+            version = versions[-1]["version"] if version is None else version
+            if not 1 <= version <= len(versions):
+                return None
+            return self._get(key, version)
+
+    def previous(self, data: Dict) -> Optional[Dict]:
+        """The version reviewed before ``data``.
+
+        If ``data`` is archived, that is the version before it; otherwise it is
+        the company's latest version.
+        """
+        data = normalize_analysis(data)
+        key = company_key(data["company"])
+        digest = analysis_digest(data)
+        with self._lock:
+            versions = self._load(key)
+            for meta in reversed(versions):
+                if meta["digest"] == digest:
+                    return self._get(key, meta["version"] - 1) if meta["version"] > 1 else None
+            return self._get(key, versions[-1]["version"]) if versions else None
+
+    def changes_since_previous(self, data: Dict) -> Optional[Dict]:
+        """``diff_analyses`` against the previous review, or None if this is the first."""
+        previous = self.previous(data)
+        return None if previous is None else diff_analyses(previous, data)
+
+    def stats(self) -> Dict[str, int]:
+        """Companies, versions, and bytes stored compared with storing every version in full."""
+        with self._lock:
+            keys = [self._key_for_file(name) for name in os.listdir(self.directory) if name.endswith(".jsonl")]
+            keys = [key for key in keys if key]
+            versions = [meta for key in keys for meta in self._load(key)]
+        return {
+            "companies": len(keys),
+            "versions": len(versions),
+            "snapshots": sum(1 for meta in versions if meta["snapshot"]),
+            "stored_bytes": sum(meta["bytes"] for meta in versions),
+            "full_bytes": sum(meta["full_bytes"] for meta in versions),
+        }
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _key(company: Any) -> str:
+        if isinstance(company, str):
+            return company_key({"reg_no": company})
+        return company_key(company.get("company", company))
+
+    def _path(self, key: str) -> str:
+        # Readable prefix plus a hash, so distinct keys never share a file.
+        label = re.sub(r"[^0-9A-Za-z]+", "_", key.split(":", 1)[1])[:40]
+        return os.path.join(self.directory, f"{label}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}.jsonl")
+
+    def _key_for_file(self, name: str) -> str:
+        with open(os.path.join(self.directory, name), "rb") as f:
+            line = f.readline()
+        return company_key(loads(line)["snapshot"]["company"]) if line.endswith(b"\n") else ""
+
+    @staticmethod
+    def _meta(record: Dict, offset: int, size: int) -> Dict:
+        return {"version": record["version"], "report_date": record["report_date"],
+                "analysis_date": record["analysis_date"], "digest": record["digest"],
+                "snapshot": "snapshot" in record, "offset": offset, "bytes": size,
+                "full_bytes": record["full_bytes"]}
+
+    def _load(self, key: str) -> List[Dict]:
+        # Caller holds the lock. Reads whatever was appended to the log since the last call.
+        if not key:
+            return []
+        versions = self._versions.setdefault(key, [])
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            size = 0
+        end = versions[-1]["offset"] + versions[-1]["bytes"] if versions else 0
+        if size < end:
+            # The log was replaced; start over.
+            versions.clear()
+            end = 0
+        if size > end:
+            with open(path, "rb") as f:
+                f.seek(end)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # another process is still writing this record
+                    versions.append(self._meta(loads(line), end, len(line)))
+                    end += len(line)
+        return versions
+
+    def _get(self, key: str, version: int) -> Dict:
+        # Caller holds the lock. Reads the nearest snapshot at or before ``version``, then its deltas.
+        versions = self._versions[key]
+        start = version
+        while not versions[start - 1]["snapshot"]:
+            start -= 1
+        with open(self._path(key), "rb") as f:
+            f.seek(versions[start - 1]["offset"])
+            doc = loads(f.readline())["snapshot"]
+            for _ in range(start, version):
+                doc = apply_delta(doc, loads(f.readline())["delta"])
+        return doc
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Versioned archive of Kredit Lab analyses.")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_DIR,
+                        help=f"Archive directory (default: {DEFAULT_ARCHIVE_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    add = sub.add_parser("add", help="Archive JSONL files or JSON analyses, in order")
+    add.add_argument("paths", nargs="+")
+    versions = sub.add_parser("versions", help="List a company's versions")
+    versions.add_argument("reg_no")
+    show = sub.add_parser("show", help="Print a version as JSON")
+    show.add_argument("reg_no")
+    show.add_argument("--version", type=int)
+    diff = sub.add_parser("diff", help="Changes between two versions (default: the last two)")
+    diff.add_argument("reg_no")
+    diff.add_argument("--old", type=int)
+    diff.add_argument("--new", type=int)
+    sub.add_parser("stats", help="Storage used compared with full copies")
+
+    args = parser.parse_args(argv)
+    archive = AnalysisArchive(args.archive)
+
+    if args.command == "add":
+        def analyses():
+            for path in args.paths:
+                with open(path, "rb") as f:
+                    if path.endswith(".jsonl"):
+                        yield from (loads(line) for line in f if line.strip())
+                    else:
+                        yield loads(f.read())
+        print(f"Archived {archive.add_many(analyses())} new versions ({json.dumps(archive.stats())})")
+        return 0
+    if args.command == "stats":
+        print(json.dumps(archive.stats(), indent=2))
+        return 0
+
+    history = archive.versions(args.reg_no)
+    if not history:
+        print(f"No archived analyses for {args.reg_no}", file=sys.stderr)
+        return 1
+    if args.command == "versions":
+        for meta in history:
+            kind = "snapshot" if meta["snapshot"] else "delta"
+            print(f"v{meta['version']}  report {meta['report_date']}  {kind:8}  {meta['bytes']} bytes")
+    elif args.command == "show":
+        version = archive.get(args.reg_no, args.version)
+        if version is None:
+            print(f"No version {args.version} for {args.reg_no}", file=sys.stderr)
+            return 1
+        print(json.dumps(version, indent=2, ensure_ascii=False))
+    else:
+        new_version = args.new or history[-1]["version"]
+        old_version = args.old or new_version - 1
+        if old_version < 1:
+            print(f"{args.reg_no} has no version before v{new_version}", file=sys.stderr)
+            return 1
+        old, new = archive.get(args.reg_no, old_version), archive.get(args.reg_no, new_version)
+        if old is None or new is None:
+            print(f"{args.reg_no} has versions 1-{len(history)}", file=sys.stderr)
+            return 1
+        print(json.dumps(diff_analyses(old, new), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
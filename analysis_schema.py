@@ -0,0 +1,320 @@
+"""
+Analysis Schema for Kredit Lab
+==============================
+Single-pass parsing and validation of uploaded analysis JSON.
+
+The schema implied by ``sample_analysis_output.json`` is compiled once, at
+import, into a tree of checker functions. Validation walks the document
+once, collects every structural error, and returns a normalized copy in
+which every field the renderer reads is present with a valid value, so the
+renderer can index it directly.
+
+If ``orjson`` is installed it is used to parse straight from the uploaded
+bytes; otherwise the standard ``json`` module is used.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import perf
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+SUPPORTED_SCHEMA_MAJOR = "1"
+
+# Order matters: scoring.py uses the list index as the integer code, and
+# index 0 is the fallback for unknown values.
+CLASSIFICATIONS = ["Not Applicable", "Strict 1", "Strict 2", "Preference", "Informational"]
+STATUSES = ["N/A", "PASS", "FAIL", "INFO"]
+GRADES = ["A", "B", "C", "D", "E"]
+BANK_NAMES = ["RHB", "Maybank", "CIMB", "Standard Chartered", "SME Bank", "Bank Rakyat"]
+
+
+class AnalysisValidationError(ValueError):
+    """Raised when an analysis does not match the schema; ``errors`` lists every problem."""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} schema error(s): " + "; ".join(errors[:5])
+                         + (" ..." if len(errors) > 5 else ""))
+
+
+class NormalizedAnalysis(dict):
+    """An analysis dict that has already been through ``validate_analysis``."""
+
+
+class _KeepInvalid(list):
+    """An error list that asks leaf rules to keep invalid values instead of substituting defaults."""
+
+
+# =============================================================================
+# SCHEMA COMPILER
+# =============================================================================
+
+# A rule knows how to check one value: ``check(value, path, errors)`` returns
+# the normalized value, and ``default()`` builds the value used when a key is
+# missing. Leaf rules also carry ``test``, a Python expression over ``v`` that
+# is true for valid values, so object rules can inline it in generated code
+# and only call ``check`` on the error path. Paths are (parent, key) chains
+# that are only formatted when an error is reported. Leaf checks return the
+# invalid value itself, rather than the default, when ``errors`` is a
+# ``_KeepInvalid`` list.
+
+
+class _Rule:
+    __slots__ = ("check", "default", "test", "const")
+
+    def __init__(self, check: Callable[[Any, tuple, List[str]], Any], default: Callable[[], Any],
+                 test: Optional[str] = None, const: Any = None):
+        self.check = check
+        self.default = default
+        self.test = test
+        self.const = const
+
+
+def _format_path(path: tuple) -> str:
+    keys = []
+    while path:
+        path, key = path
+        keys.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+    return "".join(reversed(keys)).lstrip(".") or "analysis"
+
+
+def _error(errors: List[str], path: tuple, message: str) -> None:
+    errors.append(f"{_format_path(path)}: {message}")
+
+
+def _type_name(value: Any) -> str:
+    return type(value).__name__
+
+
+def _string(default: Optional[str]) -> _Rule:
+    # A field whose default is None is optional, so an explicit null is valid too.
+    nullable = default is None
+
+    def check(value, path, errors):
+        if isinstance(value, str) or (nullable and value is None):
+            return value
+        _error(errors, path, f"expected a string{' or null' if nullable else ''}, got {_type_name(value)}")
+        return value if errors.__class__ is _KeepInvalid else default
+    return _Rule(check, lambda: default, "(v is None or v.__class__ is str)" if nullable else "v.__class__ is str")
+
+
+def _number(default: float = 0, integer: bool = False) -> _Rule:
+    wanted = "an integer" if integer else "a number"
+    accepted = int if integer else (int, float)
+
+    def check(value, path, errors):
+        if isinstance(value, accepted) and not isinstance(value, bool):
+            return value
+        _error(errors, path, f"expected {wanted}, got {_type_name(value)}")
+        return value if errors.__class__ is _KeepInvalid else default
+    test = "v.__class__ is int" if integer else "(v.__class__ is int or v.__class__ is float)"
+    return _Rule(check, lambda: default, test)
+
+
+def _choice(choices: List[str], default: str) -> _Rule:
+    allowed = frozenset(choices)
+    listed = ", ".join(choices)
+
+    def check(value, path, errors):
+        if isinstance(value, str) and value in allowed:
+            return value
+        _error(errors, path, f"expected one of {listed}, got {value!r}")
+        return value if errors.__class__ is _KeepInvalid else default
+    return _Rule(check, lambda: default, "v.__class__ is str and v in {const}", allowed)
+
+
+def _list(item: _Rule) -> _Rule:
+    item_check = item.check
+
+    def check(value, path, errors):
+        if not isinstance(value, list):
+            _error(errors, path, f"expected a list, got {_type_name(value)}")
+            return []
+        return [item_check(v, (path, i), errors) for i, v in enumerate(value)]
+    return _Rule(check, list)
+
+
+def _object(fields: Dict[str, _Rule], required: Tuple[str, ...] = ()) -> _Rule:
+    """Compile an object rule into a generated function with leaf checks inlined.
+
+    Unknown keys are passed through untouched.
+    """
+    namespace: Dict[str, Any] = {"_error": _error, "_type_name": _type_name, "_MISSING": object()}
+    lines = [
+        "def check(value, path, errors):",
+        "    if value.__class__ is not dict:",
+        "        if not isinstance(value, dict):",
+        "            _error(errors, path, f'expected an object, got {_type_name(value)}')",
+        "            value = {}",
+        "    out = dict(value)",
+    ]
+    for i, (key, rule) in enumerate(fields.items()):
+        namespace.update({f"K{i}": key, f"C{i}": rule.check, f"D{i}": rule.default, f"T{i}": rule.const})
+        lines.append(f"    v = value.get(K{i}, _MISSING)")
+        lines.append("    if v is _MISSING:")
+        if key in required:
+            lines.append(f"        _error(errors, (path, K{i}), 'required')")
+        lines.append(f"        out[K{i}] = D{i}()")
+        if rule.test is not None:
+            lines.append(f"    elif not ({rule.test.format(const=f'T{i}')}):")
+        else:
+            lines.append("    else:")
+        lines.append(f"        out[K{i}] = C{i}(v, (path, K{i}), errors)")
+    lines.append("    return out")
+    exec("\n".join(lines), namespace)
+
+    def default():
+        return {key: rule.default() for key, rule in fields.items()}
+    return _Rule(namespace["check"], default)
+
+
+def _keyed(keys: List[str], item: _Rule) -> _Rule:
+    """An object whose keys must come from ``keys``; values all follow ``item``."""
+    allowed = frozenset(keys)
+    listed = ", ".join(keys)
+    item_check = item.check
+
+    def check(value, path, errors):
+        if not isinstance(value, dict):
+            _error(errors, path, f"expected an object, got {_type_name(value)}")
+            return {}
+        out = {}
+        for key, v in value.items():
+            if key not in allowed:
+                _error(errors, (path, key), f"unknown bank (expected one of {listed})")
+                continue
+            out[key] = item_check(v, (path, key), errors)
+        return out
+    return _Rule(check, dict)
+
+
+def _check_schema_version(value, path, errors):
+    if not isinstance(value, str) or value.split(".")[0] != SUPPORTED_SCHEMA_MAJOR:
+        _error(errors, path, f"unsupported schema version {value!r} (expected {SUPPORTED_SCHEMA_MAJOR}.x)")
+    return value
+
+
+# =============================================================================
+# SCHEMA
+# =============================================================================
+
+_COUNTS = {
+    f"{prefix}_{kind}": _number(0, integer=True)
+    for prefix in ("strict1", "strict2", "preference") for kind in ("pass", "total")
+}
+
+_PARAMETER = _object({
+    "classification": _choice(CLASSIFICATIONS, "Not Applicable"),
+    "status": _choice(STATUSES, "N/A"),
+    "criteria": _string("—"),
+    "evidence": _string("—"),
+})
+
+_BANK = _object({
+    "score": _number(0),
+    "raw_grade": _choice(GRADES, "C"),
+    "final_grade": _choice(GRADES, "C"),
+    **_COUNTS,
+    "ccris": _list(_PARAMETER),
+    "ctos": _list(_PARAMETER),
+})
+
+_ANALYSIS = _object({
+    "_schema_version": _Rule(_check_schema_version, lambda: f"{SUPPORTED_SCHEMA_MAJOR}.0"),
+    "company": _object({
+        "name": _string(None),
+        "reg_no": _string("N/A"),
+    }),
+    "meta": _object({
+        "report_date": _string("N/A"),
+        "analysis_date": _string(None),
+        "prepared_by": _string("Kredit Lab System"),
+    }),
+    "entities": _list(_object({
+        "type": _string("Director"),
+        "name": _string("N/A"),
+        "ic": _string("N/A"),
+        "shareholding": _string("—"),
+    })),
+    "banks": _keyed(BANK_NAMES, _BANK),
+    "consolidated": _object({
+        "score": _number(0),
+        "raw_grade": _choice(GRADES, "C"),
+        "final_grade": _choice(GRADES, "C"),
+        **_COUNTS,
+        "explanation": _string(""),
+    }),
+    "critical_findings": _list(_string("")),
+    "strengths": _list(_string("")),
+    "attention_items": _list(_string("")),
+}, required=("company", "banks"))
+
+# A bank that is missing from the analysis, as the renderer should show it.
+EMPTY_BANK: Dict = _BANK.default()
+
+
+# =============================================================================
+# PUBLIC API
+# =============================================================================
+
+def validate_analysis(data: Any) -> Tuple[NormalizedAnalysis, List[str]]:
+    """Validate an analysis in one pass.
+
+    Returns the normalized analysis (invalid values replaced by their
+    defaults) and the list of every structural error found.
+    """
+    errors: List[str] = []
+    normalized = _ANALYSIS.check(data, (), errors)
+    return NormalizedAnalysis(normalized), errors
+
+
+def normalize_analysis(data: Any) -> NormalizedAnalysis:
+    """Return ``data`` in normalized form, substituting defaults for anything invalid."""
+    if isinstance(data, NormalizedAnalysis):
+        return data
+    return validate_analysis(data)[0]
+
+
+def fill_missing(data: Any) -> Dict:
+    """Return ``data`` with defaults for missing fields only; present values are kept even if invalid.
+
+    This is what the renderer uses, so a dict that never went through
+    ``parse_analysis`` shows its own values (a grade of "B+" stays "B+")
+    rather than made-up defaults. JSON null counts as missing for the
+    optional ``company.name`` and ``meta.analysis_date``.
+    """
+    if isinstance(data, NormalizedAnalysis):
+        return data
+    return _ANALYSIS.check(data, (), _KeepInvalid())
+
+
+def loads(raw: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON, straight from bytes when the fast backend is available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    if isinstance(raw, memoryview):
+        raw = raw.tobytes()
+    return json.loads(raw)
+
+
+def parse_analysis(raw: Union[bytes, bytearray, memoryview, str]) -> NormalizedAnalysis:
+    """Parse and validate an uploaded analysis.
+
+    Raises ``json.JSONDecodeError`` for malformed JSON and
+    ``AnalysisValidationError`` listing every schema error otherwise.
+    """
+    if not perf.enabled():
+        normalized, errors = validate_analysis(loads(raw))
+    else:
+        with perf.phase("parse.decode", len(raw)):
+            decoded = loads(raw)
+        with perf.phase("parse.validate"):
+            normalized, errors = validate_analysis(decoded)
+    if errors:
+        raise AnalysisValidationError(errors)
+    return normalized
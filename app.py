@@ -11,8 +11,21 @@ Usage:
 
 import streamlit as st
 import json
+import os
+import tempfile
+import weakref
+import zipfile
 from datetime import datetime
-from html_generator import generate_html_report
+import perf
+from analysis_archive import DEFAULT_ARCHIVE_DIR, AnalysisArchive, has_changes
+from analysis_schema import BANK_NAMES, STATUSES, AnalysisValidationError
+from functools import partial
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from entity_index import DEFAULT_INDEX_FILE, EntityIndex
+from html_generator import CCRIS_PARAM_NAMES, CTOS_PARAM_NAMES, report_filename
+from render_pool import DEFAULT_FRAGMENT_DIR, PoolFull, RenderPool, parse_upload, render_report, render_upload
+from report_cache import DEFAULT_CACHE_DIR, ReportCache
+from search_index import DEFAULT_INDEX_DIR, FIELDS, SearchIndex
 
 # =============================================================================
 # PAGE CONFIGURATION
@@ -25,6 +38,292 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# =============================================================================
+# REPORT CACHE
+# =============================================================================
+
+@st.cache_resource
+def get_report_cache() -> ReportCache:
+    """One report cache per server process, shared by every session."""
+    return ReportCache(os.environ.get("KREDITLAB_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+
+@st.cache_resource
+def get_entity_index() -> EntityIndex:
+    """Directors/shareholders of every uploaded analysis, for finding linked companies."""
+    return EntityIndex(os.environ.get("KREDITLAB_ENTITY_INDEX", DEFAULT_INDEX_FILE))
+
+
+@st.cache_resource
+def get_search_index() -> SearchIndex:
+    """Full-text index over the evidence and findings of every uploaded analysis."""
+    return SearchIndex(os.environ.get("KREDITLAB_SEARCH_INDEX", DEFAULT_INDEX_DIR))
+
+
+@st.cache_resource
+def get_analysis_archive() -> AnalysisArchive:
+    """Every uploaded analysis, versioned per company, for "what changed since last review"."""
+    return AnalysisArchive(os.environ.get("KREDITLAB_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR))
+
+
+@st.cache_resource
+def get_render_pool() -> RenderPool:
+    """Worker processes that parse and render for every session, queued fairly between sessions."""
+    workers = os.environ.get("KREDITLAB_RENDER_WORKERS")
+    max_queued = os.environ.get("KREDITLAB_RENDER_QUEUE")
+    return RenderPool(int(workers) if workers else None, int(max_queued) if max_queued else None,
+                      os.environ.get("KREDITLAB_FRAGMENT_DIR", DEFAULT_FRAGMENT_DIR))
+
+METRICS_FILE = os.environ.get("KREDITLAB_METRICS_FILE", perf.DEFAULT_METRICS_FILE)
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+def render_bank_cards(banks: dict) -> None:
+    """Show one grade card per bank; ``banks`` maps bank name to its final_grade and score."""
+    bank_cols = st.columns(6)
+    for i, (bank_name, bank_data) in enumerate(banks.items()):
+        with bank_cols[i % 6]:
+            grade = bank_data['final_grade']
+            score = bank_data['score']
+            st.markdown(f"""
+            <div style="text-align: center; padding: 1rem; border-radius: 0.5rem; background: #f1f5f9; margin: 0.5rem 0;">
+                <div style="font-size: 0.8rem; color: #64748b;">{bank_name}</div>
+                <div style="font-size: 2rem; font-weight: 700;">{grade}</div>
+                <div style="font-size: 0.8rem; color: #64748b;">{score}%</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+
+def session_id() -> str:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "default"
+
+
+class TempFile:
+    """A file that is deleted by ``remove()``, when this object is garbage-collected
+    (its session's state is dropped), or at exit, whichever comes first."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._finalizer = weakref.finalize(self, _unlink, path)
+
+    def remove(self) -> None:
+        self._finalizer()
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard_batch() -> None:
+    """Forget this session's batch and delete its ZIP."""
+    batch = st.session_state.pop('batch', None)
+    if batch is not None:
+        batch['zip'].remove()
+
+
+def record_timings() -> bool:
+    """This session's "Record timings" choice; ``KREDITLAB_PERF`` sets the default."""
+    return st.session_state.get("record_timings", perf.ENABLED)
+
+
+def wait_for_job(job, action: str):
+    """Block on a render pool job, showing whether it is queued or running.
+
+    Polling keeps the script interruptible: if the user uploads another file
+    meanwhile, Streamlit stops this run and the job is cancelled.
+    """
+    pool = get_render_pool()
+    status = st.empty()
+    try:
+        while not job.wait(0.1):
+            if job.status == "queued":
+                status.caption(f"⏳ Queued behind {pool.position(job)} other jobs ({job.wait_seconds:.1f}s)...")
+            else:
+                status.caption(f"⚙️ {action}...")
+        return job.result()
+    except BaseException:
+        pool.cancel(job.session, job.tag)
+        raise
+    finally:
+        status.empty()
+
+
+def render_in_pool(session: str, data: dict, mode: str = "static", fragment_log: dict = None,
+                   show_status: bool = False, **context) -> str:
+    """Report cache ``render`` callable that renders on the shared worker pool.
+
+    Without ``show_status`` (e.g. on the download thread) it waits for room in
+    the queue instead of failing.
+    """
+    job = get_render_pool().submit(session, render_report, data, mode, context, perf.enabled(),
+                                   tag="render", block=not show_status)
+    html, log, run = wait_for_job(job, "Rendering report") if show_status else job.result()
+    perf.merge(run)
+    if fragment_log is not None:
+        fragment_log.update(log)
+    return html
+
+
+def render_uploads(files: list) -> dict:
+    """Render several uploads on the worker pool, adding each report to a ZIP on disk as it finishes."""
+    pool, session = get_render_pool(), session_id()
+    progress = st.progress(0.0, text=f"Rendering 0/{len(files)} reports...")
+    results, analyses = [], []
+    fd, zip_path = tempfile.mkstemp(prefix="kreditlab_", suffix=".zip")
+    zip_file = TempFile(zip_path)
+    with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as archive, \
+            tempfile.TemporaryDirectory(prefix="kreditlab_") as out_dir:
+        pending, running = list(files), []
+        try:
+            while pending or running:
+                # At most one job per worker in flight, so a big batch leaves queue room for other sessions.
+                while pending and len(running) < pool.workers:
+                    f = pending.pop(0)
+                    running.append(pool.submit(session, render_upload, f.name, f.getvalue(), out_dir,
+                                               tag="upload", block=True))
+                job = running[0]
+                if not job.wait(0.1):
+                    queued = sum(j.status == "queued" for j in running)
+                    progress.progress(len(results) / len(files),
+                                      text=f"Rendering {len(results)}/{len(files)} reports"
+                                           + (f" ({queued} queued)..." if queued else "..."))
+                    continue
+                running.pop(0)
+                result, data = job.result()
+                if result.output:
+                    # Each report is removed once archived, so the renderer can reuse a name already in the ZIP.
+                    stem, ext = os.path.splitext(os.path.basename(result.output))
+                    arcname, n = stem + ext, 1
+                    while arcname in archive.NameToInfo:
+                        n += 1
+                        arcname = f"{stem}_{n}{ext}"
+                    archive.write(result.output, arcname=arcname)
+                    os.remove(result.output)
+                    result.output = arcname
+                if data is not None:
+                    analyses.append(data)
+                results.append(result)
+                progress.progress(len(results) / len(files), text=f"Rendering {len(results)}/{len(files)} reports...")
+        except BaseException:
+            pool.cancel(session, "upload")
+            zip_file.remove()
+            raise
+    progress.empty()
+    get_entity_index().ingest(analyses)
+    get_search_index().ingest(analyses)
+    get_analysis_archive().add_many(analyses)
+    results.sort(key=lambda r: r.source)
+    return {"results": results, "zip": zip_file}
+
+
+def read_report(session: str, data: dict, mode: str, context: dict = None, timed: bool = False) -> bytes:
+    """Report bytes for the download button, read from the report cache's file on disk.
+
+    Runs on its own thread when the button is clicked, so nothing is rendered or
+    sent to the browser until then; ``timed`` carries the session's timing choice there.
+    """
+    perf.enable_thread(timed)
+    with perf.phase("app.download") as timer:
+        html = get_report_cache().get_or_render_bytes(
+            data, render=partial(render_in_pool, session), mode=mode, context=context)
+        timer.nbytes = len(html)
+    return html
+
+
+@st.fragment
+def render_report_actions(data: dict) -> None:
+    """Format choice, download, and preview; their widgets rerun only this fragment."""
+    perf.enable_thread(record_timings())
+    report_mode = st.radio(
+        "Report format",
+        ["lazy", "static"],
+        format_func=lambda m: "Interactive (smaller, bank tables built on click)" if m == "lazy"
+                              else "Static (all tables pre-rendered, for archiving)",
+        horizontal=True,
+    )
+    context = {}
+    changes = get_analysis_archive().changes_since_previous(data)
+    if changes and has_changes(changes):
+        if st.checkbox(f"🔄 Include changes since the last review ({changes['previous_report_date']}): "
+                       f"{len(changes['parameters'])} parameter changes, {len(changes['banks'])} banks regraded or rescored"):
+            context["changes"] = changes
+    links = get_entity_index().linked_companies(data)
+    if links:
+        if st.checkbox(f"🔗 Include {len(links)} linked companies (sharing a director or shareholder) in the report"):
+            context["linked_companies"] = links
+    context = context or None
+    st.download_button(
+        label="📥 Download HTML Report",
+        data=partial(read_report, session_id(), data, report_mode, context, record_timings()),
+        file_name=report_filename(data),
+        mime="text/html",
+        on_click="ignore",
+        help="Click to download the complete HTML report"
+    )
+
+    # The preview is rendered and sent only while the expander is open.
+    preview = st.expander("👁️ Preview Report", key="preview_open", on_change="rerun")
+    if preview.open:
+        with preview, perf.phase("app.preview") as timer:
+            fragment_log = {}
+            render = partial(render_in_pool, session_id(), fragment_log=fragment_log, show_status=True)
+            try:
+                html = get_report_cache().get_or_render(data, render=render, mode="lazy", context=context)
+            except PoolFull:
+                st.warning("⏳ The server is busy rendering other reports. Please reopen the preview in a moment.")
+                return
+            reused = sum(fragment_log.values())
+            if reused:
+                st.caption(f"♻️ Reused {reused} of {len(fragment_log)} report sections from a previous upload")
+            st.components.v1.html(html, height=800, scrolling=True)
+            if perf.enabled():
+                timer.nbytes = perf.text_bytes(html)
+
+
+@st.fragment
+def render_search() -> None:
+    """Search the evidence and findings of past uploads; typing reruns only this fragment."""
+    perf.enable_thread(record_timings())
+    index = get_search_index()
+    query = st.text_input("Search evidence and findings", placeholder='e.g. HSLNFNCE arrears, "R&R", AKPK, HSL*')
+    col1, col2, col3, col4 = st.columns(4)
+    bank = col1.selectbox("Bank", [None, *BANK_NAMES], format_func=lambda v: v or "Any bank")
+    parameter = col2.selectbox("Parameter", [None, *CCRIS_PARAM_NAMES, *CTOS_PARAM_NAMES],
+                               format_func=lambda v: v or "Any parameter")
+    status = col3.selectbox("Status", [None, *STATUSES], format_func=lambda v: v or "Any status")
+    field = col4.selectbox("Field", [None, *FIELDS], format_func=lambda v: v.title() if v else "Any field")
+    if not query:
+        stats = index.stats()
+        st.caption(f"{stats['analyses']} analyses indexed ({stats['documents']} searchable entries)")
+        return
+    with perf.phase("app.search"):
+        results = index.search(query, bank=bank, parameter=parameter, status=status, field=field, limit=50)
+    if not results:
+        st.info("No matches")
+        return
+    st.dataframe([
+        {
+            "Company": r['company'] or "N/A",
+            "Report Date": r['report_date'] or "",
+            "Bank": r['bank'] or "",
+            "Parameter": r['parameter'] or r['field'].title(),
+            "Status": r['status'] or "",
+            "Text": r['text'],
+            "Score": r['score'],
+        }
+        for r in results
+    ], hide_index=True)
+
 # =============================================================================
 # CUSTOM CSS
 # =============================================================================
@@ -128,6 +427,34 @@ with st.sidebar:
     - Bank Rakyat
     """)
     
+    st.markdown("---")
+    with st.expander("🗄️ Report Cache"):
+        cache_stats = get_report_cache().stats()
+        st.caption(
+            f"Hits: {cache_stats['memory_hits']} memory / {cache_stats['disk_hits']} disk  \n"
+            f"Misses: {cache_stats['misses']}  \n"
+            f"Evictions: {cache_stats['memory_evictions']} memory / {cache_stats['disk_evictions']} disk, "
+            f"{cache_stats['expired']} expired  \n"
+            f"Size: {cache_stats['memory_items']} in memory, {cache_stats['disk_bytes'] / 1e6:.1f} MB on disk"
+        )
+
+    with st.expander("🧵 Render Queue"):
+        pool_stats = get_render_pool().stats()
+        st.caption(
+            f"Workers: {pool_stats['running']}/{pool_stats['workers']} busy  \n"
+            f"Queued: {pool_stats['queued']} (limit {pool_stats['max_queued']}), "
+            f"{pool_stats['rejected']} turned away  \n"
+            f"Wait: {pool_stats['p95_wait_seconds'] * 1000:.0f} ms p95, "
+            f"{pool_stats['max_wait_seconds'] * 1000:.0f} ms max  \n"
+            f"Jobs: {pool_stats['completed']} done, {pool_stats['failed']} failed, "
+            f"{pool_stats['cancelled']} cancelled"
+        )
+
+    with st.expander("⏱️ Performance"):
+        if st.checkbox("Record timings", value=perf.ENABLED, key="record_timings",
+                       help="Time each upload, parse, render and preview phase of this session."):
+            st.caption(f"Cumulative counters are written to `{METRICS_FILE}` (Prometheus text format)")
+
     st.markdown("---")
     st.markdown("v1.0 | No API Key Needed! ✅")
 
@@ -182,25 +509,47 @@ st.markdown("---")
 
 st.markdown("### 📤 Upload JSON Analysis")
 
-uploaded_file = st.file_uploader(
+perf.enable_thread(record_timings())
+perf_run = perf.begin_capture()
+
+uploaded_files = st.file_uploader(
     "Upload the JSON file from Claude's analysis",
     type=["json"],
-    help="This is the JSON output that Claude provides after analyzing an Experian PDF"
+    accept_multiple_files=True,
+    help="This is the JSON output that Claude provides after analyzing an Experian PDF. "
+         "Upload several files to render them all at once."
 )
 
-if uploaded_file:
+if len(uploaded_files) == 1:
+    uploaded_file = uploaded_files[0]
+    discard_batch()
     try:
-        json_content = uploaded_file.read().decode('utf-8')
-        analysis_data = json.loads(json_content)
-        
-        if "company" not in analysis_data or "banks" not in analysis_data:
-            st.error("❌ Invalid JSON structure. Make sure it's from Claude's Kredit Lab analysis.")
-            st.stop()
+        # Reruns with the same upload reuse the parsed analysis.
+        if st.session_state.get('analysis_key') != uploaded_file.file_id:
+            st.session_state.pop('analysis_data', None)
+            with perf.phase("app.read_upload", uploaded_file.size):
+                raw = uploaded_file.getvalue()
+            # Anything still queued or running for the previous upload is no longer wanted.
+            get_render_pool().cancel(session_id())
+            job = get_render_pool().submit(session_id(), parse_upload, raw, perf.enabled(), tag="upload")
+            analysis_data, parse_run = wait_for_job(job, "Reading analysis")
+            perf.merge(parse_run)
+            st.session_state['analysis_data'] = analysis_data
+            st.session_state['analysis_key'] = uploaded_file.file_id
+            get_entity_index().add(analysis_data)
+            get_search_index().ingest([analysis_data])
+            get_analysis_archive().add(analysis_data)
+            st.session_state['company_name'] = analysis_data['company']['name'] or 'Unknown'
         
         st.markdown('<div class="success-box">✅ <strong>JSON loaded successfully!</strong></div>', unsafe_allow_html=True)
-        st.session_state['analysis_data'] = analysis_data
-        st.session_state['company_name'] = analysis_data.get('company', {}).get('name', 'Unknown')
         
+    except PoolFull:
+        st.warning("⏳ The server is busy rendering other reports. Please try again in a moment.")
+        st.stop()
+    except AnalysisValidationError as e:
+        st.error("❌ Invalid JSON structure. Make sure it's from Claude's Kredit Lab analysis.")
+        st.markdown("\n".join(f"- `{error}`" for error in e.errors))
+        st.stop()
     except json.JSONDecodeError as e:
         st.error(f"❌ Invalid JSON file: {str(e)}")
         st.stop()
@@ -208,6 +557,18 @@ if uploaded_file:
         st.error(f"❌ Error reading file: {str(e)}")
         st.stop()
 
+elif uploaded_files:
+    st.session_state.pop('analysis_data', None)
+    st.session_state.pop('analysis_key', None)
+    # Reruns triggered by other widgets reuse the finished batch instead of rendering again.
+    batch_key = tuple(f.file_id for f in uploaded_files)
+    # Not bound to a module-level name, which cached functions would keep alive after the session ends.
+    if st.session_state.get('batch', {}).get('key') != batch_key:
+        discard_batch()
+        get_render_pool().cancel(session_id())
+        with perf.phase("app.render_batch", sum(f.size for f in uploaded_files)):
+            st.session_state['batch'] = dict(render_uploads(uploaded_files), key=batch_key)
+
 # =============================================================================
 # RESULTS & DOWNLOAD
 # =============================================================================
@@ -218,18 +579,18 @@ if 'analysis_data' in st.session_state:
     st.markdown("### 📊 Analysis Summary")
     
     data = st.session_state['analysis_data']
-    company = data.get('company', {})
-    consolidated = data.get('consolidated', {})
+    company = data['company']
+    consolidated = data['consolidated']
     
     st.markdown(f"""
     <div class="info-box">
-        <strong>Company:</strong> {company.get('name', 'N/A')}<br>
-        <strong>Registration:</strong> {company.get('reg_no', 'N/A')}
+        <strong>Company:</strong> {company['name'] or 'N/A'}<br>
+        <strong>Registration:</strong> {company['reg_no']}
     </div>
     """, unsafe_allow_html=True)
     
     # Grade display
-    final_grade = consolidated.get('final_grade', 'C')
+    final_grade = consolidated['final_grade']
     grade_class = f"grade-{final_grade.lower()}"
     
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -243,49 +604,97 @@ if 'analysis_data' in st.session_state:
     # Score metrics
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Overall Score", f"{consolidated.get('score', 0)}%")
+        st.metric("Overall Score", f"{consolidated['score']}%")
     with col2:
-        st.metric("Strict 1", f"{consolidated.get('strict1_pass', 0)}/{consolidated.get('strict1_total', 0)}")
+        st.metric("Strict 1", f"{consolidated['strict1_pass']}/{consolidated['strict1_total']}")
     with col3:
-        st.metric("Strict 2", f"{consolidated.get('strict2_pass', 0)}/{consolidated.get('strict2_total', 0)}")
+        st.metric("Strict 2", f"{consolidated['strict2_pass']}/{consolidated['strict2_total']}")
     with col4:
-        st.metric("Preference", f"{consolidated.get('preference_pass', 0)}/{consolidated.get('preference_total', 0)}")
+        st.metric("Preference", f"{consolidated['preference_pass']}/{consolidated['preference_total']}")
     
     # Bank grades
     st.markdown("### 🏦 Bank Grades")
-    banks = data.get('banks', {})
-    bank_cols = st.columns(6)
-    for i, (bank_name, bank_data) in enumerate(banks.items()):
-        with bank_cols[i % 6]:
-            grade = bank_data.get('final_grade', 'C')
-            score = bank_data.get('score', 0)
-            st.markdown(f"""
-            <div style="text-align: center; padding: 1rem; border-radius: 0.5rem; background: #f1f5f9; margin: 0.5rem 0;">
-                <div style="font-size: 0.8rem; color: #64748b;">{bank_name}</div>
-                <div style="font-size: 2rem; font-weight: 700;">{grade}</div>
-                <div style="font-size: 0.8rem; color: #64748b;">{score}%</div>
-            </div>
-            """, unsafe_allow_html=True)
+    render_bank_cards(data['banks'])
     
     # Generate HTML
     st.markdown("---")
     st.markdown("### 📥 Download Report")
     
-    html_report = generate_html_report(data)
-    company_name_safe = company.get('name', 'report').replace(' ', '_').replace('/', '_')[:50]
-    filename = f"KreditLab_Report_{company_name_safe}_{datetime.now().strftime('%Y%m%d')}.html"
+    render_report_actions(data)
+
+elif 'batch' in st.session_state:
+    
+    st.markdown("---")
+    st.markdown("### 📊 Batch Summary")
+    
+    results = st.session_state['batch']['results']
+    failed = [r for r in results if r.error]
+    if failed:
+        st.warning(f"⚠️ {len(results) - len(failed)}/{len(results)} reports rendered, {len(failed)} failed")
+    else:
+        st.markdown(f'<div class="success-box">✅ <strong>All {len(results)} reports rendered!</strong></div>', unsafe_allow_html=True)
     
+    st.dataframe([
+        {
+            "File": r.source,
+            "Company": "" if r.error else r.company or "N/A",
+            "Grade": r.grade or "",
+            "Score": f"{r.score}%" if r.score is not None else "",
+            "Status": f"❌ {r.error}" if r.error else "✅ Rendered",
+        }
+        for r in results
+    ], hide_index=True)
+    
+    st.markdown("### 🏦 Bank Grades")
+    for r in results:
+        if r.error:
+            continue
+        with st.expander(f"{r.source} — {r.company or 'N/A'} — Grade {r.grade}"):
+            render_bank_cards(r.banks)
+    
+    st.markdown("---")
+    st.markdown("### 📥 Download Reports")
+    
+    # Read from disk only when the button is clicked, not on every rerun.
     st.download_button(
-        label="📥 Download HTML Report",
-        data=html_report,
-        file_name=filename,
-        mime="text/html",
-        help="Click to download the complete HTML report"
+        label=f"📥 Download {len(results) - len(failed)} HTML Reports (ZIP)",
+        data=st.session_state['batch']['zip'].read,
+        file_name=f"KreditLab_Reports_{datetime.now().strftime('%Y%m%d')}.zip",
+        mime="application/zip",
+        on_click="ignore",
+        disabled=len(failed) == len(results),
+        help="All successfully rendered reports in one ZIP archive"
     )
-    
-    # Preview option
-    with st.expander("👁️ Preview Report"):
-        st.components.v1.html(html_report, height=800, scrolling=True)
 
 else:
     st.info("👆 Upload a JSON file to get started")
+
+# =============================================================================
+# SEARCH
+# =============================================================================
+
+st.markdown("---")
+with st.expander("🔎 Search Past Analyses"):
+    render_search()
+
+# =============================================================================
+# PERFORMANCE
+# =============================================================================
+
+perf.end_capture()
+if perf.enabled() and perf_run:
+    try:
+        perf.write_prometheus(METRICS_FILE, extra=get_render_pool().prometheus_text())
+    except OSError as e:
+        st.warning(f"⚠️ Could not write metrics to {METRICS_FILE}: {e}")
+    with st.expander("⏱️ Timings for This Run"):
+        st.dataframe([
+            {
+                "Phase": name,
+                "Calls": int(t['calls']),
+                "Time (ms)": round(t['seconds'] * 1000, 3),
+                "Bytes": int(t['bytes']),
+            }
+            for name, t in perf_run.items()
+        ], hide_index=True)
+        st.caption("render.* phases run inside app.render and app.preview")
@@ -0,0 +1,566 @@
+"""
+Kredit Lab App Load Test
+========================
+Drives the Streamlit app on localhost with many concurrent simulated
+sessions. Each session speaks the same websocket and upload protocol as the
+browser: it uploads a synthetic analysis, waits for the results, opens the
+preview, and downloads the report, then repeats with a new analysis. No
+browser is needed.
+
+Steps run at increasing numbers of concurrent sessions. Each step reports
+p50/p95/p99 latency of every stage, throughput, and the growth of the
+server's resident memory (the Streamlit process plus its render workers)
+per session. Results are written as JSON so runs can be compared across code
+changes with ``--baseline``.
+
+By default the harness starts ``streamlit run app.py`` on a free port with
+its cache, indexes, and archive in a temporary directory, so every run starts
+cold and leaves nothing behind. ``--url`` tests a running app instead; start
+it with ``--server.enableXsrfProtection false``.
+
+Usage:
+    python app_loadtest.py
+    python app_loadtest.py --sessions 1 5 10 20 --cycles 3 --cases default large
+    python app_loadtest.py --baseline app_loadtest_baseline.json
+    python app_loadtest.py --url http://127.0.0.1:8501 --pid 12345
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+from benchmark import CASES
+from synthetic_data import make_analysis
+
+try:
+    from websockets.asyncio.client import connect
+except ImportError:  # websockets is optional; only this harness needs it
+    connect = None
+
+DEFAULT_OUTPUT = "app_loadtest_results.json"
+DEFAULT_SESSIONS = [1, 5, 10]
+DEFAULT_CASES = ["default", "long_evidence", "large"]
+PREVIEW_LABEL = "👁️ Preview Report"
+
+# Stages timed in every cycle, in milliseconds. "cycle" is all three together.
+STAGES = ("upload", "preview", "download", "cycle")
+
+# Seconds to wait for any one server response before counting the cycle as failed.
+DEFAULT_TIMEOUT = 120.0
+
+SCRIPT_DONE = (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY)
+
+
+class AppError(RuntimeError):
+    """The app showed an exception, or did not send what a cycle expects."""
+
+
+# =============================================================================
+# SERVER
+# =============================================================================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(workdir: str, timeout: float = 60.0) -> Tuple[subprocess.Popen, str]:
+    """Start the app headless on a free port with its state under ``workdir``; returns the process and URL."""
+    port = _free_port()
+    env = dict(
+        os.environ,
+        KREDITLAB_CACHE_DIR=os.path.join(workdir, "cache"),
+        KREDITLAB_ENTITY_INDEX=os.path.join(workdir, "entity_index.jsonl"),
+        KREDITLAB_SEARCH_INDEX=os.path.join(workdir, "search_index"),
+        KREDITLAB_ARCHIVE_DIR=os.path.join(workdir, "analysis_archive"),
+        KREDITLAB_METRICS_FILE=os.path.join(workdir, "kreditlab_metrics.prom"),
+    )
+    cmd = [sys.executable, "-m", "streamlit", "run", os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"),
+           "--server.port", str(port), "--server.address", "127.0.0.1", "--server.headless", "true",
+           "--server.enableXsrfProtection", "false", "--browser.gatherUsageStats", "false"]
+    proc = subprocess.Popen(cmd, env=env, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Streamlit exited with status {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return proc, url
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"Streamlit did not become healthy within {timeout:g}s")
+
+
+def tree_rss(pid: int) -> Optional[int]:
+    """Resident bytes of ``pid`` and all its descendants, or None where ``/proc`` is unavailable."""
+    if not os.path.isdir(f"/proc/{pid}"):
+        return None
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                # The command name may contain spaces; the parent pid follows the state after it.
+                ppid = int(f.read().rsplit(b")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    page = os.sysconf("SC_PAGE_SIZE")
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/statm", "rb") as f:
+                total += int(f.read().split()[1]) * page
+        except (OSError, IndexError, ValueError):
+            continue
+        stack.extend(children.get(current, ()))
+    return total
+
+
+# =============================================================================
+# SIMULATED SESSION
+# =============================================================================
+
+def _put_file(url: str, name: str, raw: bytes, timeout: float) -> None:
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            f"Content-Type: application/json\r\n\r\n").encode("utf-8") + raw + f"\r\n--{boundary}--\r\n".encode("ascii")
+    request = urllib.request.Request(url, data=body, method="PUT",
+                                     headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    with urllib.request.urlopen(request, timeout=timeout):
+        pass
+
+
+def _get(url: str, timeout: float) -> bytes:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+class AppSession:
+    """One browser tab: a websocket to the app plus the widget ids it has seen."""
+
+    def __init__(self, url: str, timeout: float = DEFAULT_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session_id = ""
+        self.uploader_id: Optional[str] = None
+        self.preview_id: Optional[str] = None
+        self.preview_fragment: Optional[str] = None
+        self.download_id: Optional[str] = None
+        self.preview_bytes = 0
+        self.exceptions: List[str] = []
+        self._uploader_state = None
+        self._ws = None
+        self._requests = 0
+
+    async def __aenter__(self) -> "AppSession":
+        address = urlsplit(self.url)
+        scheme = "wss" if address.scheme == "https" else "ws"
+        self._ws = await connect(f"{scheme}://{address.netloc}{address.path}/_stcore/stream",
+                                 subprotocols=["streamlit"], max_size=None)
+        await self._rerun()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._ws.close()
+
+    # -------------------------------------------------------------------------
+    # User actions
+    # -------------------------------------------------------------------------
+
+    async def upload(self, name: str, raw: bytes) -> None:
+        """Upload ``raw`` as the only file, with the preview closed, and wait for the results."""
+        if self.uploader_id is None:
+            raise AppError("No file uploader on the page")
+        msg = BackMsg()
+        msg.file_urls_request.request_id = self._request_id()
+        msg.file_urls_request.session_id = self.session_id
+        msg.file_urls_request.file_names.append(name)
+        file_urls = (await self._send(msg, "file_urls_response")).file_urls[0]
+        upload_url = file_urls.upload_url
+        if upload_url.startswith("/"):
+            upload_url = self.url + upload_url
+        await asyncio.to_thread(_put_file, upload_url, name, raw, self.timeout)
+
+        state = BackMsg().rerun_script.widget_states.widgets.add()
+        state.id = self.uploader_id
+        info = state.file_uploader_state_value.uploaded_file_info.add()
+        info.name, info.size, info.file_id = name, len(raw), file_urls.file_id
+        info.file_urls.CopyFrom(file_urls)
+        self._uploader_state = state
+        self.preview_bytes = 0
+        await self._rerun(preview=False)
+        if self.preview_id is None or self.download_id is None:
+            raise AppError("The upload produced no preview or download")
+
+    async def open_preview(self) -> int:
+        """Expand the preview as a fragment rerun, as the browser does; returns the preview's size."""
+        await self._rerun(preview=True, fragment=self.preview_fragment)
+        if not self.preview_bytes:
+            raise AppError("The preview expander sent no report")
+        return self.preview_bytes
+
+    async def download(self) -> int:
+        """Fetch the report behind the download button; returns its size."""
+        msg = BackMsg()
+        msg.backend_operation_request.request_id = self._request_id()
+        msg.backend_operation_request.session_id = self.session_id
+        msg.backend_operation_request.deferred_file.file_id = self.download_id
+        response = await self._send(msg, "backend_operation_response")
+        if not response.deferred_file.url:
+            raise AppError(f"Download failed: {response.deferred_file.error_msg or 'no URL'}")
+        body = await asyncio.to_thread(_get, self.url + response.deferred_file.url, self.timeout)
+        if not body.lstrip().startswith(b"<!DOCTYPE"):
+            raise AppError("The download is not an HTML report")
+        return len(body)
+
+    # -------------------------------------------------------------------------
+    # Protocol
+    # -------------------------------------------------------------------------
+
+    def _request_id(self) -> str:
+        self._requests += 1
+        return str(self._requests)
+
+    async def _rerun(self, preview: Optional[bool] = None, fragment: Optional[str] = None) -> None:
+        msg = BackMsg()
+        rerun = msg.rerun_script
+        rerun.SetInParent()
+        if self._uploader_state is not None:
+            rerun.widget_states.widgets.add().CopyFrom(self._uploader_state)
+        if preview is not None and self.preview_id is not None:
+            state = rerun.widget_states.widgets.add()
+            state.id, state.bool_value = self.preview_id, preview
+        if fragment:
+            rerun.fragment_id = fragment
+        self.exceptions = []
+        finished = await self._send(msg, "script_finished")
+        if self.exceptions:
+            raise AppError(self.exceptions[0])
+        if finished not in SCRIPT_DONE:
+            raise AppError(f"Script run ended with {ForwardMsg.ScriptFinishedStatus.Name(finished)}")
+
+    async def _send(self, msg: BackMsg, reply: str):
+        await self._ws.send(msg.SerializeToString())
+        return await asyncio.wait_for(self._receive(reply), self.timeout)
+
+    async def _receive(self, reply: str):
+        # Read forward messages, noting the widgets they carry, until the ``reply`` message arrives.
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self._ws.recv())
+            kind = msg.WhichOneof("type")
+            if kind == reply:
+                return getattr(msg, kind)
+            if kind == "new_session":
+                self.session_id = msg.new_session.initialize.session_id
+            elif kind == "delta":
+                self._note(msg.delta)
+
+    def _note(self, delta) -> None:
+        kind = delta.WhichOneof("type")
+        if kind == "add_block":
+            block = delta.add_block
+            if block.WhichOneof("type") == "expandable" and block.expandable.label == PREVIEW_LABEL:
+                self.preview_id = block.expandable.id
+                self.preview_fragment = delta.fragment_id or None
+            return
+        if kind != "new_element":
+            return
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "file_uploader":
+            self.uploader_id = element.file_uploader.id
+        elif kind == "download_button" and element.download_button.deferred_file_id:
+            self.download_id = element.download_button.deferred_file_id
+        elif kind == "iframe" and element.iframe.srcdoc:
+            self.preview_bytes = len(element.iframe.srcdoc.encode("utf-8"))
+        elif kind == "exception":
+            self.exceptions.append(f"{element.exception.type}: {element.exception.message}")
+
+
+# =============================================================================
+# LOAD TEST
+# =============================================================================
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50": round(statistics.median(ordered), 1) if ordered else 0.0,
+        "p95": round(_percentile(ordered, 0.95), 1),
+        "p99": round(_percentile(ordered, 0.99), 1),
+        "max": round(ordered[-1], 1) if ordered else 0.0,
+    }
+
+
+class _Seeds:
+    # A distinct synthetic company for every upload, so no upload is served from the report cache.
+    def __init__(self, start: int = 1):
+        self.next = start
+
+    def take(self) -> int:
+        self.next += 1
+        return self.next - 1
+
+
+def _analysis(case: str, seed: int) -> bytes:
+    sizes = CASES[case]
+    if sizes is None:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_analysis_output.json"), "rb") as f:
+            return f.read()
+    return json.dumps(make_analysis(seed=seed, **sizes), ensure_ascii=False).encode("utf-8")
+
+
+async def run_session(url: str, index: int, cycles: int, cases: List[str], seeds: _Seeds,
+                      samples: Dict[str, List[float]], errors: List[str], finished: asyncio.Event,
+                      release: asyncio.Event, timeout: float) -> int:
+    """Connect, run ``cycles`` upload -> preview -> download cycles, and stay connected until ``release``.
+
+    ``finished`` is set once the cycles are over, however they went.
+    """
+    completed = 0
+    try:
+        async with AppSession(url, timeout) as session:
+            for cycle in range(cycles):
+                case = cases[(index + cycle) % len(cases)]
+                seed = seeds.take()
+                raw = _analysis(case, seed)
+                try:
+                    start = time.perf_counter()
+                    await session.upload(f"{case}_{seed}.json", raw)
+                    uploaded = time.perf_counter()
+                    await session.open_preview()
+                    previewed = time.perf_counter()
+                    await session.download()
+                    downloaded = time.perf_counter()
+                except (AppError, OSError, asyncio.TimeoutError) as e:
+                    errors.append(f"session {index} cycle {cycle} ({case}): {type(e).__name__}: {e}")
+                    continue
+                samples["upload"].append((uploaded - start) * 1000)
+                samples["preview"].append((previewed - uploaded) * 1000)
+                samples["download"].append((downloaded - previewed) * 1000)
+                samples["cycle"].append((downloaded - start) * 1000)
+                completed += 1
+            finished.set()
+            await release.wait()
+    except (AppError, OSError, asyncio.TimeoutError) as e:
+        errors.append(f"session {index}: {type(e).__name__}: {e}")
+    finally:
+        finished.set()
+    return completed
+
+
+async def _sample_rss(pid: Optional[int], peak: List[int], stop: asyncio.Event, interval: float = 0.25) -> None:
+    while pid is not None and not stop.is_set():
+        rss = await asyncio.to_thread(tree_rss, pid)
+        if rss is not None:
+            peak[0] = max(peak[0], rss)
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_step(url: str, sessions: int, cycles: int, cases: List[str], seeds: _Seeds,
+                   pid: Optional[int] = None, timeout: float = DEFAULT_TIMEOUT) -> Dict:
+    """Run ``sessions`` concurrent sessions of ``cycles`` cycles each.
+
+    Memory is measured before the sessions connect and again after their last
+    cycle, while they are still connected, so session state is included.
+    """
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    errors: List[str] = []
+    rss_before = tree_rss(pid) if pid else None
+    peak = [rss_before or 0]
+    stop, release = asyncio.Event(), asyncio.Event()
+    sampler = asyncio.create_task(_sample_rss(pid, peak, stop))
+    finished = [asyncio.Event() for _ in range(sessions)]
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(run_session(url, i, cycles, cases, seeds, samples, errors, finished[i], release,
+                                             timeout))
+             for i in range(sessions)]
+    await asyncio.gather(*(event.wait() for event in finished))
+    elapsed = time.perf_counter() - start
+    rss_after = tree_rss(pid) if pid else None
+    release.set()
+    completed = sum(await asyncio.gather(*tasks))
+    stop.set()
+    await sampler
+
+    result = {
+        "sessions": sessions,
+        "cycles": sessions * cycles,
+        "completed": completed,
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "throughput_cps": round(completed / elapsed, 2),
+        "latency_ms": {stage: _summary(samples[stage]) for stage in STAGES},
+        "memory": None,
+    }
+    if rss_before is not None and rss_after is not None:
+        result["memory"] = {
+            "rss_before_bytes": rss_before,
+            "rss_after_bytes": rss_after,
+            "rss_peak_bytes": max(peak[0], rss_after),
+            "growth_per_session_bytes": (rss_after - rss_before) // sessions,
+        }
+    if errors:
+        result["error_samples"] = errors[:10]
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def load_test(url: str, sessions: List[int], cycles: int, cases: List[str], pid: Optional[int] = None,
+                    warmup: int = 1, timeout: float = DEFAULT_TIMEOUT) -> Dict:
+    """Warm the app up, then run one step per entry in ``sessions``."""
+    seeds = _Seeds()
+    if warmup:
+        # Imports, the render pool's worker processes, and the first index writes are not part of any step.
+        await run_step(url, 1, warmup, cases, seeds, None, timeout)
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "config": {
+            "cycles_per_session": cycles,
+            "cases": cases,
+            "warmup": warmup,
+            "render_workers": os.environ.get("KREDITLAB_RENDER_WORKERS"),
+            "render_queue": os.environ.get("KREDITLAB_RENDER_QUEUE"),
+        },
+        "steps": [],
+    }
+    for count in sessions:
+        results["steps"].append(await run_step(url, count, cycles, cases, seeds, pid, timeout))
+    return results
+
+
+# =============================================================================
+# REPORTING
+# =============================================================================
+
+def format_results(results: Dict) -> str:
+    lines = [f"{'sessions':>8}{'cycles/s':>10}{'errors':>8}" + "".join(f"{s + ' p50/p95/p99 ms':>28}" for s in STAGES)
+             + f"{'MiB/session':>13}"]
+    for step in results["steps"]:
+        latency = step["latency_ms"]
+        cells = "".join(f"{'/'.join(f'{latency[s][p]:.0f}' for p in ('p50', 'p95', 'p99')):>28}" for s in STAGES)
+        memory = step["memory"]
+        growth = f"{memory['growth_per_session_bytes'] / 2 ** 20:.1f}" if memory else "n/a"
+        lines.append(f"{step['sessions']:>8}{step['throughput_cps']:>10.2f}{step['errors']:>8}{cells}{growth:>13}")
+    return "\n".join(lines)
+
+
+def compare(results: Dict, baseline: Dict) -> List[str]:
+    """Changes in p95 latency, throughput, and memory per session against ``baseline``, step by step."""
+    before = {step["sessions"]: step for step in baseline.get("steps", [])}
+    lines = []
+    for step in results["steps"]:
+        old = before.get(step["sessions"])
+        if old is None:
+            continue
+        changes = []
+        for stage in STAGES:
+            was, now = old["latency_ms"][stage]["p95"], step["latency_ms"][stage]["p95"]
+            if was:
+                changes.append(f"{stage} p95 {now / was - 1:+.0%}")
+        if old["throughput_cps"]:
+            changes.append(f"throughput {step['throughput_cps'] / old['throughput_cps'] - 1:+.0%}")
+        if old.get("memory") and step.get("memory"):
+            growth = step["memory"]["growth_per_session_bytes"] - old["memory"]["growth_per_session_bytes"]
+            changes.append(f"memory/session {growth / 2 ** 20:+.1f} MiB")
+        lines.append(f"{step['sessions']:>3} sessions: " + ", ".join(changes))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the Kredit Lab Streamlit app with simulated sessions.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS,
+                        help=f"Concurrent sessions per step (default: {' '.join(map(str, DEFAULT_SESSIONS))})")
+    parser.add_argument("--cycles", type=int, default=2, help="Upload -> preview -> download cycles per session")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=DEFAULT_CASES,
+                        help="Analysis sizes (benchmark.py cases); sessions take turns through them")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed cycles before the first step (default: 1)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Seconds to wait for each server response (default: {DEFAULT_TIMEOUT:g})")
+    parser.add_argument("--url", help="App to test, e.g. http://127.0.0.1:8501 (default: start one)")
+    parser.add_argument("--pid", type=int, help="Server process to measure with --url (default: none)")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"Results file (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    if connect is None:
+        print("The load test needs the websockets package: pip install websockets", file=sys.stderr)
+        return 2
+    with tempfile.TemporaryDirectory(prefix="kreditlab_loadtest_") as workdir:
+        proc, url, pid = None, args.url, args.pid
+        if url is None:
+            proc, url = start_app(workdir)
+            pid = proc.pid
+        try:
+            results = asyncio.run(load_test(url, args.sessions, args.cycles, args.cases, pid, args.warmup,
+                                            args.timeout))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+    results["url"] = args.url
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(format_results(results))
+    print(f"Results written to {args.output}")
+    for step in results["steps"]:
+        for error in step.get("error_samples", []):
+            print(f"  - {error}", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline} ({baseline.get('commit') or 'unknown commit'}):")
+        if baseline.get("config") != results["config"]:
+            print("  (the baseline ran with a different configuration)")
+        for line in compare(results, baseline):
+            print(f"  {line}")
+    return 1 if any(step["errors"] for step in results["steps"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Kredit Lab Batch Renderer
+=========================
+Render a whole directory, glob, or JSONL file of analyses to HTML reports
+without the Streamlit UI.
+
+Usage:
+    python batch_render.py analyses/ -o reports/ -j 8
+    python batch_render.py "archive/2024-*/*.json" -o reports/
+    python batch_render.py month_end.jsonl -o reports/
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from analysis_schema import parse_analysis
+from html_generator import REPORT_MODES, report_filename, write_html_report
+from report_assets import COMPRESSED_SUFFIX, COMPRESSIONS, brotli, compress_file, write_assets
+
+# =============================================================================
+# JOB DISCOVERY
+# =============================================================================
+
+# A job is (source label, path, inline JSON text/bytes or None). Files are read
+# by the worker so the parent never holds more than one JSONL line at a time.
+Job = Tuple[str, str, Optional[Union[str, bytes]]]
+
+
+@dataclass
+class RenderResult:
+    source: str
+    output: Optional[str] = None
+    bytes_written: int = 0
+    error: Optional[str] = None
+    company: Optional[str] = None
+    grade: Optional[str] = None
+    score: Optional[float] = None
+    # Bank name -> {"final_grade", "score"}, enough for a per-file summary.
+    banks: Optional[Dict[str, Dict]] = None
+
+
+def iter_jobs(target: str) -> Iterator[Job]:
+    """Yield render jobs for a directory, glob pattern, JSON file, or JSONL file."""
+    if os.path.isdir(target):
+        paths = sorted(glob.glob(os.path.join(target, "*.json")) + glob.glob(os.path.join(target, "*.jsonl")))
+    elif os.path.isfile(target):
+        paths = [target]
+    else:
+        paths = sorted(glob.glob(target, recursive=True))
+
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path, "r", encoding="utf-8") as f:
+                for line_no, line in enumerate(f, 1):
+                    if line.strip():
+                        yield f"{path}:{line_no}", path, line
+        else:
+            yield path, path, None
+
+
+# =============================================================================
+# WORKER
+# =============================================================================
+
+def _write_report(out_dir: str, data: dict, overwrite: bool, mode: str = "static",
+                  assets_url: Optional[str] = None, compress: Sequence[str] = ()) -> Tuple[str, int]:
+    """Stream the report to disk, adding a numeric suffix instead of clobbering an existing file."""
+    stem, ext = os.path.splitext(report_filename(data))
+    candidate, n = stem + ext, 1
+    while True:
+        path = os.path.join(out_dir, candidate)
+        try:
+            f = open(path, "wb" if overwrite else "xb")
+        except FileExistsError:
+            n += 1
+            candidate = f"{stem}_{n}{ext}"
+            continue
+        if not overwrite and any(os.path.exists(path + COMPRESSED_SUFFIX[fmt]) for fmt in compress):
+            # Taken by an earlier report whose plain .html was not kept.
+            f.close()
+            os.remove(path)
+            n += 1
+            candidate = f"{stem}_{n}{ext}"
+            continue
+        try:
+            with f:
+                return path, write_html_report(data, f, mode=mode, assets_url=assets_url)
+        except BaseException:
+            # Don't leave a truncated report behind.
+            os.remove(path)
+            raise
+
+
+def render_job(job: Job, out_dir: str, overwrite: bool = False, mode: str = "static",
+               assets_url: Optional[str] = None, compress: Sequence[str] = (),
+               keep_html: bool = True) -> RenderResult:
+    """Render a single job. Never raises: failures are reported on the result.
+
+    With ``compress``, compressed copies are written next to the report, and
+    the plain ``.html`` is removed unless ``keep_html``.
+    """
+    return render_job_with_data(job, out_dir, overwrite, mode, assets_url, compress, keep_html)[0]
+
+
+def render_job_with_data(job: Job, out_dir: str, overwrite: bool = False, mode: str = "static",
+                         assets_url: Optional[str] = None, compress: Sequence[str] = (),
+                         keep_html: bool = True) -> Tuple[RenderResult, Optional[Dict]]:
+    """``render_job``, also returning the parsed analysis (None if the job failed)."""
+    source, path, text = job
+    try:
+        if text is None:
+            with open(path, "rb") as f:
+                text = f.read()
+        data = parse_analysis(text)
+        output, bytes_written = _write_report(out_dir, data, overwrite, mode, assets_url, compress)
+        if compress:
+            files = compress_file(output, compress, keep_original=keep_html)
+            output, bytes_written = files[0][0], sum(size for _, size in files)
+        consolidated = data["consolidated"]
+        return RenderResult(
+            source, output=output, bytes_written=bytes_written,
+            company=data["company"]["name"], grade=consolidated["final_grade"], score=consolidated["score"],
+            banks={name: {"final_grade": bank["final_grade"], "score": bank["score"]}
+                   for name, bank in data["banks"].items()},
+        ), data
+    except Exception as e:
+        return RenderResult(source, error=f"{type(e).__name__}: {e}"), None
+
+
+def _render_star(args) -> RenderResult:
+    return render_job(*args)
+
+
+# =============================================================================
+# DRIVER
+# =============================================================================
+
+def iter_render(jobs: Iterable[Job], out_dir: str, workers: Optional[int] = None,
+                chunksize: int = 8, overwrite: bool = False, mode: str = "static",
+                assets_url: Optional[str] = None, compress: Sequence[str] = (),
+                keep_html: bool = True) -> Iterator[RenderResult]:
+    """Render ``jobs`` into ``out_dir`` on a process pool, yielding results as they finish."""
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = ((job, out_dir, overwrite, mode, assets_url, tuple(compress), keep_html) for job in jobs)
+    with Pool(processes=workers) as pool:
+        yield from pool.imap_unordered(_render_star, tasks, chunksize=chunksize)
+
+
+def render_batch(target: str, out_dir: str, workers: Optional[int] = None,
+                 chunksize: int = 8, overwrite: bool = False, mode: str = "static",
+                 shared_assets: bool = False, compress: Sequence[str] = (),
+                 keep_html: bool = True) -> List[RenderResult]:
+    """Render every analysis found at ``target`` into ``out_dir`` on a process pool.
+
+    With ``shared_assets`` the stylesheet and script are written once to
+    ``out_dir/assets`` and linked from every report.
+    """
+    assets_url = None
+    if shared_assets:
+        write_assets(os.path.join(out_dir, "assets"), compress)
+        assets_url = "assets"
+    return list(iter_render(iter_jobs(target), out_dir, workers=workers, chunksize=chunksize,
+                            overwrite=overwrite, mode=mode, assets_url=assets_url,
+                            compress=compress, keep_html=keep_html))
+
+
+def format_summary(results: List[RenderResult], elapsed: float) -> str:
+    """Build the throughput and failure summary printed at the end of a run."""
+    ok = [r for r in results if r.error is None]
+    failed = [r for r in results if r.error is not None]
+    total_bytes = sum(r.bytes_written for r in ok)
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+    lines = [
+        f"Rendered {len(ok)}/{len(results)} analyses in {elapsed:.2f}s "
+        f"({rate:.1f} reports/s, {total_bytes / 1e6:.1f} MB written)",
+    ]
+    if failed:
+        lines.append(f"{len(failed)} failed:")
+        lines.extend(f"  - {r.source}: {r.error}" for r in sorted(failed, key=lambda r: r.source))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render Kredit Lab analyses to HTML reports in bulk.")
+    parser.add_argument("input", help="Directory, glob pattern, JSON file, or JSONL file")
+    parser.add_argument("-o", "--output", default="reports", help="Output directory (default: reports)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=8, help="Jobs handed to a worker at a time")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Replace existing reports instead of adding a numeric suffix")
+    parser.add_argument("--mode", choices=REPORT_MODES, default="static",
+                        help="static: pre-rendered tables, for archiving (default); "
+                             "lazy: smaller files, bank tables built in the browser")
+    parser.add_argument("--shared-assets", action="store_true",
+                        help="Write the stylesheet and script once to OUTPUT/assets and link them from each report")
+    parser.add_argument("--compress", nargs="+", choices=COMPRESSIONS, default=[],
+                        help="Also write compressed copies (.gz, .br) of every report")
+    parser.add_argument("--no-html", action="store_true",
+                        help="With --compress, keep only the compressed copies")
+    args = parser.parse_args(argv)
+    if "br" in args.compress and brotli is None:
+        parser.error("brotli compression needs the 'brotli' package")
+    if args.no_html and not args.compress:
+        parser.error("--no-html requires --compress")
+
+    start = time.perf_counter()
+    results = render_batch(args.input, args.output, workers=args.workers,
+                           chunksize=args.chunksize, overwrite=args.overwrite, mode=args.mode,
+                           shared_assets=args.shared_assets, compress=args.compress, keep_html=not args.no_html)
+    print(format_summary(results, time.perf_counter() - start))
+    if not results:
+        print(f"No analyses found at {args.input}", file=sys.stderr)
+        return 2
+    return 1 if any(r.error for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Kredit Lab Benchmarks
+=====================
+Latency, peak memory, and output size of report generation across analysis
+sizes, plus the parse -> validate -> render path the Streamlit app runs on
+every upload.
+
+Results are written as JSON. Thresholds (``benchmark_thresholds.json``) set
+absolute limits per case and an allowed regression against a baseline
+results file; any violation makes the run exit with status 1.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --baseline baseline.json -o benchmark_results.json
+    python benchmark.py --cases sample long_evidence --repeat 50
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from analysis_schema import loads, parse_analysis, validate_analysis
+from html_generator import GENERATOR_VERSION, generate_html_report
+from synthetic_data import make_analysis
+
+# Inputs ship next to this file, so the benchmark runs from any working directory.
+_HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_PATH = os.path.join(_HERE, "sample_analysis_output.json")
+DEFAULT_THRESHOLDS = os.path.join(_HERE, "benchmark_thresholds.json")
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+# Case name -> make_analysis() arguments, or None for sample_analysis_output.json.
+CASES: Dict[str, Optional[Dict]] = {
+    "sample": None,
+    "one_bank": dict(banks=1),
+    "default": dict(),
+    "many_entities": dict(entities=500),
+    "long_evidence": dict(evidence_chars=2000),
+    "many_params": dict(ccris=160, ctos=40),
+    "large": dict(entities=200, evidence_chars=1000, ccris=64, ctos=16),
+}
+
+# Timing metrics, all in microseconds; "lower is better" applies to every metric.
+TIMINGS = ("parse_us", "validate_us", "render_us", "render_lazy_us", "end_to_end_us")
+
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+
+def _time(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Median and p95 wall time of ``fn`` in microseconds, after one warm-up call."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    samples.sort()
+    return {"median": statistics.median(samples), "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))]}
+
+
+def _peak_bytes(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def load_case(name: str) -> Dict:
+    sizes = CASES[name]
+    if sizes is None:
+        with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return make_analysis(seed=1, **sizes)
+
+
+def run_case(data: Dict, repeat: int) -> Dict[str, float]:
+    """Measure one analysis. The end-to-end path matches ``app.py``: parse and validate the upload, then render."""
+    raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    decoded = loads(raw)
+    normalized = parse_analysis(raw)
+
+    def end_to_end():
+        return generate_html_report(parse_analysis(raw), mode="lazy")
+
+    timings = {
+        "parse_us": _time(lambda: loads(raw), repeat),
+        "validate_us": _time(lambda: validate_analysis(decoded), repeat),
+        "render_us": _time(lambda: generate_html_report(normalized), repeat),
+        "render_lazy_us": _time(lambda: generate_html_report(normalized, mode="lazy"), repeat),
+        "end_to_end_us": _time(end_to_end, repeat),
+    }
+    result = {name: round(t["median"], 1) for name, t in timings.items()}
+    result.update({f"{name}_p95": round(t["p95"], 1) for name, t in timings.items()})
+    result.update({
+        "input_bytes": len(raw),
+        "html_bytes": len(generate_html_report(normalized).encode("utf-8")),
+        "html_lazy_bytes": len(generate_html_report(normalized, mode="lazy").encode("utf-8")),
+        "render_peak_bytes": _peak_bytes(lambda: generate_html_report(normalized)),
+        "end_to_end_peak_bytes": _peak_bytes(end_to_end),
+    })
+    return result
+
+
+def run(cases: List[str], repeat: int) -> Dict:
+    results = {
+        "generator_version": GENERATOR_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "repeat": repeat,
+        "cases": {},
+    }
+    for name in cases:
+        results["cases"][name] = run_case(load_case(name), repeat)
+    return results
+
+
+# =============================================================================
+# THRESHOLDS
+# =============================================================================
+
+def check_thresholds(results: Dict, thresholds: Dict, baseline: Optional[Dict] = None) -> List[str]:
+    """Every threshold the results exceed.
+
+    ``thresholds["cases"][case][metric]`` is an absolute maximum (a ``"*"``
+    case applies to all cases). With a baseline, a metric may also not grow by
+    more than ``thresholds["max_regression"][metric]`` (or ``["*"]``) as a
+    fraction of the baseline value.
+    """
+    violations = []
+    limits = thresholds.get("cases", {})
+    regression = thresholds.get("max_regression", {})
+    for case, metrics in results["cases"].items():
+        for metric, limit in {**limits.get("*", {}), **limits.get(case, {})}.items():
+            if metric in metrics and metrics[metric] > limit:
+                violations.append(f"{case}.{metric} = {metrics[metric]:,} exceeds limit {limit:,}")
+        if baseline is None or case not in baseline.get("cases", {}):
+            continue
+        before = baseline["cases"][case]
+        for metric, value in metrics.items():
+            allowed = regression.get(metric, regression.get("*"))
+            if allowed is None or not before.get(metric):
+                continue
+            change = value / before[metric] - 1
+            if change > allowed:
+                violations.append(f"{case}.{metric} = {value:,} regressed {change:+.0%} "
+                                  f"from {before[metric]:,} (allowed {allowed:+.0%})")
+    return violations
+
+
+def format_results(results: Dict) -> str:
+    columns = ("render_us", "render_lazy_us", "end_to_end_us", "render_peak_bytes", "html_bytes")
+    lines = [f"{'case':<16}" + "".join(f"{c:>20}" for c in columns)]
+    for case, metrics in results["cases"].items():
+        lines.append(f"{case:<16}" + "".join(f"{metrics[c]:>20,}" for c in columns))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Kredit Lab report generation.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=30, help="Timed runs per measurement (default: 30)")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"Results file (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS,
+                        help="Thresholds file (default: benchmark_thresholds.json beside this script); '' skips")
+    parser.add_argument("--baseline", help="Earlier results file to check for regressions against")
+    args = parser.parse_args(argv)
+
+    results = run(args.cases, args.repeat)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(format_results(results))
+    print(f"Results written to {args.output}")
+
+    if not args.thresholds:
+        return 0
+    with open(args.thresholds, "r", encoding="utf-8") as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    violations = check_thresholds(results, thresholds, baseline)
+    if violations:
+        print(f"{len(violations)} threshold(s) exceeded:", file=sys.stderr)
+        for v in violations:
+            print(f"  - {v}", file=sys.stderr)
+        return 1
+    print("All thresholds met")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
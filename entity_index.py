@@ -0,0 +1,443 @@
+"""
+Entity Index for Kredit Lab
+===========================
+Links companies across the portfolio through their directors and
+shareholders.
+
+Every ingested analysis adds its entities to an inverted index keyed by
+normalized IC number and by normalized name, so "which other applicants
+share a director with this one" is a dictionary lookup rather than a scan
+of every JSON file. Companies sharing a party are merged into connected
+groups with a union-find. The index is persisted as an append-only JSONL
+log (one line per ingested company; re-ingesting a company replaces its
+entry), so it is updated incrementally and reloaded on start-up.
+
+Parties are matched on IC number when the analysis has one, and on name
+only when it does not, so two different people with a common name are not
+linked. Placeholders ("", "N/A", "-", ...) are never used as an identity: a
+party with neither a real IC nor a real name links nothing, and a company
+with neither a registration number nor a name is not indexed.
+
+Usage:
+    python entity_index.py ingest archive.jsonl analyses/*.json
+    python entity_index.py ic 800101-14-5555
+    python entity_index.py linked 123456-X
+    python entity_index.py groups --min-size 3
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
+
+from analysis_schema import loads
+from model import Analysis
+
+DEFAULT_INDEX_FILE = "entity_index.jsonl"
+
+# Honorifics dropped when normalizing names, so "Dato' Ahmad bin Abdullah" matches "AHMAD BIN ABDULLAH".
+_TITLES = {"MR", "MRS", "MS", "MDM", "DR", "ENCIK", "EN", "PUAN", "CIK", "TUAN", "HAJI", "HJ", "HAJJAH",
+           "HJH", "DATO", "DATUK", "DATIN", "DATO SRI", "DATUK SERI", "TAN SRI", "PUAN SRI", "TUN", "YB"}
+_NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+_NON_WORD = re.compile(r"[^0-9A-Z@ ]+")
+# Normalized forms of the values analyses use for "not recorded" ("N/A" normalizes to "N A").
+_PLACEHOLDERS = {"NA", "N A", "NIL", "NONE"}
+
+
+def normalize_ic(ic: Optional[str]) -> str:
+    """Uppercase alphanumerics only: ``"800101-14-5555"`` -> ``"800101145555"``; "" for N/A."""
+    key = _NON_ALNUM.sub("", str(ic or "").upper())
+    return "" if key in _PLACEHOLDERS else key
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Uppercase words without punctuation or leading honorifics; "" for N/A and other placeholders."""
+    words = _NON_WORD.sub(" ", str(name or "").upper().replace("'", "")).split()
+    while words:
+        for n in (2, 1):
+            if len(words) > n and " ".join(words[:n]) in _TITLES:
+                del words[:n]
+                break
+        else:
+            break
+    name = " ".join(words)
+    return "" if name in _PLACEHOLDERS else name
+
+
+def party_key(entity: Dict) -> str:
+    """Identity of a director/shareholder: their IC number, or their name when no IC is recorded.
+
+    "" when neither is recorded; such a party is never linked to anything.
+    """
+    ic = normalize_ic(entity.get("ic"))
+    if ic:
+        return f"ic:{ic}"
+    name = normalize_name(entity.get("name"))
+    return f"name:{name}" if name else ""
+
+
+def company_key(company: Dict) -> str:
+    """Identity of a company: its registration number, else its name; "" when it has neither."""
+    reg_no = normalize_ic(company.get("reg_no"))
+    if reg_no:
+        return f"reg:{reg_no}"
+    name = normalize_name(company.get("name"))
+    return f"name:{name}" if name else ""
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class EntityIndex:
+    """Inverted index from parties (IC, name) to the companies they are linked to."""
+
+    def __init__(self, path: Optional[str] = DEFAULT_INDEX_FILE):
+        self.path = path
+        self._companies: Dict[str, Dict] = {}
+        self._by_party: Dict[str, Set[str]] = {}
+        self._by_name: Dict[str, Set[str]] = {}
+        self._parent: Dict[str, str] = {}
+        self._groups: Optional[Dict[str, List[str]]] = None
+        self._stale = False
+        self._log_lines = 0
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            self._load()
+
+    # -------------------------------------------------------------------------
+    # Ingestion
+    # -------------------------------------------------------------------------
+
+    def add(self, data: Union[Dict, Analysis]) -> str:
+        """Index (or re-index) one analysis; returns its company key ("" if it has none and was skipped)."""
+        return self.ingest([data])[0]
+
+    def ingest(self, analyses: Iterable[Union[Dict, Analysis]]) -> List[str]:
+        """Index analyses and append them to the log; returns their company keys.
+
+        A company with neither a registration number nor a name cannot be told
+        apart from others like it, so it is skipped and its key is "".
+        """
+        keys = []
+        with self._lock:
+            log = open(self.path, "a", encoding="utf-8") if self.path else None
+            try:
+                for data in analyses:
+                    record = self._record(data)
+                    if not record["key"]:
+                        keys.append("")
+                        continue
+                    self._apply(record)
+                    keys.append(record["key"])
+                    if log is not None:
+                        log.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        self._log_lines += 1
+            finally:
+                if log is not None:
+                    log.close()
+        return keys
+
+    def ingest_jsonl(self, path: str) -> int:
+        """Stream a JSONL file (one analysis per line) into the index."""
+        def lines() -> Iterator[Dict]:
+            with open(path, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        yield loads(line)
+        return sum(1 for key in self.ingest(lines()) if key)
+
+    def compact(self) -> None:
+        """Rewrite the log with one line per company, dropping superseded entries."""
+        if not self.path:
+            return
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    for record in self._companies.values():
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+            self._log_lines = len(self._companies)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._companies.clear()
+            self._by_party.clear()
+            self._by_name.clear()
+            self._parent.clear()
+            self._groups = None
+            self._stale = False
+            self._log_lines = 0
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    @staticmethod
+    def _record(data: Union[Dict, Analysis]) -> Dict:
+        if isinstance(data, Analysis):
+            data = data.to_dict()
+        company = data.get("company") or {}
+        meta = data.get("meta") or {}
+        return {
+            "key": company_key(company),
+            "name": company.get("name"),
+            "reg_no": company.get("reg_no"),
+            "report_date": meta.get("report_date"),
+            "parties": [
+                [party_key(e), normalize_name(e.get("name")), e.get("type"), e.get("name"), e.get("ic"),
+                 e.get("shareholding")]
+                for e in data.get("entities") or []
+            ],
+        }
+
+    def _apply(self, record: Dict) -> None:
+        # Caller holds the lock.
+        key = record["key"]
+        old = self._companies.get(key)
+        if old is not None:
+            self._unlink(key, old)
+        self._companies[key] = record
+        self._parent.setdefault(key, key)
+        for party, name_key, *_ in record["parties"]:
+            if party:
+                members = self._by_party.setdefault(party, set())
+                if members and not self._stale:
+                    self._union(key, next(iter(members)))
+                members.add(key)
+            if name_key:
+                self._by_name.setdefault(name_key, set()).add(key)
+        self._groups = None
+
+    def _unlink(self, key: str, record: Dict) -> None:
+        for party, name_key, *_ in record["parties"]:
+            for index, k in ((self._by_party, party), (self._by_name, name_key)):
+                members = index.get(k)
+                if members is not None:
+                    members.discard(key)
+                    if not members:
+                        del index[k]
+        # A union-find cannot split groups, so rebuild it on the next group query.
+        self._stale = True
+
+    def _load(self) -> None:
+        # Groups are built once, on the first group query, instead of union by union.
+        self._stale = True
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    # Keys are derived again, so logs written with older key rules load consistently.
+                    record = loads(line)
+                    record["key"] = company_key(record)
+                    record["parties"] = [[party_key({"name": name, "ic": ic}), normalize_name(name), t, name, ic, share]
+                                         for _, _, t, name, ic, share in record["parties"]]
+                    if record["key"]:
+                        self._apply(record)
+                    self._log_lines += 1
+
+    # -------------------------------------------------------------------------
+    # Groups
+    # -------------------------------------------------------------------------
+
+    def _find(self, key: str) -> str:
+        parent = self._parent
+        root = key
+        while parent[root] != root:
+            root = parent[root]
+        while parent[key] != root:
+            parent[key], key = root, parent[key]
+        return root
+
+    def _union(self, a: str, b: str) -> None:
+        ra, rb = self._find(a), self._find(b)
+        if ra != rb:
+            self._parent[rb] = ra
+
+    def _group_map(self) -> Dict[str, List[str]]:
+        # Caller holds the lock.
+        if self._stale:
+            self._parent = {key: key for key in self._companies}
+            for members in self._by_party.values():
+                first, *rest = members
+                for other in rest:
+                    self._union(first, other)
+            self._stale = False
+            self._groups = None
+        if self._groups is None:
+            groups: Dict[str, List[str]] = {}
+            for key in self._companies:
+                groups.setdefault(self._find(key), []).append(key)
+            self._groups = groups
+        return self._groups
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._companies)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._companies
+
+    def company(self, key: str) -> Optional[Dict]:
+        record = self._companies.get(key)
+        return None if record is None else self._summary(record)
+
+    @staticmethod
+    def _summary(record: Dict, parties: Optional[Set[str]] = None) -> Dict:
+        summary = {key: record[key] for key in ("key", "name", "reg_no", "report_date")}
+        if parties is not None:
+            summary["roles"] = [
+                {"type": t, "name": name, "ic": ic, "shareholding": shareholding}
+                for party, _, t, name, ic, shareholding in record["parties"] if party in parties
+            ]
+        return summary
+
+    def _companies_for(self, keys: Iterable[str], parties: Set[str]) -> List[Dict]:
+        records = [self._companies[k] for k in keys]
+        records.sort(key=lambda r: (r["name"] or "", r["key"]))
+        return [self._summary(r, parties) for r in records]
+
+    def companies_for_ic(self, ic: str) -> List[Dict]:
+        """Every company the person or entity with this IC number is a party to, with their roles."""
+        ic = normalize_ic(ic)
+        if not ic:
+            return []
+        party = f"ic:{ic}"
+        with self._lock:
+            return self._companies_for(self._by_party.get(party, ()), {party})
+
+    def companies_for_name(self, name: str) -> List[Dict]:
+        """Every company with a party of this (normalized) name, whether or not ICs agree."""
+        name = normalize_name(name)
+        if not name:
+            return []
+        with self._lock:
+            keys = self._by_name.get(name, ())
+            parties = {p for k in keys for p, n, *_ in self._companies[k]["parties"] if n == name}
+            return self._companies_for(keys, parties)
+
+    def linked_companies(self, data: Union[Dict, Analysis, str]) -> List[Dict]:
+        """Other companies sharing a director/shareholder with ``data`` (an analysis or a company key).
+
+        Each entry lists the shared parties under ``"shared"``, most shared first.
+        An analysis does not need to be in the index.
+        """
+        with self._lock:
+            if isinstance(data, str):
+                record = self._companies.get(data)
+                if record is None:
+                    return []
+            else:
+                record = self._record(data)
+            shared: Dict[str, List[Dict]] = {}
+            for party, _, t, name, ic, _ in record["parties"]:
+                if not party:
+                    continue
+                for other in self._by_party.get(party, ()):
+                    if other != record["key"]:
+                        shared.setdefault(other, []).append({"type": t, "name": name, "ic": ic})
+            links = []
+            for other, parties in shared.items():
+                summary = self._summary(self._companies[other])
+                summary["shared"] = parties
+                links.append(summary)
+        links.sort(key=lambda s: (-len(s["shared"]), s["name"] or "", s["key"]))
+        return links
+
+    def group(self, key: str) -> List[Dict]:
+        """All companies connected to ``key`` through any chain of shared parties (including itself)."""
+        with self._lock:
+            if key not in self._companies:
+                return []
+            members = self._group_map()[self._find(key)]
+            return self._companies_for(members, set())
+
+    def groups(self, min_size: int = 2) -> List[List[str]]:
+        """Company keys of every connected group with at least ``min_size`` companies, largest first."""
+        with self._lock:
+            groups = [sorted(g) for g in self._group_map().values() if len(g) >= min_size]
+        groups.sort(key=lambda g: (-len(g), g[0]))
+        return groups
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "companies": len(self._companies),
+                "parties": len(self._by_party),
+                "names": len(self._by_name),
+                "log_lines": self._log_lines,
+            }
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find companies linked by shared directors and shareholders.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_FILE, help=f"Index file (default: {DEFAULT_INDEX_FILE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Index JSONL files or JSON analyses")
+    ingest.add_argument("paths", nargs="+")
+    sub.add_parser("compact", help="Rewrite the index log with one line per company")
+
+    ic = sub.add_parser("ic", help="Companies linked to an IC number")
+    ic.add_argument("ic")
+    name = sub.add_parser("name", help="Companies with a director/shareholder of this name")
+    name.add_argument("name")
+    linked = sub.add_parser("linked", help="Companies sharing a party with a company (registration no. or JSON file)")
+    linked.add_argument("company")
+    group = sub.add_parser("group", help="The connected group of a company (registration no.)")
+    group.add_argument("company")
+    groups = sub.add_parser("groups", help="All connected groups")
+    groups.add_argument("--min-size", type=int, default=2)
+
+    args = parser.parse_args(argv)
+    index = EntityIndex(args.index)
+
+    if args.command == "ingest":
+        total = 0
+        for path in args.paths:
+            if path.endswith(".jsonl"):
+                total += index.ingest_jsonl(path)
+            else:
+                with open(path, "rb") as f:
+                    total += sum(1 for key in index.ingest([loads(f.read())]) if key)
+        print(f"Indexed {total} analyses into {args.index} ({len(index)} companies)")
+        return 0
+    if args.command == "compact":
+        index.compact()
+        print(json.dumps(index.stats(), indent=2))
+        return 0
+
+    if args.command == "ic":
+        result = index.companies_for_ic(args.ic)
+    elif args.command == "name":
+        result = index.companies_for_name(args.name)
+    elif args.command == "linked":
+        if os.path.isfile(args.company):
+            with open(args.company, "rb") as f:
+                result = index.linked_companies(loads(f.read()))
+        else:
+            result = index.linked_companies(company_key({"reg_no": args.company}))
+    elif args.command == "group":
+        result = index.group(company_key({"reg_no": args.company}))
+    else:
+        result = index.groups(args.min_size)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
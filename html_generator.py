@@ -4,8 +4,27 @@ HTML Generator Module for Kredit Lab Streamlit App
 This module generates the complete HTML report from analysis data.
 """
 
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict
+from string import Formatter
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+import perf
+from analysis_schema import CLASSIFICATIONS, EMPTY_BANK, STATUSES, fill_missing
+from model import Analysis
+
+# Bump whenever the rendered markup changes so cached reports are invalidated.
+GENERATOR_VERSION = "3.1.0"
 
 TYPE_BADGE_MAP = {
     "Strict 1": '<span class="type-badge type-strict1">🔴 S1</span>',
@@ -38,96 +57,59 @@ CCRIS_PARAM_NAMES = [
 
 CTOS_PARAM_NAMES = ["No Legal Suits", "Legal Suit (Defendant)", "Trade Bureau", "Legal Status on Loan"]
 
+# "static" pre-renders every bank's tables (for archiving); "lazy" embeds the
+# parameter data once as JSON and builds each bank's tables on first view.
+REPORT_MODES = ("static", "lazy")
 
-def generate_html_report(data: Dict) -> str:
-    """Generate complete HTML report from analysis data."""
-    company_name = data.get("company", {}).get("name", "Unknown Company")
-    company = data.get("company", {})
-    meta = data.get("meta", {})
-    c = data.get("consolidated", {})
-    banks = data.get("banks", {})
-    
-    score = c.get("score", 0)
-    s1_pass, s1_total = c.get("strict1_pass", 0), c.get("strict1_total", 0)
-    s2_pass, s2_total = c.get("strict2_pass", 0), c.get("strict2_total", 0)
-    pref_pass, pref_total = c.get("preference_pass", 0), c.get("preference_total", 0)
-    s1_pct = round((s1_pass / s1_total * 100) if s1_total > 0 else 100, 1)
-    s2_pct = round((s2_pass / s2_total * 100) if s2_total > 0 else 100, 1)
-    pref_pct = round((pref_pass / pref_total * 100) if pref_total > 0 else 0, 1)
-    
-    final_grade = c.get("final_grade", "C")
-    raw_grade = c.get("raw_grade", "C")
-    fg_lower = GRADE_CSS_MAP.get(final_grade, "c")
-    rg_lower = GRADE_CSS_MAP.get(raw_grade, "c")
-    is_pass = final_grade in ["A", "B", "C"]
-    status_class = "pass" if is_pass else "fail"
-    status_text = "ELIGIBLE" if is_pass else "NOT ELIGIBLE"
-    reason = "Strict 1 Failed" if final_grade == "E" else "Strict 2 Failed" if final_grade == "D" else "All Strict Passed"
-    
-    entities = data.get("entities", [])
-    entity_rows = f'<tr><td><span class="type-badge type-info">Company</span></td><td>{company.get("name", "N/A")}</td><td>{company.get("reg_no", "N/A")}</td><td>—</td></tr>'
-    for e in entities:
-        t = e.get("type", "Director")
-        tc = "type-strict2" if t == "Director" else "type-pref"
-        entity_rows += f'<tr><td><span class="type-badge {tc}">{t}</span></td><td>{e.get("name", "N/A")}</td><td>{e.get("ic", "N/A")}</td><td>{e.get("shareholding", "—")}</td></tr>'
-    
-    bank_cards = ""
-    for bn in ["RHB", "Maybank", "CIMB", "Standard Chartered", "SME Bank", "Bank Rakyat"]:
-        bd = banks.get(bn, {})
-        fg = bd.get("final_grade", "C")
-        rg = bd.get("raw_grade", "C")
-        sc = bd.get("score", 0)
-        s1 = f"{bd.get('strict1_pass', 0)}/{bd.get('strict1_total', 0)}"
-        s2 = f"{bd.get('strict2_pass', 0)}/{bd.get('strict2_total', 0)}"
-        pf = f"{bd.get('preference_pass', 0)}/{bd.get('preference_total', 0)}"
-        fgl = GRADE_CSS_MAP.get(fg, "c")
-        bank_cards += f'<div class="summary-card"><h3>{bn}</h3><div class="summary-grade grade-{fgl}">{fg}</div><div class="summary-score">Score: {sc}%</div><div class="summary-raw">Raw: {rg} → Final: {fg}</div><div style="margin-top: 8px; font-size: 10px; color: var(--text-muted);">🔴 {s1} • 🟣 {s2} • 🟡 {pf}</div></div>'
-    
-    bank_tabs = ""
-    bank_contents = ""
-    first = True
-    for bn, bid in BANK_IDS.items():
-        ac = "active" if first else ""
-        bank_tabs += f'<div class="bank-tab {ac}" onclick="showBank(\'{bid}\')">{bn}</div>'
-        bd = banks.get(bn, {})
-        ccris = bd.get("ccris", [])
-        ctos = bd.get("ctos", [])
-        
-        ccris_rows = ""
-        for i, p in enumerate(ccris):
-            cl = p.get("classification", "Not Applicable")
-            st = p.get("status", "N/A")
-            cr = p.get("criteria", "—")
-            ev = p.get("evidence", "—")
-            tb = TYPE_BADGE_MAP.get(cl, TYPE_BADGE_MAP["Not Applicable"])
-            sb = STATUS_BADGE_MAP.get(st, STATUS_BADGE_MAP["N/A"])
-            pname = CCRIS_PARAM_NAMES[i] if i < len(CCRIS_PARAM_NAMES) else f"Param {i+1}"
-            ccris_rows += f'<tr><td>{i+1}</td><td>{pname}</td><td>{tb}</td><td>{cr}</td><td>{sb}</td><td>{ev}</td></tr>'
-        
-        ctos_rows = ""
-        for i, p in enumerate(ctos):
-            cl = p.get("classification", "Not Applicable")
-            st = p.get("status", "N/A")
-            cr = p.get("criteria", "—")
-            ev = p.get("evidence", "—")
-            tb = TYPE_BADGE_MAP.get(cl, TYPE_BADGE_MAP["Not Applicable"])
-            sb = STATUS_BADGE_MAP.get(st, STATUS_BADGE_MAP["N/A"])
-            pname = CTOS_PARAM_NAMES[i] if i < len(CTOS_PARAM_NAMES) else f"Param {i+1}"
-            ctos_rows += f'<tr><td>{i+1}</td><td>{pname}</td><td>{tb}</td><td>{cr}</td><td>{sb}</td><td>{ev}</td></tr>'
-        
-        sc = bd.get("score", 0)
-        rg = bd.get("raw_grade", "C")
-        fg = bd.get("final_grade", "C")
-        
-        bank_contents += f'''<div id="bank-{bid}" class="bank-content {ac}"><div class="table-card"><h3 style="margin-bottom: 12px; color: var(--text-main);">CCRIS Parameters (16)</h3><div class="table-wrapper"><table><thead><tr><th>#</th><th>Parameter</th><th>Type</th><th>Criteria</th><th>Status</th><th>Evidence</th></tr></thead><tbody>{ccris_rows}</tbody></table></div><h3 style="margin: 24px 0 12px; color: var(--text-main);">CTOS Parameters (4)</h3><div class="table-wrapper"><table><thead><tr><th>#</th><th>Parameter</th><th>Type</th><th>Criteria</th><th>Status</th><th>Evidence</th></tr></thead><tbody>{ctos_rows}</tbody><tfoot><tr><td colspan="4" class="text-right">{bn} Score:</td><td colspan="2" class="value-highlight">{sc}% — Raw {rg} → Final {fg}</td></tr></tfoot></table></div></div></div>'''
-        first = False
-    
-    strengths = data.get("strengths", [])
-    attention = data.get("attention_items", [])
-    sh = "".join([f'<div class="badge badge-ok" style="width: fit-content;"><span class="icon">✓</span> {s}</div>' for s in strengths]) or '<div style="color: var(--text-muted); font-size: 12px;">No notable strengths identified</div>'
-    ah = "".join([f'<div class="badge badge-fail" style="width: fit-content;"><span class="icon">✗</span> {a}</div>' for a in attention]) or '<div style="color: var(--text-muted); font-size: 12px;">No critical issues identified</div>'
-    
-    css = ''':root { --bg: #0f172a; --bg-alt: #020617; --card-bg: #0b1120; --border-subtle: #1e293b; --accent: #22c55e; --danger: #ef4444; --warn: #f59e0b; --info: #3b82f6; --text-main: #e5e7eb; --text-soft: #9ca3af; --text-muted: #6b7280; --grade-a: #10b981; --grade-a-bg: rgba(16,185,129,0.15); --grade-b: #3b82f6; --grade-b-bg: rgba(59,130,246,0.15); --grade-c: #f59e0b; --grade-c-bg: rgba(245,158,11,0.15); --grade-d: #f97316; --grade-d-bg: rgba(249,115,22,0.15); --grade-e: #ef4444; --grade-e-bg: rgba(239,68,68,0.15); --strict1-red: #ef4444; --strict1-red-bg: rgba(239,68,68,0.15); --strict2-purple: #a855f7; --strict2-purple-bg: rgba(168,85,247,0.15); --pref-yellow: #eab308; --pref-yellow-bg: rgba(234,179,8,0.15); --info-blue: #3b82f6; --info-blue-bg: rgba(59,130,246,0.15); --shadow-soft: 0 18px 45px rgba(15,23,42,0.8); --radius-lg: 20px; --radius-md: 14px; --radius-sm: 10px; --radius-pill: 999px; }
+_CLASSIFICATION_CODES = {c: i for i, c in enumerate(CLASSIFICATIONS)}
+_STATUS_CODES = {s: i for i, s in enumerate(STATUSES)}
+_DEFAULT_TYPE_BADGE = TYPE_BADGE_MAP["Not Applicable"]
+_DEFAULT_STATUS_BADGE = STATUS_BADGE_MAP["N/A"]
+
+
+# =============================================================================
+# TEMPLATES
+# =============================================================================
+
+class _Template:
+    """A format string compiled once, at import, into an f-string function.
+
+    Fields passed as keyword arguments to the constructor are static and are
+    baked into the literal text, so rendering only substitutes dynamic values.
+    """
+
+    __slots__ = ("render",)
+
+    def __init__(self, source: str, **static: str):
+        body = []
+        fields: List[str] = []
+        for literal, field, _, _ in Formatter().parse(source):
+            if field in static:
+                literal += static[field]
+                field = None
+            body.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is not None:
+                body.append("{" + field + "}")
+                fields.append(field)
+        params = "*, " + ", ".join(dict.fromkeys(fields)) if fields else ""
+        namespace: Dict = {}
+        exec(f"def render({params}): return f{''.join(body)!r}", namespace)
+        self.render = namespace["render"]
+
+
+def _fragments(source: str, *slots: str, **static: str) -> List[_Template]:
+    """Split a wrapping template at its child slots.
+
+    Children are appended to the output between the returned fragments, so a
+    report is built with a single join instead of one join per section.
+    """
+    pieces = [source]
+    for slot in slots:
+        pieces.extend(pieces.pop().split("{" + slot + "}"))
+    return [_Template(piece, **static) for piece in pieces]
+
+
+REPORT_CSS = ''':root { --bg: #0f172a; --bg-alt: #020617; --card-bg: #0b1120; --border-subtle: #1e293b; --accent: #22c55e; --danger: #ef4444; --warn: #f59e0b; --info: #3b82f6; --text-main: #e5e7eb; --text-soft: #9ca3af; --text-muted: #6b7280; --grade-a: #10b981; --grade-a-bg: rgba(16,185,129,0.15); --grade-b: #3b82f6; --grade-b-bg: rgba(59,130,246,0.15); --grade-c: #f59e0b; --grade-c-bg: rgba(245,158,11,0.15); --grade-d: #f97316; --grade-d-bg: rgba(249,115,22,0.15); --grade-e: #ef4444; --grade-e-bg: rgba(239,68,68,0.15); --strict1-red: #ef4444; --strict1-red-bg: rgba(239,68,68,0.15); --strict2-purple: #a855f7; --strict2-purple-bg: rgba(168,85,247,0.15); --pref-yellow: #eab308; --pref-yellow-bg: rgba(234,179,8,0.15); --info-blue: #3b82f6; --info-blue-bg: rgba(59,130,246,0.15); --shadow-soft: 0 18px 45px rgba(15,23,42,0.8); --radius-lg: 20px; --radius-md: 14px; --radius-sm: 10px; --radius-pill: 999px; }
 * { box-sizing: border-box; }
 body { margin: 0; padding: 32px 16px 40px; font-family: system-ui, -apple-system, sans-serif; background: radial-gradient(circle at top left, #1e293b, #020617 40%, #000); color: var(--text-main); min-height: 100vh; }
 .page { max-width: 1400px; margin: 0 auto; } h1, h2, h3, h4 { margin: 0; font-weight: 600; }
@@ -232,19 +214,525 @@ tfoot td { padding: 10px 12px; background: linear-gradient(90deg, rgba(250,204,2
 .footer { margin-top: 32px; padding: 16px 24px; background: rgba(15,23,42,0.6); border-radius: var(--radius-md); border: 1px solid rgba(148,163,184,0.2); display: flex; justify-content: space-between; font-size: 11px; color: var(--text-muted); }
 @media (max-width: 1200px) { .dashboard-grid { grid-template-columns: 1fr; } .summary-grid { grid-template-columns: repeat(3, 1fr); } .kpi-grid { grid-template-columns: repeat(2, 1fr); } }
 @media (max-width: 768px) { .summary-grid { grid-template-columns: repeat(2, 1fr); } .two-col { grid-template-columns: 1fr; } .consolidated-grades { flex-direction: column; gap: 24px; } }'''
-    
-    return f'''<!DOCTYPE html>
+
+REPORT_SCRIPT = '''<script>function showBank(bankId) { document.querySelectorAll('.bank-content').forEach(el => el.classList.remove('active')); document.querySelectorAll('.bank-tab').forEach(el => el.classList.remove('active')); document.getElementById('bank-' + bankId).classList.add('active'); event.target.classList.add('active'); }</script>'''
+
+# Shared-asset output links to these files (written by report_assets.py)
+# instead of inlining the stylesheet and script in every report.
+REPORT_CSS_FILE = f"kreditlab-report-{GENERATOR_VERSION}.min.css"
+REPORT_JS_FILE = f"kreditlab-report-{GENERATOR_VERSION}.min.js"
+LAZY_REPORT_JS_FILE = f"kreditlab-report-lazy-{GENERATOR_VERSION}.min.js"
+
+_HEAD_SOURCE = '''<!DOCTYPE html>
 <html lang="en">
 <head><meta charset="UTF-8"><title>Kredit Lab Report - {company_name}</title><meta name="viewport" content="width=device-width, initial-scale=1.0"><style>{css}</style></head>
 <body><div class="page">
-<div class="header-card"><div class="header-top"><div class="title-block"><div class="pill"><span>📊</span> Kredit Lab v3.1</div><h1><span class="title-icon">🏦</span> EXPERIAN REPORT ANALYSIS</h1><p>CCRIS & CTOS Multi-Bank Eligibility Assessment • 16 CCRIS + 4 CTOS Parameters</p></div><div class="header-meta"><div><div class="meta-label">Company</div><div class="meta-value">{company.get("name", "N/A")}</div></div><div><div class="meta-label">Registration No</div><div class="meta-value">{company.get("reg_no", "N/A")}</div></div><div><div class="meta-label">Report Date</div><div class="meta-value">{meta.get("report_date", "N/A")}</div></div><div><div class="meta-label">Analysis Date</div><div class="meta-value">{meta.get("analysis_date", "N/A")}</div></div></div></div><div class="header-bottom"><div class="badges"><div class="badge badge-info"><span>ℹ</span> 6 Banks Evaluated</div></div></div></div>
-<div class="dashboard-grid"><div class="card"><h2><span class="icon">📈</span> Consolidated Scoring Summary</h2><div class="kpi-grid"><div class="kpi kpi-positive"><div class="kpi-label">Strict 1</div><div class="kpi-value">{s1_pass}/{s1_total}</div><div class="kpi-chip">{s1_pct}% Pass</div></div><div class="kpi kpi-negative"><div class="kpi-label">Strict 2</div><div class="kpi-value">{s2_pass}/{s2_total}</div><div class="kpi-chip">{s2_pct}% Pass</div></div><div class="kpi"><div class="kpi-label">Preference</div><div class="kpi-value">{pref_pass}/{pref_total}</div><div class="kpi-chip">{pref_pct}% Pass</div></div><div class="kpi kpi-highlight"><div class="kpi-label">Overall Score</div><div class="kpi-value">{score}%</div><div class="kpi-chip">All Banks</div></div></div><div class="progress-container"><div class="progress-label"><span>Strict 1 — 30% Weight</span><span class="value-positive">{s1_pass}/{s1_total} ({s1_pct}%)</span></div><div class="progress-bar"><div class="progress-fill strict1" style="width: {s1_pct}%;"></div></div></div><div class="progress-container"><div class="progress-label"><span>Strict 2 — 30% Weight</span><span class="value-negative">{s2_pass}/{s2_total} ({s2_pct}%)</span></div><div class="progress-bar"><div class="progress-fill strict2" style="width: {s2_pct}%;"></div></div></div><div class="progress-container"><div class="progress-label"><span>Preference — 40% Weight</span><span style="color: var(--pref-yellow);">{pref_pass}/{pref_total} ({pref_pct}%)</span></div><div class="progress-bar"><div class="progress-fill pref" style="width: {pref_pct}%;"></div></div></div></div><div class="card"><h2><span class="icon">🏆</span> Consolidated Grade</h2><div class="gauge-container"><div class="grade-display grade-{fg_lower}">{final_grade}</div><div class="grade-status status-{status_class}">{status_text}</div><p style="margin-top: 12px; font-size: 12px; color: var(--text-soft); text-align: center;">{c.get("explanation", "")}</p></div></div></div>
-<div class="section"><div class="section-header"><div><div class="section-title"><span class="icon">👥</span> Entity Information</div><div class="section-subtitle">Company, Directors, and Related Parties</div></div></div><div class="table-card"><div class="table-wrapper"><table><thead><tr><th>Entity Type</th><th>Name</th><th>IC/Registration</th><th>Shareholding</th></tr></thead><tbody>{entity_rows}</tbody></table></div></div></div>
-<div class="section"><div class="section-header"><div><div class="section-title"><span class="icon">🏦</span> Bank-by-Bank Summary</div><div class="section-subtitle">Raw Grade (Potential) vs Final Grade (Eligibility)</div></div></div><div class="summary-grid">{bank_cards}</div></div>
-<div class="section"><div class="section-header"><div><div class="section-title"><span class="icon">📊</span> Detailed Evaluation by Bank</div><div class="section-subtitle">16 CCRIS + 4 CTOS Parameters per Bank</div></div></div><div class="bank-tabs">{bank_tabs}</div>{bank_contents}</div>
-<div class="section"><div class="two-col"><div class="card"><h2><span class="icon">✅</span> Key Strengths</h2><div style="display: flex; flex-direction: column; gap: 8px;">{sh}</div></div><div class="card"><h2><span class="icon">⚠️</span> Items Requiring Attention</h2><div style="display: flex; flex-direction: column; gap: 8px;">{ah}</div></div></div></div>
-<div class="consolidated-card grade-{fg_lower}-border"><h2><span class="icon">🏆</span> Final Assessment — Raw vs Final Grade</h2><div class="consolidated-grades"><div class="consolidated-grade-box"><div class="consolidated-grade-label">Raw Grade</div><div class="consolidated-grade-value grade-{rg_lower}">{raw_grade}</div><div class="consolidated-grade-desc">Company Potential<br>Score: {score}%</div></div><div class="consolidated-grade-box"><div class="consolidated-grade-label">Final Grade</div><div class="consolidated-grade-value grade-{fg_lower}">{final_grade}</div><div class="consolidated-grade-desc">Actual Eligibility<br>{reason}</div></div></div><p style="margin-top: 16px; color: var(--text-soft); font-size: 14px; max-width: 700px; margin-left: auto; margin-right: auto;">{c.get("explanation", "")}</p><div style="margin-top: 20px; display: flex; justify-content: center; gap: 24px; font-size: 12px; color: var(--text-muted);"><div>🔴 Strict 1: <span class="value-positive">{s1_pass}/{s1_total} ({s1_pct}%)</span></div><div>🟣 Strict 2: <span class="value-negative">{s2_pass}/{s2_total} ({s2_pct}%)</span></div><div>🟡 Preference: <span style="color: var(--pref-yellow);">{pref_pass}/{pref_total} ({pref_pct}%)</span></div></div></div>
-<div class="footer"><div><strong>Kredit Lab Report v3.1</strong><br>16 CCRIS + 4 CTOS Parameters • 6-Bank Assessment</div><div style="text-align: right;">Prepared by: {meta.get("prepared_by", "Kredit Lab System")}<br>Date: {meta.get("analysis_date", datetime.now().strftime("%Y-%m-%d"))}</div></div>
+'''
+
+_HEAD = _Template(_HEAD_SOURCE, css=REPORT_CSS)
+
+_HEAD_LINKED = _Template(_HEAD_SOURCE.replace(
+    "<style>{css}</style>", f'<link rel="stylesheet" href="{{assets_url}}/{REPORT_CSS_FILE}">'))
+
+_HEADER = _Template('''<div class="header-card"><div class="header-top"><div class="title-block"><div class="pill"><span>📊</span> Kredit Lab v3.1</div><h1><span class="title-icon">🏦</span> EXPERIAN REPORT ANALYSIS</h1><p>CCRIS & CTOS Multi-Bank Eligibility Assessment • 16 CCRIS + 4 CTOS Parameters</p></div><div class="header-meta"><div><div class="meta-label">Company</div><div class="meta-value">{company_name_cell}</div></div><div><div class="meta-label">Registration No</div><div class="meta-value">{reg_no}</div></div><div><div class="meta-label">Report Date</div><div class="meta-value">{report_date}</div></div><div><div class="meta-label">Analysis Date</div><div class="meta-value">{analysis_date}</div></div></div></div><div class="header-bottom"><div class="badges"><div class="badge badge-info"><span>ℹ</span> 6 Banks Evaluated</div></div></div></div>
+''')
+
+_DASHBOARD = _Template('''<div class="dashboard-grid"><div class="card"><h2><span class="icon">📈</span> Consolidated Scoring Summary</h2><div class="kpi-grid"><div class="kpi kpi-positive"><div class="kpi-label">Strict 1</div><div class="kpi-value">{s1_pass}/{s1_total}</div><div class="kpi-chip">{s1_pct}% Pass</div></div><div class="kpi kpi-negative"><div class="kpi-label">Strict 2</div><div class="kpi-value">{s2_pass}/{s2_total}</div><div class="kpi-chip">{s2_pct}% Pass</div></div><div class="kpi"><div class="kpi-label">Preference</div><div class="kpi-value">{pref_pass}/{pref_total}</div><div class="kpi-chip">{pref_pct}% Pass</div></div><div class="kpi kpi-highlight"><div class="kpi-label">Overall Score</div><div class="kpi-value">{score}%</div><div class="kpi-chip">All Banks</div></div></div><div class="progress-container"><div class="progress-label"><span>Strict 1 — 30% Weight</span><span class="value-positive">{s1_pass}/{s1_total} ({s1_pct}%)</span></div><div class="progress-bar"><div class="progress-fill strict1" style="width: {s1_pct}%;"></div></div></div><div class="progress-container"><div class="progress-label"><span>Strict 2 — 30% Weight</span><span class="value-negative">{s2_pass}/{s2_total} ({s2_pct}%)</span></div><div class="progress-bar"><div class="progress-fill strict2" style="width: {s2_pct}%;"></div></div></div><div class="progress-container"><div class="progress-label"><span>Preference — 40% Weight</span><span style="color: var(--pref-yellow);">{pref_pass}/{pref_total} ({pref_pct}%)</span></div><div class="progress-bar"><div class="progress-fill pref" style="width: {pref_pct}%;"></div></div></div></div><div class="card"><h2><span class="icon">🏆</span> Consolidated Grade</h2><div class="gauge-container"><div class="grade-display grade-{fg_lower}">{final_grade}</div><div class="grade-status status-{status_class}">{status_text}</div><p style="margin-top: 12px; font-size: 12px; color: var(--text-soft); text-align: center;">{explanation}</p></div></div></div>
+''')
+
+_ENTITY_OPEN, _ENTITY_MID, _ENTITY_CLOSE = _fragments('''<div class="section"><div class="section-header"><div><div class="section-title"><span class="icon">👥</span> Entity Information</div><div class="section-subtitle">Company, Directors, and Related Parties</div></div></div><div class="table-card"><div class="table-wrapper"><table><thead><tr><th>Entity Type</th><th>Name</th><th>IC/Registration</th><th>Shareholding</th></tr></thead><tbody>{entity_rows}</tbody></table></div></div>{linked_companies}</div>
+''', "entity_rows", "linked_companies")
+
+_ENTITY_ROW = _Template('<tr><td><span class="type-badge {type_class}">{type}</span></td><td>{name}</td><td>{ic}</td><td>{shareholding}</td></tr>')
+
+_LINKED_OPEN, _LINKED_CLOSE = _fragments('''<div class="table-card" style="margin-top: 16px;"><h3 style="margin-bottom: 12px; color: var(--text-main);">Linked Companies ({count})</h3><div class="table-wrapper"><table><thead><tr><th>Company</th><th>Registration No</th><th>Report Date</th><th>Shared Directors / Shareholders</th></tr></thead><tbody>{linked_rows}</tbody></table></div></div>''', "linked_rows")
+
+_LINKED_ROW = _Template('<tr><td>{name}</td><td>{reg_no}</td><td>{report_date}</td><td>{shared}</td></tr>')
+
+_BANK_SUMMARY_OPEN, _BANK_SUMMARY_CLOSE = _fragments('''<div class="section"><div class="section-header"><div><div class="section-title"><span class="icon">🏦</span> Bank-by-Bank Summary</div><div class="section-subtitle">Raw Grade (Potential) vs Final Grade (Eligibility)</div></div></div><div class="summary-grid">{bank_cards}</div></div>
+''', "bank_cards")
+
+_BANK_CARD = _Template('<div class="summary-card"><h3>{bank}</h3><div class="summary-grade grade-{grade_class}">{final_grade}</div><div class="summary-score">Score: {score}%</div><div class="summary-raw">Raw: {raw_grade} → Final: {final_grade}</div><div style="margin-top: 8px; font-size: 10px; color: var(--text-muted);">🔴 {strict1} • 🟣 {strict2} • 🟡 {preference}</div></div>')
+
+_CHANGES_OPEN, _CHANGES_CLOSE = _fragments('''<div class="section"><div class="section-header"><div><div class="section-title"><span class="icon">🔄</span> Changes Since Last Review</div><div class="section-subtitle">Report of {report_date} compared with {previous_report_date}</div></div></div>{change_tables}</div>
+''', "change_tables")
+
+_NO_CHANGES = '<div class="table-card" style="color: var(--text-muted); font-size: 12px;">No changes since the previous review</div>'
+
+_GRADE_CHANGES_OPEN, _GRADE_CHANGES_CLOSE = _fragments('''<div class="table-card"><h3 style="margin-bottom: 12px; color: var(--text-main);">Grades &amp; Scores</h3><div class="table-wrapper"><table><thead><tr><th>Bank</th><th>Final Grade</th><th>Raw Grade</th><th>Score</th></tr></thead><tbody>{grade_rows}</tbody></table></div></div>''', "grade_rows")
+
+_GRADE_CHANGE_ROW = _Template('<tr><td>{bank}</td><td>{final_grade}</td><td>{raw_grade}</td><td>{score}</td></tr>')
+
+_PARAM_CHANGES_OPEN, _PARAM_CHANGES_CLOSE = _fragments('''<div class="table-card" style="margin-top: 16px;"><h3 style="margin-bottom: 12px; color: var(--text-main);">Parameters ({count})</h3><div class="table-wrapper"><table><thead><tr><th>Parameter</th><th>Banks</th><th>Field</th><th>Before</th><th>After</th></tr></thead><tbody>{param_change_rows}</tbody></table></div></div>''', "param_change_rows")
+
+_PARAM_CHANGE_ROW = _Template('<tr><td>{parameter}</td><td>{banks}</td><td>{field}</td><td>{before}</td><td>{after}</td></tr>')
+
+_FINDING_CHANGES_OPEN, _FINDING_CHANGES_CLOSE = _fragments('''<div class="table-card" style="margin-top: 16px;"><h3 style="margin-bottom: 12px; color: var(--text-main);">Strengths &amp; Attention Items</h3><div class="table-wrapper"><table><thead><tr><th>Change</th><th>Item</th></tr></thead><tbody>{finding_rows}</tbody></table></div></div>''', "finding_rows")
+
+_FINDING_CHANGE_ROW = _Template('<tr><td><span class="badge {badge_class}">{change}</span></td><td>{item}</td></tr>')
+
+_BANK_DETAILS_OPEN, _BANK_DETAILS_MID, _BANK_DETAILS_CLOSE = _fragments('''<div class="section"><div class="section-header"><div><div class="section-title"><span class="icon">📊</span> Detailed Evaluation by Bank</div><div class="section-subtitle">16 CCRIS + 4 CTOS Parameters per Bank</div></div></div><div class="bank-tabs">{bank_tabs}</div>{bank_contents}</div>
+''', "bank_tabs", "bank_contents")
+
+_BANK_TAB = _Template('''<div class="bank-tab {active}" onclick="showBank('{bank_id}')">{bank}</div>''')
+
+_BANK_CONTENT_OPEN, _BANK_CONTENT_MID, _BANK_CONTENT_CLOSE = _fragments('''<div id="bank-{bank_id}" class="bank-content {active}"><div class="table-card"><h3 style="margin-bottom: 12px; color: var(--text-main);">CCRIS Parameters (16)</h3><div class="table-wrapper"><table><thead><tr><th>#</th><th>Parameter</th><th>Type</th><th>Criteria</th><th>Status</th><th>Evidence</th></tr></thead><tbody>{ccris_rows}</tbody></table></div><h3 style="margin: 24px 0 12px; color: var(--text-main);">CTOS Parameters (4)</h3><div class="table-wrapper"><table><thead><tr><th>#</th><th>Parameter</th><th>Type</th><th>Criteria</th><th>Status</th><th>Evidence</th></tr></thead><tbody>{ctos_rows}</tbody><tfoot><tr><td colspan="4" class="text-right">{bank} Score:</td><td colspan="2" class="value-highlight">{score}% — Raw {raw_grade} → Final {final_grade}</td></tr></tfoot></table></div></div></div>''', "ccris_rows", "ctos_rows")
+
+_PARAM_ROW = _Template('<tr><td>{n}</td><td>{name}</td><td>{type_badge}</td><td>{criteria}</td><td>{status_badge}</td><td>{evidence}</td></tr>')
+
+_PANELS_OPEN, _PANELS_MID, _PANELS_CLOSE = _fragments('''<div class="section"><div class="two-col"><div class="card"><h2><span class="icon">✅</span> Key Strengths</h2><div style="display: flex; flex-direction: column; gap: 8px;">{sh}</div></div><div class="card"><h2><span class="icon">⚠️</span> Items Requiring Attention</h2><div style="display: flex; flex-direction: column; gap: 8px;">{ah}</div></div></div></div>
+''', "sh", "ah")
+
+_STRENGTH_ITEM = _Template('<div class="badge badge-ok" style="width: fit-content;"><span class="icon">✓</span> {item}</div>')
+
+_ATTENTION_ITEM = _Template('<div class="badge badge-fail" style="width: fit-content;"><span class="icon">✗</span> {item}</div>')
+
+_NO_STRENGTHS = '<div style="color: var(--text-muted); font-size: 12px;">No notable strengths identified</div>'
+
+_NO_ATTENTION = '<div style="color: var(--text-muted); font-size: 12px;">No critical issues identified</div>'
+
+_CONSOLIDATED = _Template('''<div class="consolidated-card grade-{fg_lower}-border"><h2><span class="icon">🏆</span> Final Assessment — Raw vs Final Grade</h2><div class="consolidated-grades"><div class="consolidated-grade-box"><div class="consolidated-grade-label">Raw Grade</div><div class="consolidated-grade-value grade-{rg_lower}">{raw_grade}</div><div class="consolidated-grade-desc">Company Potential<br>Score: {score}%</div></div><div class="consolidated-grade-box"><div class="consolidated-grade-label">Final Grade</div><div class="consolidated-grade-value grade-{fg_lower}">{final_grade}</div><div class="consolidated-grade-desc">Actual Eligibility<br>{reason}</div></div></div><p style="margin-top: 16px; color: var(--text-soft); font-size: 14px; max-width: 700px; margin-left: auto; margin-right: auto;">{explanation}</p><div style="margin-top: 20px; display: flex; justify-content: center; gap: 24px; font-size: 12px; color: var(--text-muted);"><div>🔴 Strict 1: <span class="value-positive">{s1_pass}/{s1_total} ({s1_pct}%)</span></div><div>🟣 Strict 2: <span class="value-negative">{s2_pass}/{s2_total} ({s2_pct}%)</span></div><div>🟡 Preference: <span style="color: var(--pref-yellow);">{pref_pass}/{pref_total} ({pref_pct}%)</span></div></div></div>
+''')
+
+_FOOTER_SOURCE = '''<div class="footer"><div><strong>Kredit Lab Report v3.1</strong><br>16 CCRIS + 4 CTOS Parameters • 6-Bank Assessment</div><div style="text-align: right;">Prepared by: {prepared_by}<br>Date: {footer_date}</div></div>
 </div>
-<script>function showBank(bankId) {{ document.querySelectorAll('.bank-content').forEach(el => el.classList.remove('active')); document.querySelectorAll('.bank-tab').forEach(el => el.classList.remove('active')); document.getElementById('bank-' + bankId).classList.add('active'); event.target.classList.add('active'); }}</script>
+{script}
 </body></html>'''
+
+_FOOTER = _Template(_FOOTER_SOURCE, script=REPORT_SCRIPT)
+
+# Lazy mode: the payload maps bank id to [ccris rows, ctos rows], each row being
+# [classification code, status code, criteria, evidence]. Badge markup and
+# parameter names ship once in the script instead of on every row.
+LAZY_REPORT_SCRIPT = '''<script>var bankData = JSON.parse(document.getElementById('bank-data').textContent), builtBanks = {}; var typeBadges = %s, statusBadges = %s, paramNames = [%s, %s]; function paramRows(params, names) { var html = ''; for (var i = 0; i < params.length; i++) { var p = params[i]; html += '<tr><td>' + (i + 1) + '</td><td>' + (i < names.length ? names[i] : 'Param ' + (i + 1)) + '</td><td>' + typeBadges[p[0]] + '</td><td>' + p[2] + '</td><td>' + statusBadges[p[1]] + '</td><td>' + p[3] + '</td></tr>'; } return html; } function buildBank(bankId) { if (builtBanks[bankId]) return; builtBanks[bankId] = true; var bodies = document.getElementById('bank-' + bankId).getElementsByTagName('tbody'); bodies[0].innerHTML = paramRows(bankData[bankId][0], paramNames[0]); bodies[1].innerHTML = paramRows(bankData[bankId][1], paramNames[1]); } function showBank(bankId) { buildBank(bankId); document.querySelectorAll('.bank-content').forEach(el => el.classList.remove('active')); document.querySelectorAll('.bank-tab').forEach(el => el.classList.remove('active')); document.getElementById('bank-' + bankId).classList.add('active'); event.target.classList.add('active'); } buildBank('%s');</script>''' % (
+    json.dumps([TYPE_BADGE_MAP[c] for c in CLASSIFICATIONS], ensure_ascii=False),
+    json.dumps([STATUS_BADGE_MAP[s] for s in STATUSES], ensure_ascii=False),
+    json.dumps(CCRIS_PARAM_NAMES, ensure_ascii=False),
+    json.dumps(CTOS_PARAM_NAMES, ensure_ascii=False),
+    next(iter(BANK_IDS.values())),
+)
+
+_LAZY_DATA = '<script type="application/json" id="bank-data">{payload}</script>'
+
+_FOOTER_LAZY = _Template(_FOOTER_SOURCE.replace("{script}", _LAZY_DATA + "{script}"), script=LAZY_REPORT_SCRIPT)
+
+_FOOTER_LINKED = _Template(_FOOTER_SOURCE.replace(
+    "{script}", f'<script src="{{assets_url}}/{REPORT_JS_FILE}"></script>'))
+
+_FOOTER_LAZY_LINKED = _Template(_FOOTER_SOURCE.replace(
+    "{script}", _LAZY_DATA + f'<script src="{{assets_url}}/{LAZY_REPORT_JS_FILE}"></script>'))
+
+def report_filename(data: Union[Dict, Analysis], when: Optional[datetime] = None) -> str:
+    """Build the download filename used for a rendered report."""
+    name = data.company_name if isinstance(data, Analysis) else data.get("company", {}).get("name")
+    company_name_safe = (name or "report").replace(" ", "_").replace("/", "_")[:50]
+    return f"KreditLab_Report_{company_name_safe}_{(when or datetime.now()).strftime('%Y%m%d')}.html"
+
+
+# =============================================================================
+# FRAGMENT CACHE
+# =============================================================================
+
+class FragmentCache:
+    """Bounded LRU of rendered report fragments, keyed by a hash of their inputs.
+
+    Pass one to ``generate_html_report`` so that re-rendering a revised
+    analysis only rebuilds the sections whose input sub-trees changed.
+    """
+
+    def __init__(self, max_items: int = 1024):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            html = self._items.get(key)
+            if html is None:
+                self._counters["misses"] += 1
+            else:
+                self._items.move_to_end(key)
+                self._counters["hits"] += 1
+            return html
+
+    def put(self, key: str, html: str) -> None:
+        with self._lock:
+            self._items[key] = html
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters, items=len(self._items))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+def _fragment_key(name: str, mode: str, inputs: Any) -> str:
+    """Hash a fragment's name and input sub-tree, as hex so a ``ReportCache`` can store it.
+
+    The generator version and report mode are part of the key, so fragments
+    kept on disk are not reused after a release changes their markup.
+    """
+    key = [GENERATOR_VERSION, mode, name, inputs]
+    if orjson is not None:
+        text = orjson.dumps(key, option=orjson.OPT_SORT_KEYS, default=str)
+    else:
+        text = json.dumps(key, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.blake2b(text, digest_size=16).hexdigest()
+
+
+def _cached(out: List[str], cache: Optional[FragmentCache], log: Optional[Dict[str, bool]], mode: str,
+            name: str, inputs: Any, render: Callable[..., None], *args: Any) -> None:
+    """Append ``render(out, *args)``, or the memoized fragment when ``inputs`` were seen before."""
+    if cache is None:
+        render(out, *args)
+        return
+    key = _fragment_key(name, mode, inputs)
+    html = cache.get(key)
+    if log is not None:
+        log[name] = html is not None
+    if html is None:
+        parts: List[str] = []
+        render(parts, *args)
+        html = "".join(parts)
+        cache.put(key, html)
+    out.append(html)
+
+
+# =============================================================================
+# RENDERING
+# =============================================================================
+
+def _render_param_rows(out: List[str], params: List[Dict], names: List[str]) -> None:
+    """Append CCRIS or CTOS parameter rows; shared by both tables for every bank."""
+    render = _PARAM_ROW.render
+    for i, p in enumerate(params):
+        out.append(render(
+            n=i + 1,
+            name=names[i] if i < len(names) else f"Param {i+1}",
+            type_badge=TYPE_BADGE_MAP.get(p["classification"], _DEFAULT_TYPE_BADGE),
+            criteria=p["criteria"],
+            status_badge=STATUS_BADGE_MAP.get(p["status"], _DEFAULT_STATUS_BADGE),
+            evidence=p["evidence"],
+        ))
+
+
+def _lazy_payload(banks: Dict) -> str:
+    """Compact JSON of every bank's parameters, safe to embed in a script element."""
+    payload = {}
+    for bn, bid in BANK_IDS.items():
+        bd = banks.get(bn, EMPTY_BANK)
+        payload[bid] = [
+            [[_CLASSIFICATION_CODES.get(p["classification"], 0), _STATUS_CODES.get(p["status"], 0), p["criteria"], p["evidence"]]
+             for p in bd[table]]
+            for table in ("ccris", "ctos")
+        ]
+    # "</script>" or "<!--" inside a value would end or confuse the script element.
+    if orjson is not None:
+        return orjson.dumps(payload).replace(b"</", b"<\\/").replace(b"<!--", b"<\\u0021--").decode("utf-8")
+    text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return text.replace("</", "<\\/").replace("<!--", "<\\u0021--")
+
+
+def _render_entities(out: List[str], company_name: str, reg_no: str, entities: List[Dict],
+                     linked_companies: Optional[List[Dict]] = None) -> None:
+    out.append(_ENTITY_OPEN.render())
+    out.append(_ENTITY_ROW.render(type_class="type-info", type="Company", name=company_name,
+                                  ic=reg_no, shareholding="—"))
+    for e in entities:
+        t = e["type"]
+        out.append(_ENTITY_ROW.render(
+            type_class="type-strict2" if t == "Director" else "type-pref", type=t,
+            name=e["name"], ic=e["ic"], shareholding=e["shareholding"],
+        ))
+    out.append(_ENTITY_MID.render())
+    if linked_companies:
+        out.append(_LINKED_OPEN.render(count=len(linked_companies)))
+        for link in linked_companies:
+            out.append(_LINKED_ROW.render(
+                name=link["name"] or "N/A", reg_no=link["reg_no"] or "N/A", report_date=link.get("report_date") or "N/A",
+                shared=", ".join(f'{p["name"]} ({p["type"]})' for p in link["shared"]),
+            ))
+        out.append(_LINKED_CLOSE.render())
+    out.append(_ENTITY_CLOSE.render())
+
+
+_BANK_CARD_FIELDS = ("final_grade", "raw_grade", "score", "strict1_pass", "strict1_total",
+                     "strict2_pass", "strict2_total", "preference_pass", "preference_total")
+
+
+def _render_bank_card(out: List[str], bn: str, bd: Dict) -> None:
+    fg = bd["final_grade"]
+    out.append(_BANK_CARD.render(
+        bank=bn, grade_class=GRADE_CSS_MAP.get(fg, "c"), final_grade=fg,
+        raw_grade=bd["raw_grade"], score=bd["score"],
+        strict1=f"{bd['strict1_pass']}/{bd['strict1_total']}",
+        strict2=f"{bd['strict2_pass']}/{bd['strict2_total']}",
+        preference=f"{bd['preference_pass']}/{bd['preference_total']}",
+    ))
+
+
+def _render_bank_content(out: List[str], bn: str, bid: str, active: bool, bd: Dict, lazy: bool) -> None:
+    out.append(_BANK_CONTENT_OPEN.render(bank_id=bid, active="active" if active else ""))
+    if not lazy:
+        _render_param_rows(out, bd["ccris"], CCRIS_PARAM_NAMES)
+    out.append(_BANK_CONTENT_MID.render())
+    if not lazy:
+        _render_param_rows(out, bd["ctos"], CTOS_PARAM_NAMES)
+    out.append(_BANK_CONTENT_CLOSE.render(
+        bank=bn, score=bd["score"], raw_grade=bd["raw_grade"], final_grade=bd["final_grade"],
+    ))
+
+
+def _change(pair: List, badges: Optional[Dict[str, str]] = None) -> Tuple[str, str]:
+    """Before/after cells for an ``[old, new]`` pair from ``diff_analyses``."""
+    before, after = ("—" if v is None else badges.get(v, v) if badges else str(v) for v in pair)
+    return before, after
+
+
+def _change_cell(pair: Optional[List]) -> str:
+    return "—" if pair is None else "{} → {}".format(*_change(pair))
+
+
+def _render_changes(out: List[str], changes: Dict) -> None:
+    out.append(_CHANGES_OPEN.render(report_date=changes["report_date"],
+                                    previous_report_date=changes["previous_report_date"]))
+    findings = []
+    for field, noun, good in (("strengths", "Strength", "badge-ok"), ("attention_items", "Attention item", "badge-fail")):
+        bad = "badge-fail" if good == "badge-ok" else "badge-ok"
+        findings += [(f"{noun} added", good, item) for item in changes[field]["added"]]
+        findings += [(f"{noun} removed", bad, item) for item in changes[field]["removed"]]
+    grade_changes = ([("All Banks", changes["consolidated"])] if changes["consolidated"] else []) + \
+        [(b["bank"], b["changes"]) for b in changes["banks"]]
+    if not grade_changes and not changes["parameters"] and not findings:
+        out.append(_NO_CHANGES)
+    if grade_changes:
+        out.append(_GRADE_CHANGES_OPEN.render())
+        for bank, c in grade_changes:
+            out.append(_GRADE_CHANGE_ROW.render(
+                bank=bank, final_grade=_change_cell(c.get("final_grade")), raw_grade=_change_cell(c.get("raw_grade")),
+                score=_change_cell(c.get("score")),
+            ))
+        out.append(_GRADE_CHANGES_CLOSE.render())
+    if changes["parameters"]:
+        out.append(_PARAM_CHANGES_OPEN.render(count=len(changes["parameters"])))
+        for p in changes["parameters"]:
+            banks = "All banks" if len(p["banks"]) == len(BANK_IDS) else ", ".join(p["banks"])
+            for field, pair in p["changes"].items():
+                badges = STATUS_BADGE_MAP if field == "status" else TYPE_BADGE_MAP if field == "classification" else None
+                before, after = _change(pair, badges)
+                out.append(_PARAM_CHANGE_ROW.render(parameter=f'{p["parameter"]} ({p["source"]})', banks=banks,
+                                                    field=field.title(), before=before, after=after))
+        out.append(_PARAM_CHANGES_CLOSE.render())
+    if findings:
+        out.append(_FINDING_CHANGES_OPEN.render())
+        for label, badge, item in findings:
+            out.append(_FINDING_CHANGE_ROW.render(badge_class=badge, change=label, item=item))
+        out.append(_FINDING_CHANGES_CLOSE.render())
+    out.append(_CHANGES_CLOSE.render())
+
+
+def _render_panels(out: List[str], strengths: List[str], attention: List[str]) -> None:
+    out.append(_PANELS_OPEN.render())
+    out.extend([_STRENGTH_ITEM.render(item=s) for s in strengths] or [_NO_STRENGTHS])
+    out.append(_PANELS_MID.render())
+    out.extend([_ATTENTION_ITEM.render(item=a) for a in attention] or [_NO_ATTENTION])
+    out.append(_PANELS_CLOSE.render())
+
+
+def _iter_sections(data: Union[Dict, Analysis], mode: str = "static", assets_url: Optional[str] = None,
+                   fragment_cache: Optional[FragmentCache] = None,
+                   fragment_log: Optional[Dict[str, bool]] = None,
+                   linked_companies: Optional[List[Dict]] = None,
+                   changes: Optional[Dict] = None) -> Iterator[Tuple[str, List[str]]]:
+    """Yield the report one section at a time, as (phase name, list of fragments)."""
+    if mode not in REPORT_MODES:
+        raise ValueError(f"Unknown report mode {mode!r} (expected one of {', '.join(REPORT_MODES)})")
+    lazy = mode == "lazy"
+    # Only missing fields get defaults; invalid values are shown as given, as they always were.
+    data = data.to_dict() if isinstance(data, Analysis) else fill_missing(data)
+    company = data["company"]
+    meta = data["meta"]
+    c = data["consolidated"]
+    banks = data["banks"]
+    cache, log = fragment_cache, fragment_log
+    yield "normalize", []
+
+    score = c["score"]
+    s1_pass, s1_total = c["strict1_pass"], c["strict1_total"]
+    s2_pass, s2_total = c["strict2_pass"], c["strict2_total"]
+    pref_pass, pref_total = c["preference_pass"], c["preference_total"]
+    totals = dict(
+        score=score,
+        s1_pass=s1_pass, s1_total=s1_total, s1_pct=round((s1_pass / s1_total * 100) if s1_total > 0 else 100, 1),
+        s2_pass=s2_pass, s2_total=s2_total, s2_pct=round((s2_pass / s2_total * 100) if s2_total > 0 else 100, 1),
+        pref_pass=pref_pass, pref_total=pref_total, pref_pct=round((pref_pass / pref_total * 100) if pref_total > 0 else 0, 1),
+    )
+
+    final_grade = c["final_grade"]
+    raw_grade = c["raw_grade"]
+    fg_lower = GRADE_CSS_MAP.get(final_grade, "c")
+    is_pass = final_grade in ["A", "B", "C"]
+    explanation = c["explanation"]
+    company_name = "N/A" if company["name"] is None else company["name"]
+
+    title = "Unknown Company" if company["name"] is None else company["name"]
+    analysis_date = meta["analysis_date"]
+
+    # Header
+    yield "head", [
+        _HEAD.render(company_name=title) if assets_url is None else
+        _HEAD_LINKED.render(company_name=title, assets_url=assets_url),
+        _HEADER.render(
+            company_name_cell=company_name, reg_no=company["reg_no"],
+            report_date=meta["report_date"], analysis_date="N/A" if analysis_date is None else analysis_date,
+        ),
+    ]
+
+    # KPI dashboard
+    yield "dashboard", [_DASHBOARD.render(
+        fg_lower=fg_lower, final_grade=final_grade, explanation=explanation,
+        status_class="pass" if is_pass else "fail", status_text="ELIGIBLE" if is_pass else "NOT ELIGIBLE",
+        **totals,
+    )]
+
+    # Entity table
+    out: List[str] = []
+    _cached(out, cache, log, mode, "entities", [company_name, company["reg_no"], data["entities"], linked_companies],
+            _render_entities, company_name, company["reg_no"], data["entities"], linked_companies)
+    yield "entities", out
+
+    # Bank cards
+    out = [_BANK_SUMMARY_OPEN.render()]
+    for bn in BANK_IDS:
+        bd = banks.get(bn, EMPTY_BANK)
+        _cached(out, cache, log, mode, f"card:{bn}", [bd[k] for k in _BANK_CARD_FIELDS], _render_bank_card, bn, bd)
+    out.append(_BANK_SUMMARY_CLOSE.render())
+    yield "bank_cards", out
+
+    # Changes since the previous review, when given
+    out = []
+    if changes is not None:
+        _render_changes(out, changes)
+    yield "changes", out
+
+    # Bank tabs, then each bank's detail tables
+    out = [_BANK_DETAILS_OPEN.render()]
+    for index, (bn, bid) in enumerate(BANK_IDS.items()):
+        out.append(_BANK_TAB.render(active="active" if index == 0 else "", bank_id=bid, bank=bn))
+    out.append(_BANK_DETAILS_MID.render())
+    yield "bank_tabs", out
+
+    for index, (bn, bid) in enumerate(BANK_IDS.items()):
+        bd = banks.get(bn, EMPTY_BANK)
+        out = []
+        inputs = [lazy, bd["score"], bd["raw_grade"], bd["final_grade"]] + ([] if lazy else [bd["ccris"], bd["ctos"]])
+        _cached(out, cache, log, mode, f"bank:{bn}", inputs, _render_bank_content, bn, bid, index == 0, bd, lazy)
+        yield "bank_details", out
+
+    # Strengths / attention panels and final assessment
+    out = [_BANK_DETAILS_CLOSE.render()]
+    _cached(out, cache, log, mode, "panels", [data["strengths"], data["attention_items"]],
+            _render_panels, data["strengths"], data["attention_items"])
+    out.append(_CONSOLIDATED.render(
+        fg_lower=fg_lower, rg_lower=GRADE_CSS_MAP.get(raw_grade, "c"), raw_grade=raw_grade, final_grade=final_grade,
+        explanation=explanation,
+        reason="Strict 1 Failed" if final_grade == "E" else "Strict 2 Failed" if final_grade == "D" else "All Strict Passed",
+        **totals,
+    ))
+    yield "panels", out
+
+    # Footer
+    footer = dict(prepared_by=meta["prepared_by"],
+                  footer_date=datetime.now().strftime("%Y-%m-%d") if analysis_date is None else analysis_date)
+    if lazy:
+        footer["payload"] = _lazy_payload(banks)
+    if assets_url is None:
+        yield "footer", [(_FOOTER_LAZY if lazy else _FOOTER).render(**footer)]
+    else:
+        yield "footer", [(_FOOTER_LAZY_LINKED if lazy else _FOOTER_LINKED).render(assets_url=assets_url, **footer)]
+
+
+def _timed(sections: Iterator[Tuple[str, List[str]]]) -> Iterator[Tuple[str, List[str]]]:
+    """Record each section's render time and output size as ``render.<phase>``."""
+    start = time.perf_counter()
+    for name, fragments in sections:
+        elapsed = time.perf_counter() - start
+        perf.record("render." + name, elapsed, perf.text_bytes("".join(fragments)))
+        yield name, fragments
+        start = time.perf_counter()
+
+
+def iter_html_report(data: Union[Dict, Analysis], mode: str = "static", assets_url: Optional[str] = None,
+                     fragment_cache: Optional[FragmentCache] = None,
+                     fragment_log: Optional[Dict[str, bool]] = None,
+                     linked_companies: Optional[List[Dict]] = None,
+                     changes: Optional[Dict] = None) -> Iterator[str]:
+    """Yield the HTML report section by section instead of as one string."""
+    sections = _iter_sections(data, mode, assets_url, fragment_cache, fragment_log, linked_companies, changes)
+    if perf.enabled():
+        sections = _timed(sections)
+    for _, fragments in sections:
+        if fragments:
+            yield "".join(fragments)
+
+
+def write_html_report(data: Union[Dict, Analysis], fp: IO, encoding: str = "utf-8", mode: str = "static",
+                      assets_url: Optional[str] = None, fragment_cache: Optional[FragmentCache] = None,
+                      fragment_log: Optional[Dict[str, bool]] = None,
+                      linked_companies: Optional[List[Dict]] = None, changes: Optional[Dict] = None) -> int:
+    """Stream the HTML report to a text or binary file object.
+
+    Only one section is held in memory at a time. Returns the number of
+    characters (text streams) or bytes (binary streams) written.
+    """
+    binary = not isinstance(fp, io.TextIOBase)
+    written = 0
+    for chunk in iter_html_report(data, mode, assets_url, fragment_cache, fragment_log, linked_companies, changes):
+        if binary:
+            chunk = chunk.encode(encoding)
+        fp.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def generate_html_report(data: Union[Dict, Analysis], mode: str = "static", assets_url: Optional[str] = None,
+                         fragment_cache: Optional[FragmentCache] = None,
+                         fragment_log: Optional[Dict[str, bool]] = None,
+                         linked_companies: Optional[List[Dict]] = None, changes: Optional[Dict] = None) -> str:
+    """Generate complete HTML report from analysis data.
+
+    ``mode`` is "static" (every table pre-rendered) or "lazy" (tables built
+    in the browser when their tab is first shown). With ``assets_url`` the
+    stylesheet and script are linked from that location (see
+    ``report_assets.py``) instead of being inlined.
+
+    With a ``fragment_cache`` (a ``FragmentCache``, or a ``report_cache.ReportCache``
+    to share fragments between processes), the entity table, bank cards, bank
+    tabs, and strengths/attention panels are reused when their inputs are unchanged;
+    ``fragment_log`` is then filled with fragment name -> True if it came
+    from the cache.
+
+    ``linked_companies`` (from ``EntityIndex.linked_companies``) adds a table
+    of companies sharing a director or shareholder to the Entity Information
+    section. ``changes`` (from ``analysis_archive.diff_analyses``) adds a
+    "Changes Since Last Review" section after the bank-by-bank summary.
+    """
+    out: List[str] = []
+    sections = _iter_sections(data, mode, assets_url, fragment_cache, fragment_log, linked_companies, changes)
+    if not perf.enabled():
+        for _, fragments in sections:
+            out.extend(fragments)
+        return "".join(out)
+    for _, fragments in _timed(sections):
+        out.extend(fragments)
+    start = time.perf_counter()
+    html = "".join(out)
+    perf.record("render.join", time.perf_counter() - start, perf.text_bytes(html))
+    return html
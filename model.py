@@ -0,0 +1,271 @@
+"""
+Typed Analysis Model for Kredit Lab
+===================================
+Compact in-memory representation of analyses for bulk processing.
+
+The JSON form repeats string keys and long values ("Preference", "Strict 2",
+"PASS", ...) for every one of the 6 banks x 20 parameters. Here each record
+is a ``__slots__`` class, classification and status are ``IntEnum``
+members, and criteria strings are interned, so identical values are shared
+across every parameter, bank, and analysis.
+
+Unknown keys in the JSON are not kept.
+
+Usage (memory benchmark):
+    python model.py [copies]
+"""
+
+import sys
+from enum import IntEnum
+from typing import Dict, Iterator, Optional, Tuple
+
+from analysis_schema import CLASSIFICATIONS, STATUSES, NormalizedAnalysis, loads, normalize_analysis, parse_analysis
+
+# =============================================================================
+# ENUMS
+# =============================================================================
+
+
+class Classification(IntEnum):
+    NOT_APPLICABLE = 0
+    STRICT_1 = 1
+    STRICT_2 = 2
+    PREFERENCE = 3
+    INFORMATIONAL = 4
+
+    @property
+    def label(self) -> str:
+        """The value used in the analysis JSON, e.g. "Strict 1"."""
+        return CLASSIFICATIONS[self]
+
+
+class Status(IntEnum):
+    NA = 0
+    PASS = 1
+    FAIL = 2
+    INFO = 3
+
+    @property
+    def label(self) -> str:
+        """The value used in the analysis JSON, e.g. "PASS"."""
+        return STATUSES[self]
+
+
+# Codes match the list indices used by scoring.py and portfolio_store.py.
+# Checked explicitly rather than with assert, which -O strips.
+if [c.label for c in Classification] != CLASSIFICATIONS or [s.label for s in Status] != STATUSES:
+    raise ImportError("model.Classification/Status are out of step with analysis_schema")
+
+_CLASSIFICATION_BY_LABEL = {c.label: c for c in Classification}
+_STATUS_BY_LABEL = {s.label: s for s in Status}
+
+_intern = sys.intern
+
+
+# =============================================================================
+# RECORDS
+# =============================================================================
+
+class Parameter:
+    __slots__ = ("id", "classification", "status", "criteria", "evidence")
+
+    def __init__(self, classification: Classification, status: Status, criteria: str, evidence: str,
+                 id: Optional[int] = None):
+        self.id = id
+        self.classification = classification
+        self.status = status
+        self.criteria = _intern(criteria)
+        self.evidence = evidence
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Parameter":
+        return cls(_CLASSIFICATION_BY_LABEL[d["classification"]], _STATUS_BY_LABEL[d["status"]],
+                   d["criteria"], d["evidence"], d.get("id"))
+
+    def to_dict(self) -> Dict:
+        d = {"classification": self.classification.label, "status": self.status.label,
+             "criteria": self.criteria, "evidence": self.evidence}
+        if self.id is not None:
+            d = {"id": self.id, **d}
+        return d
+
+
+class Entity:
+    __slots__ = ("type", "name", "ic", "shareholding")
+
+    def __init__(self, type: str, name: str, ic: str, shareholding: str):
+        self.type = _intern(type)
+        self.name = name
+        self.ic = ic
+        self.shareholding = shareholding
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Entity":
+        return cls(d["type"], d["name"], d["ic"], d["shareholding"])
+
+    def to_dict(self) -> Dict:
+        return {"type": self.type, "name": self.name, "ic": self.ic, "shareholding": self.shareholding}
+
+
+_COUNT_FIELDS = ("strict1_pass", "strict1_total", "strict2_pass", "strict2_total",
+                 "preference_pass", "preference_total")
+
+
+class BankResult:
+    """One bank's evaluation; also used for the consolidated block (with no parameters)."""
+
+    __slots__ = ("score", "raw_grade", "final_grade") + _COUNT_FIELDS + ("ccris", "ctos")
+
+    def __init__(self, score: float, raw_grade: str, final_grade: str,
+                 strict1_pass: int = 0, strict1_total: int = 0,
+                 strict2_pass: int = 0, strict2_total: int = 0,
+                 preference_pass: int = 0, preference_total: int = 0,
+                 ccris: Tuple[Parameter, ...] = (), ctos: Tuple[Parameter, ...] = ()):
+        self.score = score
+        self.raw_grade = raw_grade
+        self.final_grade = final_grade
+        self.strict1_pass = strict1_pass
+        self.strict1_total = strict1_total
+        self.strict2_pass = strict2_pass
+        self.strict2_total = strict2_total
+        self.preference_pass = preference_pass
+        self.preference_total = preference_total
+        self.ccris = ccris
+        self.ctos = ctos
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "BankResult":
+        return cls(d["score"], d["raw_grade"], d["final_grade"], *(d[k] for k in _COUNT_FIELDS),
+                   ccris=tuple(Parameter.from_dict(p) for p in d.get("ccris", ())),
+                   ctos=tuple(Parameter.from_dict(p) for p in d.get("ctos", ())))
+
+    def to_dict(self, parameters: bool = True) -> Dict:
+        d = {"score": self.score, "raw_grade": self.raw_grade, "final_grade": self.final_grade}
+        d.update((k, getattr(self, k)) for k in _COUNT_FIELDS)
+        if parameters:
+            d["ccris"] = [p.to_dict() for p in self.ccris]
+            d["ctos"] = [p.to_dict() for p in self.ctos]
+        return d
+
+
+class Analysis:
+    __slots__ = ("schema_version", "company_name", "reg_no", "report_date", "analysis_date", "prepared_by",
+                 "entities", "banks", "consolidated", "explanation",
+                 "critical_findings", "strengths", "attention_items")
+
+    def __init__(self, company_name: Optional[str], reg_no: str, banks: Dict[str, BankResult],
+                 consolidated: BankResult, explanation: str = "",
+                 entities: Tuple[Entity, ...] = (), report_date: str = "N/A",
+                 analysis_date: Optional[str] = None, prepared_by: str = "Kredit Lab System",
+                 critical_findings: Tuple[str, ...] = (), strengths: Tuple[str, ...] = (),
+                 attention_items: Tuple[str, ...] = (), schema_version: str = "1.0"):
+        self.schema_version = schema_version
+        self.company_name = company_name
+        self.reg_no = reg_no
+        self.report_date = report_date
+        self.analysis_date = analysis_date
+        self.prepared_by = _intern(prepared_by)
+        self.entities = entities
+        self.banks = banks
+        self.consolidated = consolidated
+        self.explanation = explanation
+        self.critical_findings = critical_findings
+        self.strengths = strengths
+        self.attention_items = attention_items
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Analysis":
+        """Build from an analysis dict; invalid values are replaced by schema defaults."""
+        d = normalize_analysis(data)
+        company, meta, c = d["company"], d["meta"], d["consolidated"]
+        return cls(
+            company["name"], company["reg_no"],
+            banks={name: BankResult.from_dict(bank) for name, bank in d["banks"].items()},
+            consolidated=BankResult.from_dict({**c, "ccris": (), "ctos": ()}),
+            explanation=c["explanation"],
+            entities=tuple(Entity.from_dict(e) for e in d["entities"]),
+            report_date=meta["report_date"], analysis_date=meta["analysis_date"],
+            prepared_by=meta["prepared_by"],
+            critical_findings=tuple(d["critical_findings"]), strengths=tuple(d["strengths"]),
+            attention_items=tuple(d["attention_items"]), schema_version=d["_schema_version"],
+        )
+
+    def to_dict(self) -> NormalizedAnalysis:
+        """The normalized JSON form, ready for ``generate_html_report`` or ``json.dumps``."""
+        consolidated = self.consolidated.to_dict(parameters=False)
+        consolidated["explanation"] = self.explanation
+        return NormalizedAnalysis({
+            "_schema_version": self.schema_version,
+            "company": {"name": self.company_name, "reg_no": self.reg_no},
+            "meta": {"report_date": self.report_date, "analysis_date": self.analysis_date,
+                     "prepared_by": self.prepared_by},
+            "entities": [e.to_dict() for e in self.entities],
+            "banks": {name: bank.to_dict() for name, bank in self.banks.items()},
+            "consolidated": consolidated,
+            "critical_findings": list(self.critical_findings),
+            "strengths": list(self.strengths),
+            "attention_items": list(self.attention_items),
+        })
+
+
+# =============================================================================
+# LOADERS
+# =============================================================================
+
+def load_analysis(path: str) -> Analysis:
+    """Load and validate one analysis JSON file."""
+    with open(path, "rb") as f:
+        return Analysis.from_dict(parse_analysis(f.read()))
+
+
+def iter_analyses_jsonl(path: str) -> Iterator[Analysis]:
+    """Stream analyses from a JSONL file, one per line."""
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield Analysis.from_dict(parse_analysis(line))
+
+
+# =============================================================================
+# MEMORY BENCHMARK
+# =============================================================================
+
+def measure_memory(raw: bytes, copies: int = 1000) -> Dict[str, float]:
+    """Average bytes per analysis held as parsed dicts versus as ``Analysis`` objects."""
+    import gc
+    import tracemalloc
+
+    def measure(build) -> float:
+        gc.collect()
+        tracemalloc.start()
+        held = [build() for _ in range(copies)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del held
+        return size / copies
+
+    as_dicts = measure(lambda: loads(raw))
+    as_model = measure(lambda: Analysis.from_dict(loads(raw)))
+    return {"dict_bytes": as_dicts, "model_bytes": as_model, "ratio": as_dicts / as_model}
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare memory use of dict and typed analyses.")
+    parser.add_argument("copies", nargs="?", type=int, default=1000)
+    parser.add_argument("--input", default="sample_analysis_output.json")
+    args = parser.parse_args(argv)
+
+    with open(args.input, "rb") as f:
+        raw = f.read()
+    result = measure_memory(raw, args.copies)
+    print(f"{args.copies} analyses from {args.input}")
+    print(f"  dicts:  {result['dict_bytes'] / 1024:8.1f} KiB per analysis")
+    print(f"  model:  {result['model_bytes'] / 1024:8.1f} KiB per analysis")
+    print(f"  {result['ratio']:.1f}x smaller")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
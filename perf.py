@@ -0,0 +1,183 @@
+"""
+Performance Instrumentation for Kredit Lab
+==========================================
+Named per-phase timers and byte counts for the upload -> parse -> render ->
+preview path, with cumulative counters exported in Prometheus text format.
+
+Instrumentation is off by default. Instrumented code checks ``perf.enabled()``
+once per call, so the disabled cost is one thread-local lookup. Enable it for
+the process with ``KREDITLAB_PERF=1`` or ``perf.enable()``, or for the current
+thread only (one Streamlit script run, one pool job) with
+``perf.enable_thread()``.
+
+Usage:
+    with perf.capture() as run:
+        html = generate_html_report(data)
+    run  # {"render.entities": {"calls": 1, "seconds": ..., "bytes": ...}, ...}
+
+    perf.write_prometheus("kreditlab_metrics.prom")
+"""
+
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+ENABLED = os.environ.get("KREDITLAB_PERF", "") not in ("", "0")
+
+DEFAULT_METRICS_FILE = "kreditlab_metrics.prom"
+
+_lock = threading.Lock()
+_totals: Dict[str, Dict[str, float]] = {}
+_local = threading.local()
+
+
+def enable(flag: bool = True) -> None:
+    global ENABLED
+    ENABLED = flag
+
+
+def enable_thread(flag: Optional[bool] = True) -> None:
+    """Turn recording on or off for this thread only; ``None`` follows ``ENABLED`` again."""
+    _local.enabled = flag
+
+
+def enabled() -> bool:
+    """Whether phases are recorded on this thread."""
+    flag = getattr(_local, "enabled", None)
+    return ENABLED if flag is None else flag
+
+
+# =============================================================================
+# RECORDING
+# =============================================================================
+
+def record(phase: str, seconds: float, nbytes: int = 0, calls: int = 1) -> None:
+    """Add ``calls`` calls of ``phase`` to the cumulative counters and to the active capture."""
+    with _lock:
+        totals = _totals.get(phase)
+        if totals is None:
+            totals = _totals[phase] = {"calls": 0, "seconds": 0.0, "bytes": 0}
+        totals["calls"] += calls
+        totals["seconds"] += seconds
+        totals["bytes"] += nbytes
+    run = getattr(_local, "run", None)
+    if run is not None:
+        entry = run.get(phase)
+        if entry is None:
+            entry = run[phase] = {"calls": 0, "seconds": 0.0, "bytes": 0}
+        entry["calls"] += calls
+        entry["seconds"] += seconds
+        entry["bytes"] += nbytes
+
+
+def merge(run: Dict[str, Dict[str, float]]) -> None:
+    """Record phases captured elsewhere, e.g. in a worker process."""
+    for name, totals in run.items():
+        record(name, totals["seconds"], int(totals["bytes"]), int(totals["calls"]))
+
+
+class _Phase:
+    __slots__ = ("name", "nbytes", "start")
+
+    def __init__(self, name: str, nbytes: int):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self) -> "_Phase":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        record(self.name, time.perf_counter() - self.start, self.nbytes)
+
+
+class _NullPhase:
+    __slots__ = ("nbytes",)
+
+    def __enter__(self) -> "_NullPhase":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name: str, nbytes: int = 0):
+    """Time a block as ``name``; set ``.nbytes`` on the result to record a byte count."""
+    return _Phase(name, nbytes) if enabled() else _NULL_PHASE
+
+
+def text_bytes(text: str) -> int:
+    """UTF-8 size of ``text``; ``isascii()`` is O(1) in CPython, so ASCII text is not encoded."""
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def begin_capture() -> Dict[str, Dict[str, float]]:
+    """Start collecting the phases recorded on this thread (e.g. one Streamlit script run)."""
+    run: Dict[str, Dict[str, float]] = {}
+    _local.run = run
+    return run
+
+
+def end_capture() -> None:
+    _local.run = None
+
+
+@contextmanager
+def capture() -> Iterator[Dict[str, Dict[str, float]]]:
+    """Collect the phases recorded on this thread inside the block."""
+    previous = getattr(_local, "run", None)
+    run = begin_capture()
+    try:
+        yield run
+    finally:
+        _local.run = previous
+
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Cumulative counters for every phase since start-up (or ``reset``)."""
+    with _lock:
+        return {name: dict(totals) for name, totals in _totals.items()}
+
+
+def reset() -> None:
+    with _lock:
+        _totals.clear()
+
+
+def prometheus_text(totals: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+    """Cumulative counters in the Prometheus text exposition format."""
+    totals = snapshot() if totals is None else totals
+    lines = []
+    for metric, key, help_text in (
+        ("kreditlab_phase_calls_total", "calls", "Number of times each phase ran."),
+        ("kreditlab_phase_seconds_total", "seconds", "Cumulative wall time spent in each phase."),
+        ("kreditlab_phase_bytes_total", "bytes", "Cumulative bytes produced or consumed by each phase."),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for name in sorted(totals):
+            lines.append(f'{metric}{{phase="{name}"}} {totals[name][key]:.9g}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str = DEFAULT_METRICS_FILE, extra: str = "") -> None:
+    """Atomically write ``prometheus_text()`` and ``extra`` to ``path`` (for a node_exporter textfile collector)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(prometheus_text() + extra)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
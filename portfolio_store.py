@@ -0,0 +1,364 @@
+"""
+Portfolio Store for Kredit Lab
+==============================
+Columnar store of every analysis we have generated, for aggregate queries
+across the portfolio without re-parsing the JSON files.
+
+Each analysis is flattened into one row per company x bank x parameter.
+Bank, parameter, classification, and status are small integer codes
+(shared with ``scoring.py``), stored as NumPy columns in append-only chunk
+directories that are memory-mapped at query time. Ingestion from JSONL
+streams line by line and flushes a chunk every ``chunk_rows`` rows, so
+memory stays bounded regardless of the input size. Analyses already in the
+store (same JSON) are skipped, and lines that are not valid analyses are
+reported and skipped before anything is written.
+
+Usage:
+    python portfolio_store.py --store portfolio/ ingest archive.jsonl analyses/*.json
+    python portfolio_store.py fail-rate "Credit Card Utilization" --bank Maybank --since 2024-10-01
+    python portfolio_store.py grades --since 2024-10-01 --until 2024-12-31
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from analysis_schema import loads, validate_analysis
+from html_generator import CCRIS_PARAM_NAMES, CTOS_PARAM_NAMES
+from scoring import BANK_NAMES, CLASSIFICATION_CODES, FAIL, GRADE_CODES, GRADES, PASS, STATUS_CODES
+
+DEFAULT_STORE_DIR = "portfolio"
+
+SOURCES = ["CCRIS", "CTOS"]
+PARAM_NAMES = [CCRIS_PARAM_NAMES, CTOS_PARAM_NAMES]
+BANK_CODES = {name: code for code, name in enumerate(BANK_NAMES)}
+
+# Column name -> dtype for the parameter rows.
+ROW_COLUMNS = {
+    "analysis": np.int32,
+    "bank": np.int8,
+    "source": np.int8,
+    "param": np.int16,
+    "classification": np.int8,
+    "status": np.int8,
+}
+
+
+def _date_code(value) -> int:
+    """Turn "YYYY-MM-DD" into a sortable YYYYMMDD integer (0 when missing or malformed)."""
+    try:
+        return int(str(value)[:10].replace("-", ""))
+    except (TypeError, ValueError):
+        return 0
+
+
+def analysis_digest(data: Dict) -> str:
+    normalized = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def iter_analyses(paths: Iterable[str], errors: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Stream analyses from JSON files and JSONL files (one analysis per line).
+
+    Entries that are not valid JSON or fail schema validation are skipped;
+    each is described in ``errors`` as ``"file:line: problem"``.
+    """
+    def entries() -> Iterator[Tuple[str, bytes]]:
+        for path in paths:
+            with open(path, "rb") as f:
+                if not path.endswith(".jsonl"):
+                    yield path, f.read()
+                    continue
+                for line_no, line in enumerate(f, 1):
+                    if line.strip():
+                        yield f"{path}:{line_no}", line
+
+    for source, raw in entries():
+        try:
+            data = loads(raw)
+        except ValueError as e:
+            problems = [f"invalid JSON ({e})"]
+        else:
+            problems = validate_analysis(data)[1]
+        if problems:
+            if errors is not None:
+                more = f" (+{len(problems) - 1} more)" if len(problems) > 1 else ""
+                errors.append(f"{source}: {problems[0]}{more}")
+            continue
+        yield data
+
+
+def parameter_code(name: str) -> Tuple[int, int]:
+    """Resolve a CCRIS/CTOS parameter name to its (source, index) codes."""
+    for source, names in enumerate(PARAM_NAMES):
+        if name in names:
+            return source, names.index(name)
+    raise KeyError(f"Unknown parameter: {name!r}")
+
+
+def parameter_name(source: int, index: int) -> str:
+    names = PARAM_NAMES[source]
+    return names[index] if index < len(names) else f"{SOURCES[source]} Param {index + 1}"
+
+
+# =============================================================================
+# CHUNK BUFFER
+# =============================================================================
+
+class _ChunkBuffer:
+    """Typed append buffers for one chunk, flushed to ``.npy`` columns."""
+
+    def __init__(self):
+        typecodes = {np.int32: "i", np.int16: "h", np.int8: "b"}
+        self.rows = {col: array(typecodes[dtype]) for col, dtype in ROW_COLUMNS.items()}
+        self.dates = array("i")
+        self.grades = array("b")   # analyses x banks x (raw, final), -1 when missing
+        self.scores = array("f")   # analyses x banks, NaN when missing
+        self.companies: List[Dict] = []
+
+    def __len__(self) -> int:
+        return len(self.rows["analysis"])
+
+    def add(self, data: Dict, digest: str) -> None:
+        local = len(self.companies)
+        company = data.get("company", {})
+        meta = data.get("meta", {})
+        self.companies.append({"name": company.get("name"), "reg_no": company.get("reg_no"),
+                               "report_date": meta.get("report_date"), "digest": digest})
+        self.dates.append(_date_code(meta.get("report_date") or meta.get("analysis_date")))
+
+        banks = data.get("banks", {})
+        rows = self.rows
+        for b, bn in enumerate(BANK_NAMES):
+            bd = banks.get(bn)
+            if bd is None:
+                self.grades.extend((-1, -1))
+                self.scores.append(float("nan"))
+                continue
+            self.grades.append(GRADE_CODES.get(bd.get("raw_grade"), -1))
+            self.grades.append(GRADE_CODES.get(bd.get("final_grade"), -1))
+            score = bd.get("score")
+            self.scores.append(float(score) if isinstance(score, (int, float)) else float("nan"))
+            for source, key in enumerate(("ccris", "ctos")):
+                for i, p in enumerate(bd.get(key, [])):
+                    rows["analysis"].append(local)
+                    rows["bank"].append(b)
+                    rows["source"].append(source)
+                    rows["param"].append(i)
+                    rows["classification"].append(CLASSIFICATION_CODES.get(p.get("classification"), 0))
+                    rows["status"].append(STATUS_CODES.get(p.get("status"), 0))
+
+    def flush(self, path: str) -> None:
+        """Write the chunk to ``path`` atomically."""
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for col, dtype in ROW_COLUMNS.items():
+            np.save(os.path.join(tmp, f"{col}.npy"), np.frombuffer(self.rows[col], dtype=dtype))
+        n = len(self.companies)
+        np.save(os.path.join(tmp, "date.npy"), np.frombuffer(self.dates, dtype=np.int32))
+        np.save(os.path.join(tmp, "grades.npy"),
+                np.frombuffer(self.grades, dtype=np.int8).reshape(n, len(BANK_NAMES), 2))
+        np.save(os.path.join(tmp, "scores.npy"),
+                np.frombuffer(self.scores, dtype=np.float32).reshape(n, len(BANK_NAMES)))
+        with open(os.path.join(tmp, "companies.jsonl"), "w", encoding="utf-8") as f:
+            for company in self.companies:
+                f.write(json.dumps(company, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class PortfolioStore:
+    """Append-only columnar store of flattened analyses."""
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIR, chunk_rows: int = 250_000):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+        self._digests: Optional[set] = None
+        # A chunk left half-written by a crash; the next flush would reuse its name.
+        for name in os.listdir(directory):
+            if name.startswith("chunk-") and name.endswith(".tmp"):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    # Ingestion
+    # -------------------------------------------------------------------------
+
+    def ingest(self, analyses: Iterable[Dict]) -> int:
+        """Append analyses to the store; returns how many were new."""
+        digests = self._known_digests()
+        count = 0
+        buffer = _ChunkBuffer()
+        for data in analyses:
+            digest = analysis_digest(data)
+            if digest in digests:
+                continue
+            digests.add(digest)
+            buffer.add(data, digest)
+            count += 1
+            if len(buffer) >= self.chunk_rows:
+                buffer.flush(self._next_chunk_path())
+                buffer = _ChunkBuffer()
+        if buffer.companies:
+            buffer.flush(self._next_chunk_path())
+        return count
+
+    def ingest_jsonl(self, path: str, errors: Optional[List[str]] = None) -> int:
+        """Stream a JSONL file (one analysis per line) into the store, skipping invalid lines."""
+        return self.ingest(iter_analyses([path], errors))
+
+    def clear(self) -> None:
+        for name in self._chunk_names():
+            shutil.rmtree(os.path.join(self.directory, name))
+        self._digests = set()
+
+    def _known_digests(self) -> set:
+        if self._digests is None:
+            self._digests = set()
+            for name in self._chunk_names():
+                with open(os.path.join(self.directory, name, "companies.jsonl"), "rb") as f:
+                    # Chunks written before digests were recorded cannot be matched.
+                    self._digests.update(d for d in (loads(line).get("digest") for line in f if line.strip()) if d)
+        return self._digests
+
+    def _chunk_names(self) -> List[str]:
+        return sorted(n for n in os.listdir(self.directory) if n.startswith("chunk-") and not n.endswith(".tmp"))
+
+    def _next_chunk_path(self) -> str:
+        names = self._chunk_names()
+        last = int(names[-1].split("-")[1]) if names else 0
+        return os.path.join(self.directory, f"chunk-{last + 1:06d}")
+
+    def _chunks(self, columns: Iterable[str]) -> Iterator[Dict[str, np.ndarray]]:
+        for name in self._chunk_names():
+            path = os.path.join(self.directory, name)
+            yield {col: np.load(os.path.join(path, f"{col}.npy"), mmap_mode="r") for col in columns}
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _date_mask(dates: np.ndarray, since: Optional[str], until: Optional[str]) -> np.ndarray:
+        mask = np.ones(len(dates), dtype=bool)
+        if since:
+            mask &= dates >= _date_code(since)
+        if until:
+            mask &= dates <= _date_code(until)
+        return mask
+
+    def __len__(self) -> int:
+        return sum(len(chunk["date"]) for chunk in self._chunks(["date"]))
+
+    def fail_rate(self, parameter: str, bank: Optional[str] = None,
+                  since: Optional[str] = None, until: Optional[str] = None) -> Dict:
+        """Fail rate of one parameter among PASS/FAIL evaluations, optionally for one bank and date range."""
+        source, index = parameter_code(parameter)
+        passed = failed = 0
+        for chunk in self._chunks(["date", *ROW_COLUMNS]):
+            mask = (chunk["source"] == source) & (chunk["param"] == index)
+            if bank is not None:
+                mask &= chunk["bank"] == BANK_CODES[bank]
+            if since or until:
+                mask &= self._date_mask(chunk["date"], since, until)[chunk["analysis"]]
+            status = chunk["status"][mask]
+            passed += int(np.count_nonzero(status == PASS))
+            failed += int(np.count_nonzero(status == FAIL))
+        evaluated = passed + failed
+        return {"parameter": parameter, "bank": bank, "passed": passed, "failed": failed,
+                "fail_rate": failed / evaluated if evaluated else None}
+
+    def pass_rates(self, bank: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """PASS/FAIL counts for every parameter, keyed by parameter name."""
+        counts: Dict[Tuple[int, int], List[int]] = {}
+        for chunk in self._chunks(["date", *ROW_COLUMNS]):
+            mask = np.ones(len(chunk["status"]), dtype=bool)
+            if bank is not None:
+                mask &= chunk["bank"] == BANK_CODES[bank]
+            if since or until:
+                mask &= self._date_mask(chunk["date"], since, until)[chunk["analysis"]]
+            key = (chunk["source"][mask].astype(np.int32) << 16) | chunk["param"][mask]
+            status = chunk["status"][mask]
+            for column, code in enumerate((PASS, FAIL)):
+                keys, n = np.unique(key[status == code], return_counts=True)
+                for k, c in zip(keys.tolist(), n.tolist()):
+                    counts.setdefault((k >> 16, k & 0xFFFF), [0, 0])[column] += c
+        return {parameter_name(source, index): {"passed": passed, "failed": failed}
+                for (source, index), (passed, failed) in sorted(counts.items())}
+
+    def grade_distribution(self, kind: str = "final", since: Optional[str] = None,
+                           until: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Count of each raw or final grade, by bank."""
+        column = {"raw": 0, "final": 1}[kind]
+        counts = np.zeros((len(BANK_NAMES), len(GRADES)), dtype=np.int64)
+        for chunk in self._chunks(["date", "grades"]):
+            grades = chunk["grades"][self._date_mask(chunk["date"], since, until), :, column]
+            for b in range(len(BANK_NAMES)):
+                g = grades[:, b]
+                counts[b] += np.bincount(g[g >= 0], minlength=len(GRADES))[:len(GRADES)]
+        return {bn: dict(zip(GRADES, counts[b].tolist())) for b, bn in enumerate(BANK_NAMES)}
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest and query the Kredit Lab portfolio store.")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="Store directory (default: portfolio)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Ingest JSONL files or JSON analyses")
+    ingest.add_argument("paths", nargs="+")
+
+    fail = sub.add_parser("fail-rate", help="Fail rate of one parameter")
+    fail.add_argument("parameter")
+    fail.add_argument("--bank", choices=BANK_NAMES)
+
+    rates = sub.add_parser("pass-rates", help="PASS/FAIL counts for every parameter")
+    rates.add_argument("--bank", choices=BANK_NAMES)
+
+    grades = sub.add_parser("grades", help="Grade distribution by bank")
+    grades.add_argument("--kind", choices=["raw", "final"], default="final")
+
+    for p in (fail, rates, grades):
+        p.add_argument("--since", help="Earliest report date (YYYY-MM-DD)")
+        p.add_argument("--until", help="Latest report date (YYYY-MM-DD)")
+
+    args = parser.parse_args(argv)
+    store = PortfolioStore(args.store)
+
+    if args.command == "ingest":
+        errors: List[str] = []
+        total = store.ingest(iter_analyses(args.paths, errors))
+        for error in errors:
+            print(f"⚠️  Skipped {error}", file=sys.stderr)
+        print(f"Ingested {total} new analyses into {args.store} ({len(errors)} invalid entries skipped)")
+    elif args.command == "fail-rate":
+        try:
+            rate = store.fail_rate(args.parameter, args.bank, args.since, args.until)
+        except KeyError as e:
+            parser.error(e.args[0])
+        print(json.dumps(rate, indent=2))
+    elif args.command == "pass-rates":
+        print(json.dumps(store.pass_rates(args.bank, args.since, args.until), indent=2))
+    else:
+        print(json.dumps(store.grade_distribution(args.kind, args.since, args.until), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+Render Pool for Kredit Lab
+==========================
+One process-wide pool of worker processes that parses and renders for every
+Streamlit session, so a huge analysis neither blocks its session's script
+thread nor competes with other sessions for the GIL.
+
+Jobs wait in per-session queues and are dispatched round-robin across
+sessions, so one analyst's batch cannot starve another's single upload.
+The number of queued jobs is bounded: ``submit`` raises ``PoolFull`` instead
+of queueing more (or waits for room with ``block=True``). Jobs carry a tag
+("upload", "render", ...) so a session can cancel its earlier work when the
+user uploads a new file. A queued job is dropped; a job already running in a
+worker cannot be interrupted, so it finishes and its result is discarded.
+If a worker process dies, the jobs it took down fail and the pool replaces
+its executor, so later jobs run normally. Workers share report fragments
+through a disk-backed cache in ``fragment_dir``, so a re-upload reuses the
+sections rendered by whichever worker handled the previous version.
+
+Usage:
+    pool = RenderPool(workers=4, max_queued=32)
+    job = pool.submit(session_id, parse_analysis, raw, tag="upload")
+    job.status        # "queued" -> "running" -> "done" / "failed" / "cancelled"
+    data = job.result()
+    pool.stats()      # queue depth, running jobs, wait times
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import perf
+from analysis_schema import parse_analysis
+from batch_render import RenderResult, render_job_with_data
+from html_generator import FragmentCache, generate_html_report
+from report_cache import ReportCache
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+# Wait times kept for the percentile in ``stats()``.
+WAIT_SAMPLES = 1000
+
+DEFAULT_FRAGMENT_DIR = ".kreditlab_fragments"
+
+
+class PoolFull(RuntimeError):
+    """Raised by ``RenderPool.submit`` when ``max_queued`` jobs are already waiting."""
+
+
+class JobCancelled(Exception):
+    """Raised by ``RenderJob.result`` for a cancelled job."""
+
+
+# =============================================================================
+# WORKER
+# =============================================================================
+
+_fragment_cache = None
+
+
+def _init_worker(fragment_dir: Optional[str]) -> None:
+    """Give the worker process the fragment cache shared by every worker."""
+    global _fragment_cache
+    if fragment_dir:
+        _fragment_cache = ReportCache(fragment_dir, max_memory_items=1024, max_disk_bytes=64 * 1024 * 1024,
+                                      max_age_seconds=7 * 24 * 3600)
+
+
+def render_report(data: Dict, mode: str = "static", context: Optional[Dict] = None,
+                  timed: bool = False) -> Tuple[str, Dict[str, bool], Dict[str, Dict[str, float]]]:
+    """Render in a worker process; returns the report, its fragment log, and (if ``timed``) its phases.
+
+    Fragments come from the cache shared by every worker (or, outside a
+    ``RenderPool`` with a ``fragment_dir``, a per-process one), so a corrected
+    re-upload only re-renders what changed. Pass the phases to ``perf.merge``
+    in the calling process.
+    """
+    global _fragment_cache
+    if _fragment_cache is None:
+        _fragment_cache = FragmentCache()
+    perf.enable_thread(timed)
+    fragment_log: Dict[str, bool] = {}
+    with perf.capture() as run:
+        html = generate_html_report(data, mode=mode, fragment_cache=_fragment_cache, fragment_log=fragment_log,
+                                    **(context or {}))
+    return html, fragment_log, run
+
+
+def parse_upload(raw: bytes, timed: bool = False) -> Tuple[Dict, Dict[str, Dict[str, float]]]:
+    """``parse_analysis`` in a worker process; returns the analysis and (if ``timed``) its phases."""
+    perf.enable_thread(timed)
+    with perf.capture() as run:
+        data = parse_analysis(raw)
+    return data, run
+
+
+def render_upload(name: str, raw: bytes, out_dir: str) -> Tuple[RenderResult, Optional[Dict]]:
+    """Render one file of a batch into ``out_dir``; also returns the parsed analysis for indexing."""
+    return render_job_with_data((name, name, raw), out_dir)
+
+
+# =============================================================================
+# JOBS
+# =============================================================================
+
+class RenderJob:
+    """A unit of work submitted to the pool; ``status`` moves from queued to running to a final state."""
+
+    def __init__(self, session: str, tag: Optional[str], fn: Callable, args: Tuple, kwargs: Dict):
+        self.session = session
+        self.tag = tag
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.status = QUEUED
+        self.submitted = time.monotonic()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._done = threading.Event()
+        self._result: Any = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def wait_seconds(self) -> float:
+        """Time spent queued so far (or in total, once started)."""
+        return (self.started or time.monotonic()) - self.submitted
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """The job's return value; re-raises its exception, or ``JobCancelled``."""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Job still {self.status} after {timeout}s")
+        if self.status == CANCELLED:
+            raise JobCancelled()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _finish(self, status: str, result: Any = None, error: Optional[BaseException] = None) -> bool:
+        # Caller holds the pool lock. Returns False if the job had already finished.
+        if self._done.is_set():
+            return False
+        self.status, self._result, self._error = status, result, error
+        self.finished = time.monotonic()
+        self.fn = self.args = self.kwargs = None
+        self._done.set()
+        return True
+
+
+# =============================================================================
+# POOL
+# =============================================================================
+
+class RenderPool:
+    """Bounded, session-fair front end for a ``ProcessPoolExecutor``."""
+
+    def __init__(self, workers: Optional[int] = None, max_queued: Optional[int] = None,
+                 fragment_dir: Optional[str] = DEFAULT_FRAGMENT_DIR):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queued = self.workers * 8 if max_queued is None else max_queued
+        self.fragment_dir = fragment_dir
+        self._executor = self._new_executor()
+        # Reentrant: a future that is already done runs its callback inside ``_dispatch``.
+        self._lock = threading.RLock()
+        self._room = threading.Condition(self._lock)
+        # Session -> its queued jobs; the order of sessions is the round-robin order.
+        self._queues: "OrderedDict[str, Deque[RenderJob]]" = OrderedDict()
+        self._running: List[RenderJob] = []
+        self._queued = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._counters = {
+            "submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0, "restarts": 0,
+            "wait_seconds": 0.0, "run_seconds": 0.0, "max_wait_seconds": 0.0,
+        }
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def submit(self, session: str, fn: Callable, *args, tag: Optional[str] = None, block: bool = False,
+               timeout: Optional[float] = None, **kwargs) -> RenderJob:
+        """Queue ``fn(*args, **kwargs)`` for a worker process on behalf of ``session``.
+
+        ``fn`` and its arguments must be picklable. When the queue is full this
+        raises ``PoolFull``, or with ``block`` waits up to ``timeout`` for room.
+        """
+        job = RenderJob(session, tag, fn, args, kwargs)
+        with self._lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._queued >= self.max_queued:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    self._counters["rejected"] += 1
+                    raise PoolFull(f"{self._queued} render jobs already queued")
+                self._room.wait(remaining)
+            self._queues.setdefault(session, deque()).append(job)
+            self._queued += 1
+            self._counters["submitted"] += 1
+            self._dispatch()
+        return job
+
+    def cancel(self, session: str, tag: Optional[str] = None) -> int:
+        """Cancel the session's unfinished jobs (only those with ``tag``, if given); returns how many."""
+        with self._lock:
+            cancelled = 0
+            queue = self._queues.get(session)
+            if queue:
+                keep: Deque[RenderJob] = deque()
+                for job in queue:
+                    if tag is not None and job.tag != tag:
+                        keep.append(job)
+                    elif job._finish(CANCELLED):
+                        cancelled += 1
+                self._queued -= len(queue) - len(keep)
+                if keep:
+                    self._queues[session] = keep
+                else:
+                    del self._queues[session]
+                self._room.notify_all()
+            for job in self._running:
+                if job.session == session and (tag is None or job.tag == tag) and job._finish(CANCELLED):
+                    cancelled += 1
+            self._counters["cancelled"] += cancelled
+        return cancelled
+
+    def position(self, job: RenderJob) -> int:
+        """How many queued jobs will be dispatched before ``job`` (0 once it is running)."""
+        with self._lock:
+            queue = self._queues.get(job.session)
+            if job.status != QUEUED or not queue:
+                return 0
+            index = queue.index(job)
+            ahead, before = 0, True
+            for session, other in self._queues.items():
+                if session == job.session:
+                    before = False
+                    ahead += index
+                else:
+                    # Round-robin: sessions earlier in the rotation get one more turn than later ones.
+                    ahead += min(len(other), index + 1 if before else index)
+            return ahead
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth, running jobs, and job counters; wait times are in seconds."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["queued"] = self._queued
+            stats["running"] = len(self._running)
+            stats["sessions"] = len(self._queues)
+            waits = sorted(self._waits)
+        stats["workers"] = self.workers
+        stats["max_queued"] = self.max_queued
+        stats["p95_wait_seconds"] = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        return stats
+
+    def prometheus_text(self) -> str:
+        """Pool gauges and counters in the Prometheus text exposition format."""
+        stats = self.stats()
+        lines = []
+        for name, key, kind, help_text in (
+            ("kreditlab_render_pool_queued", "queued", "gauge", "Jobs waiting for a worker."),
+            ("kreditlab_render_pool_running", "running", "gauge", "Jobs running in a worker."),
+            ("kreditlab_render_pool_workers", "workers", "gauge", "Worker processes."),
+            ("kreditlab_render_pool_jobs_submitted_total", "submitted", "counter", "Jobs accepted."),
+            ("kreditlab_render_pool_jobs_completed_total", "completed", "counter", "Jobs that returned."),
+            ("kreditlab_render_pool_jobs_failed_total", "failed", "counter", "Jobs that raised."),
+            ("kreditlab_render_pool_jobs_cancelled_total", "cancelled", "counter", "Jobs cancelled."),
+            ("kreditlab_render_pool_jobs_rejected_total", "rejected", "counter", "Jobs refused with a full queue."),
+            ("kreditlab_render_pool_restarts_total", "restarts", "counter", "Executors replaced after a worker died."),
+            ("kreditlab_render_pool_wait_seconds_total", "wait_seconds", "counter", "Time jobs spent queued."),
+            ("kreditlab_render_pool_run_seconds_total", "run_seconds", "counter", "Time jobs spent running."),
+            ("kreditlab_render_pool_wait_seconds_p95", "p95_wait_seconds", "gauge", "95th percentile queue wait."),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {stats[key]:.9g}")
+        return "\n".join(lines) + "\n"
+
+    def shutdown(self) -> None:
+        with self._lock:
+            sessions = list(self._queues)
+        for session in sessions:
+            self.cancel(session)
+        self._executor.shutdown(wait=True)
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    def _dispatch(self) -> None:
+        # Caller holds the lock. Start queued jobs round-robin across sessions until every worker is busy.
+        while len(self._running) < self.workers and self._queues:
+            session, queue = self._queues.popitem(last=False)
+            job = queue.popleft()
+            if queue:
+                self._queues[session] = queue
+            self._queued -= 1
+            self._room.notify()
+            job.status = RUNNING
+            job.started = time.monotonic()
+            wait = job.started - job.submitted
+            self._waits.append(wait)
+            self._counters["wait_seconds"] += wait
+            self._counters["max_wait_seconds"] = max(self._counters["max_wait_seconds"], wait)
+            if perf.enabled():
+                perf.record("pool.wait", wait)
+            self._running.append(job)
+            executor = self._executor
+            try:
+                try:
+                    future = executor.submit(job.fn, *job.args, **job.kwargs)
+                except BrokenProcessPool:
+                    self._replace_executor(executor)
+                    executor = self._executor
+                    future = executor.submit(job.fn, *job.args, **job.kwargs)
+            except Exception as e:  # submitting after shutdown
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda f, job=job, executor=executor: self._finished(job, f, executor))
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.fragment_dir,))
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> None:
+        # Caller holds the lock. A dead worker breaks the whole executor; start a new one, once.
+        if self._executor is not broken:
+            return
+        self._executor = self._new_executor()
+        self._counters["restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _finished(self, job: RenderJob, future: Future, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            self._running.remove(job)
+            self._counters["run_seconds"] += time.monotonic() - job.started
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                self._replace_executor(executor)
+            if error is None:
+                if job._finish(DONE, result=future.result()):
+                    self._counters["completed"] += 1
+            elif job._finish(FAILED, error=error):
+                self._counters["failed"] += 1
+            self._dispatch()
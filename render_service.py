@@ -0,0 +1,486 @@
+"""
+Kredit Lab Render Service
+=========================
+A small asyncio HTTP service that turns analysis JSON into an HTML report,
+for systems that need reports programmatically without driving the
+Streamlit page.
+
+Rendering runs on a bounded process pool, so the event loop only moves
+bytes. Requests beyond the pool plus a short queue get ``429`` with
+``Retry-After`` instead of waiting, and bodies over the size limit get
+``413`` before they are read. A render that takes longer than the timeout
+gets ``503``; if a worker process dies, the pool is replaced and the
+request that hit it gets ``503``.
+
+Endpoints:
+    POST /render[?mode=static|lazy]  analysis JSON -> text/html
+    GET  /healthz                    liveness and current load (JSON)
+    GET  /metrics                    counters in Prometheus text format
+
+Usage:
+    python render_service.py serve --port 8080 -j 4
+    curl --data-binary @sample_analysis_output.json http://127.0.0.1:8080/render > report.html
+    python render_service.py loadtest -n 2000 -c 64          # starts its own server on a free port
+    python render_service.py loadtest --url http://127.0.0.1:8080 -n 2000 -c 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from analysis_schema import AnalysisValidationError, parse_analysis
+from html_generator import GENERATOR_VERSION, REPORT_MODES, generate_html_report
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_MAX_BODY = 5 * 1024 * 1024
+DEFAULT_TIMEOUT = 30.0
+MAX_HEADER_BYTES = 16 * 1024
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 408: "Request Timeout",
+    411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity", 429: "Too Many Requests",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+Response = Tuple[int, str, bytes]
+
+
+# =============================================================================
+# WORKER
+# =============================================================================
+
+def _json_response(status: int, payload: Dict) -> Response:
+    return status, "application/json", json.dumps(payload).encode("utf-8")
+
+
+def render_request(body: bytes, mode: str) -> Response:
+    """Parse, validate, and render one request body; runs in a worker process.
+
+    Errors are returned as responses rather than raised, so nothing has to be
+    pickled back to the server except bytes.
+    """
+    try:
+        data = parse_analysis(body)
+    except AnalysisValidationError as e:
+        return _json_response(422, {"error": "Analysis does not match the schema", "errors": e.errors})
+    except ValueError as e:  # json.JSONDecodeError and orjson.JSONDecodeError both subclass ValueError
+        return _json_response(400, {"error": f"Invalid JSON: {e}"})
+    return 200, "text/html; charset=utf-8", generate_html_report(data, mode=mode).encode("utf-8")
+
+
+# =============================================================================
+# SERVER
+# =============================================================================
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RenderService:
+    """HTTP front end for a pool of render workers.
+
+    At most ``workers + max_pending`` render requests are admitted at once;
+    the rest are rejected with 429 so clients back off instead of piling up
+    behind the pool.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 max_body: int = DEFAULT_MAX_BODY, timeout: float = DEFAULT_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = self.workers + (self.workers * 2 if max_pending is None else max_pending)
+        self.max_body = max_body
+        self.timeout = timeout
+        self.in_flight = 0
+        self.started = time.time()
+        self.responses: Dict[int, int] = {}
+        self.counters = {"bytes_in": 0, "bytes_out": 0, "render_seconds": 0.0, "connections": 0,
+                         "pool_restarts": 0, "render_timeouts": 0}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> Tuple[str, int]:
+        """Start the worker pool and listen; returns the bound (host, port)."""
+        self._pool = ProcessPoolExecutor(self.workers)
+        self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_HEADER_BYTES)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    # -------------------------------------------------------------------------
+    # Connection handling
+    # -------------------------------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.counters["connections"] += 1
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(self._read_head(reader), self.timeout)
+                    if request is None:
+                        break
+                    method, target, headers = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, content_type, body = await self._dispatch(method, target, headers, reader)
+                except _HTTPError as e:
+                    # The request body may be unread, so the connection cannot be reused.
+                    keep_alive = False
+                    status, content_type, body = _json_response(e.status, {"error": str(e)})
+                except asyncio.TimeoutError:
+                    keep_alive = False
+                    status, content_type, body = _json_response(408, {"error": "Timed out reading the request"})
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    keep_alive = False
+                    status, content_type, body = _json_response(500, {"error": "Internal server error"})
+                self._write(writer, status, content_type, body, keep_alive)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str]]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise _HTTPError(400, "Incomplete request")
+            return None
+        except asyncio.LimitOverrunError:
+            raise _HTTPError(431, f"Request headers exceed {MAX_HEADER_BYTES} bytes")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise _HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    def _write(self, writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes,
+               keep_alive: bool) -> None:
+        self.responses[status] = self.responses.get(status, 0) + 1
+        self.counters["bytes_out"] += len(body)
+        head = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status in (429, 503):
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+    # -------------------------------------------------------------------------
+    # Endpoints
+    # -------------------------------------------------------------------------
+
+    async def _dispatch(self, method: str, target: str, headers: Dict[str, str],
+                        reader: asyncio.StreamReader) -> Response:
+        url = urlsplit(target)
+        if url.path == "/render":
+            if method != "POST":
+                raise _HTTPError(405, "Use POST")
+            return await self._render(parse_qs(url.query), headers, reader)
+        if method != "GET":
+            raise _HTTPError(405, "Use GET")
+        if url.path == "/healthz":
+            return _json_response(200, self.health())
+        if url.path == "/metrics":
+            return 200, "text/plain; version=0.0.4", self.prometheus_text().encode("utf-8")
+        raise _HTTPError(404, f"No such endpoint: {url.path}")
+
+    async def _render(self, query: Dict[str, List[str]], headers: Dict[str, str],
+                      reader: asyncio.StreamReader) -> Response:
+        mode = query.get("mode", ["static"])[-1]
+        if mode not in REPORT_MODES:
+            raise _HTTPError(400, f"Unknown mode {mode!r} (expected one of {', '.join(REPORT_MODES)})")
+        if "content-length" not in headers or "transfer-encoding" in headers:
+            raise _HTTPError(411, "Send the analysis with a Content-Length header")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise _HTTPError(400, "Invalid Content-Length")
+        if length < 0:
+            raise _HTTPError(400, "Invalid Content-Length")
+        if length > self.max_body:
+            raise _HTTPError(413, f"Analysis is {length:,} bytes; the limit is {self.max_body:,}")
+        if self.in_flight >= self.max_in_flight:
+            # Discard the (size-checked) body so the client can retry on the same connection.
+            await asyncio.wait_for(reader.readexactly(length), self.timeout)
+            return _json_response(429, {"error": f"Server busy: {self.in_flight} renders in progress"})
+
+        self.in_flight += 1
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), self.timeout)
+            self.counters["bytes_in"] += length
+            start = time.perf_counter()
+            pool = self._pool
+            try:
+                future = asyncio.get_running_loop().run_in_executor(pool, render_request, body, mode)
+            except BrokenProcessPool:
+                self._replace_pool(pool)
+                raise _HTTPError(503, "Render worker crashed")
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except BrokenProcessPool:
+                self._replace_pool(pool)
+                raise _HTTPError(503, "Render worker crashed")
+            except asyncio.TimeoutError:
+                # A running render cannot be interrupted: it keeps its slot until the worker finishes.
+                self.counters["render_timeouts"] += 1
+                self.in_flight += 1
+                future.add_done_callback(self._release)
+                raise _HTTPError(503, f"Render did not finish within {self.timeout:g}s")
+            finally:
+                self.counters["render_seconds"] += time.perf_counter() - start
+        finally:
+            self.in_flight -= 1
+
+    def _release(self, future: "asyncio.Future") -> None:
+        self.in_flight -= 1
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace_pool(self._pool)
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Swap in a fresh worker pool, unless another request already replaced ``broken``."""
+        if self._pool is not broken:
+            return
+        self._pool = ProcessPoolExecutor(self.workers)
+        self.counters["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def health(self) -> Dict:
+        return {
+            "status": "ok",
+            "generator_version": GENERATOR_VERSION,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "pool_restarts": self.counters["pool_restarts"],
+            "uptime_seconds": round(time.time() - self.started, 1),
+        }
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP kreditlab_service_responses_total Responses sent, by HTTP status.",
+            "# TYPE kreditlab_service_responses_total counter",
+        ]
+        lines += [f'kreditlab_service_responses_total{{status="{s}"}} {n}' for s, n in sorted(self.responses.items())]
+        for metric, kind, value, help_text in (
+            ("kreditlab_service_render_seconds_total", "counter", self.counters["render_seconds"],
+             "Wall time spent waiting on render workers."),
+            ("kreditlab_service_received_bytes_total", "counter", self.counters["bytes_in"],
+             "Analysis bytes received."),
+            ("kreditlab_service_sent_bytes_total", "counter", self.counters["bytes_out"],
+             "Response body bytes sent."),
+            ("kreditlab_service_connections_total", "counter", self.counters["connections"],
+             "Connections accepted."),
+            ("kreditlab_service_pool_restarts_total", "counter", self.counters["pool_restarts"],
+             "Worker pools replaced after a worker process died."),
+            ("kreditlab_service_render_timeouts_total", "counter", self.counters["render_timeouts"],
+             "Renders answered with 503 for exceeding the timeout."),
+            ("kreditlab_service_in_flight", "gauge", self.in_flight, "Render requests admitted and not finished."),
+            ("kreditlab_service_max_in_flight", "gauge", self.max_in_flight,
+             "Admitted render requests above which new ones get 429."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}", f"{metric} {value:.9g}"]
+        return "\n".join(lines) + "\n"
+
+
+async def serve(host: str, port: int, **options) -> None:
+    """Run the service until SIGINT/SIGTERM."""
+    service = RenderService(**options)
+    host, port = await service.start(host, port)
+    print(f"Listening on http://{host}:{port} ({service.workers} workers, "
+          f"{service.max_in_flight} max in flight)", flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await service.close()
+
+
+# =============================================================================
+# LOAD TEST
+# =============================================================================
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bool, bytes]:
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    status = int(head[0].split(" ", 2)[1])
+    headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in head[1:] if line)}
+    length = int(headers.get("content-length", 0))
+    if length < 0:
+        raise ValueError(f"Invalid Content-Length: {length}")
+    body = await reader.readexactly(length)
+    return status, headers.get("connection", "").lower() != "close", body
+
+
+async def _client(host: str, port: int, request: bytes, queue: "asyncio.Queue[int]",
+                  latencies: List[float], statuses: Dict[str, int]) -> None:
+    """Send requests over one keep-alive connection, reconnecting when the server closes it."""
+    reader = writer = None
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive, _ = await _read_response(reader)
+            key = str(status)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            keep_alive, key = False, type(e).__name__
+        if key == "200":
+            latencies.append(time.perf_counter() - start)
+        statuses[key] = statuses.get(key, 0) + 1
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def load_test(host: str, port: int, body: bytes, requests: int = 1000, concurrency: int = 32,
+                    mode: str = "static") -> Dict:
+    """Send ``requests`` POST /render requests from ``concurrency`` connections.
+
+    Rejected requests (429) are counted but not retried; latencies (ms) are
+    for successful renders only.
+    """
+    request = (f"POST /render?mode={mode} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+               f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+    queue: "asyncio.Queue[int]" = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, request, queue, latencies, statuses) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "mode": mode,
+        "request_bytes": len(body),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(statuses.get("200", 0) / elapsed, 1),
+        "statuses": statuses,
+        "latency_ms": {
+            "p50": round(statistics.median(ordered) * 1000, 2) if ordered else 0.0,
+            "p95": round(_percentile(ordered, 0.95) * 1000, 2),
+            "p99": round(_percentile(ordered, 0.99) * 1000, 2),
+            "max": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        },
+    }
+
+
+def _spawn_server(args: argparse.Namespace) -> Tuple[subprocess.Popen, str, int]:
+    """Start ``render_service.py serve`` on a free port and wait until it is listening."""
+    cmd = [sys.executable, os.path.abspath(__file__), "serve", "--port", "0", "--max-body", str(args.max_body)]
+    if args.workers:
+        cmd += ["-j", str(args.workers)]
+    if args.max_pending is not None:
+        cmd += ["--max-pending", str(args.max_pending)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith("Listening on http://"):
+        proc.kill()
+        raise RuntimeError(f"Render service did not start: {line!r}")
+    address = urlsplit(line.split()[2])
+    return proc, address.hostname, address.port
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="HTTP service that renders Kredit Lab reports.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_pool_options(p: argparse.ArgumentParser) -> None:
+        p.add_argument("-j", "--workers", type=int, default=None, help="Render processes (default: CPU count)")
+        p.add_argument("--max-pending", type=int, default=None,
+                       help="Requests queued beyond the workers before answering 429 (default: 2 per worker)")
+        p.add_argument("--max-body", type=int, default=DEFAULT_MAX_BODY,
+                       help=f"Largest accepted analysis in bytes (default: {DEFAULT_MAX_BODY:,})")
+
+    p = sub.add_parser("serve", help="Run the service")
+    p.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST})")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port, 0 for any free port (default: {DEFAULT_PORT})")
+    p.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                   help=f"Seconds to wait for a request or render (default: {DEFAULT_TIMEOUT:g})")
+    add_pool_options(p)
+
+    p = sub.add_parser("loadtest", help="Load-test a running service, or one started on a free local port")
+    p.add_argument("input", nargs="?", default="sample_analysis_output.json", help="Analysis to POST")
+    p.add_argument("--url", help="Service to test, e.g. http://127.0.0.1:8080 (default: start one)")
+    p.add_argument("-n", "--requests", type=int, default=1000)
+    p.add_argument("-c", "--concurrency", type=int, default=32)
+    p.add_argument("--mode", choices=REPORT_MODES, default="static")
+    p.add_argument("-o", "--output", help="Also write the results as JSON")
+    add_pool_options(p)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port, workers=args.workers, max_pending=args.max_pending,
+                          max_body=args.max_body, timeout=args.timeout))
+        return 0
+
+    with open(args.input, "rb") as f:
+        body = f.read()
+    proc = None
+    if args.url:
+        address = urlsplit(args.url)
+        host, port = address.hostname, address.port or 80
+    else:
+        proc, host, port = _spawn_server(args)
+    try:
+        results = asyncio.run(load_test(host, port, body, args.requests, args.concurrency, args.mode))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if results["statuses"].get("200") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Shared Report Assets for Kredit Lab
+===================================
+Archive-friendly output: one versioned, minified stylesheet and script shared
+by every report, and pre-compressed (gzip, optionally brotli) artifacts.
+
+Every self-contained report inlines the same stylesheet and ``showBank``
+script. Reports rendered with ``assets_url`` link to the shared files instead,
+so an archive stores them once.
+
+Usage:
+    python report_assets.py write archive/assets --compress gzip
+    python report_assets.py compare sample_analysis_output.json --reports 20000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+from html_generator import (
+    LAZY_REPORT_JS_FILE, LAZY_REPORT_SCRIPT, REPORT_CSS, REPORT_CSS_FILE, REPORT_JS_FILE, REPORT_SCRIPT,
+    generate_html_report,
+)
+
+COMPRESSIONS = ("gzip", "br")
+COMPRESSED_SUFFIX = {"gzip": ".gz", "br": ".br"}
+
+_CHUNK = 1024 * 1024
+
+
+# =============================================================================
+# MINIFICATION
+# =============================================================================
+
+def _minify(source: str, punctuation: str, line_comments: bool = False) -> str:
+    """Collapse whitespace and comments outside string literals.
+
+    A gap is dropped next to ``punctuation``; otherwise it becomes one space, or
+    one newline if it spanned a line break, so automatic semicolon insertion
+    still sees it. ``line_comments`` also strips ``//`` comments (JavaScript, not
+    CSS). Regex literals are not recognised; the report scripts do not use them.
+    """
+    out: List[str] = []
+    i, n = 0, len(source)
+    while i < n:
+        ch = source[i]
+        if ch in "'\"":
+            end = i + 1
+            while end < n and source[end] != ch:
+                end += 2 if source[end] == "\\" else 1
+            if end >= n:
+                raise ValueError(f"unterminated string literal at offset {i}")
+            out.append(source[i:end + 1])
+            i = end + 1
+        elif ch.isspace() or source.startswith("/*", i) or (line_comments and source.startswith("//", i)):
+            newline = False
+            while i < n:
+                if source[i].isspace():
+                    newline = newline or source[i] == "\n"
+                    i += 1
+                elif source.startswith("/*", i):
+                    end = source.find("*/", i + 2)
+                    if end < 0:
+                        raise ValueError(f"unterminated comment at offset {i}")
+                    newline = newline or "\n" in source[i:end]
+                    i = end + 2
+                elif line_comments and source.startswith("//", i):
+                    end = source.find("\n", i)
+                    i = n if end < 0 else end
+                else:
+                    break
+            if out and i < n and out[-1][-1] not in punctuation and source[i] not in punctuation:
+                out.append("\n" if newline else " ")
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def minify_css(css: str) -> str:
+    return _minify(css, "{};:,>").replace(";}", "}")
+
+
+def minify_js(script: str) -> str:
+    """Minify one of the report scripts; the surrounding ``<script>`` tags are dropped."""
+    if script.startswith("<script>") and script.endswith("</script>"):
+        script = script[len("<script>"):-len("</script>")]
+    return _minify(script, "{}()[];,=+<>?:!&|", line_comments=True)
+
+
+def asset_contents() -> Dict[str, str]:
+    """File name -> content of every shared asset for the current generator version."""
+    return {
+        REPORT_CSS_FILE: minify_css(REPORT_CSS),
+        REPORT_JS_FILE: minify_js(REPORT_SCRIPT),
+        LAZY_REPORT_JS_FILE: minify_js(LAZY_REPORT_SCRIPT),
+    }
+
+
+# =============================================================================
+# COMPRESSION
+# =============================================================================
+
+def compress_file(path: str, formats: Iterable[str], keep_original: bool = True) -> List[Tuple[str, int]]:
+    """Write ``path.gz`` / ``path.br`` next to ``path``; returns (path, size) of every file left behind."""
+    written = []
+    for fmt in formats:
+        target = path + COMPRESSED_SUFFIX[fmt]
+        with open(path, "rb") as src, open(target, "wb") as dst:
+            if fmt == "gzip":
+                # mtime=0 keeps the output reproducible, so identical reports compress identically.
+                with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=9, mtime=0) as gz:
+                    shutil.copyfileobj(src, gz, _CHUNK)
+            elif brotli is None:
+                raise RuntimeError("brotli compression needs the 'brotli' package")
+            else:
+                compressor = brotli.Compressor(quality=11)
+                for chunk in iter(lambda: src.read(_CHUNK), b""):
+                    dst.write(compressor.process(chunk))
+                dst.write(compressor.finish())
+        written.append((target, os.path.getsize(target)))
+    if keep_original:
+        written.insert(0, (path, os.path.getsize(path)))
+    else:
+        os.remove(path)
+    return written
+
+
+def _compressed_size(data: bytes, fmt: str) -> int:
+    if fmt == "gzip":
+        return len(gzip.compress(data, compresslevel=9, mtime=0))
+    return len(brotli.compress(data, quality=11))
+
+
+# =============================================================================
+# PUBLIC API
+# =============================================================================
+
+def write_assets(directory: str, compress: Iterable[str] = ()) -> List[str]:
+    """Write the shared assets into ``directory``; files that already exist are left alone."""
+    os.makedirs(directory, exist_ok=True)
+    compress = list(compress)
+    paths = []
+    for name, content in asset_contents().items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, path)
+            compress_file(path, compress)
+        paths.append(path)
+    return paths
+
+
+def compare_sizes(data: Dict, reports: int = 1) -> List[Dict]:
+    """Bytes for one report and for an archive of ``reports`` reports, per output variant."""
+    formats = ["html", "gzip"] + (["br"] if brotli is not None else [])
+    assets = {name: content.encode("utf-8") for name, content in asset_contents().items()}
+    rows = []
+    for mode in ("static", "lazy"):
+        for shared in (False, True):
+            html = generate_html_report(data, mode=mode, assets_url="assets" if shared else None).encode("utf-8")
+            used = [assets[n] for n in (REPORT_CSS_FILE, LAZY_REPORT_JS_FILE if mode == "lazy" else REPORT_JS_FILE)]
+            row = {"variant": f"{'shared' if shared else 'self-contained'} {mode}"}
+            for fmt in formats:
+                size = len(html) if fmt == "html" else _compressed_size(html, fmt)
+                overhead = 0
+                if shared:
+                    overhead = sum(len(a) if fmt == "html" else _compressed_size(a, fmt) for a in used)
+                row[fmt] = size
+                row[f"{fmt}_archive"] = size * reports + overhead
+            rows.append(row)
+    return rows
+
+
+def format_comparison(rows: List[Dict], reports: int) -> str:
+    formats = [f for f in ("html", "gzip", "br") if f in rows[0]]
+    baseline = rows[0]["html_archive"]
+    lines = [f"{'variant':<24}" + "".join(f"{f + ' / report':>16}" for f in formats)
+             + "".join(f"{f + f' / {reports:,}':>20}" for f in formats)]
+    for row in rows:
+        lines.append(f"{row['variant']:<24}" + "".join(f"{row[f]:>16,}" for f in formats)
+                     + "".join(f"{row[f + '_archive']:>20,}" for f in formats))
+    best = min(row[f + "_archive"] for row in rows for f in formats)
+    lines.append(f"Archive of {reports:,}: {baseline / 1e6:.1f} MB self-contained static html, "
+                 f"{best / 1e6:.1f} MB at best ({baseline / best:.1f}x smaller)")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Shared report assets and size comparison.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("write", help="Write the shared stylesheet and scripts")
+    p.add_argument("directory")
+    p.add_argument("--compress", nargs="*", choices=COMPRESSIONS, default=[])
+
+    p = sub.add_parser("compare", help="Compare report sizes across output variants")
+    p.add_argument("input", nargs="?", default="sample_analysis_output.json")
+    p.add_argument("--reports", type=int, default=10_000, help="Archive size to project (default: 10,000)")
+
+    args = parser.parse_args(argv)
+    if args.command == "write":
+        if "br" in args.compress and brotli is None:
+            parser.error("brotli compression needs the 'brotli' package")
+        for path in write_assets(args.directory, args.compress):
+            print(path)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        print(format_comparison(compare_sizes(data, args.reports), args.reports))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
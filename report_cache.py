@@ -0,0 +1,244 @@
+"""
+Report Cache for Kredit Lab
+===========================
+Content-addressed cache of rendered HTML reports.
+
+Reports are keyed by a hash of the normalized analysis JSON plus the
+generator version, held in an in-memory LRU and backed by an on-disk store
+that is shared between Streamlit sessions, server restarts, and processes.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from html_generator import GENERATOR_VERSION, generate_html_report
+from model import Analysis
+
+DEFAULT_CACHE_DIR = ".kreditlab_cache"
+
+
+def cache_key(data: Dict, mode: str = "static", context: Optional[Dict] = None) -> str:
+    """Hash the normalized analysis JSON together with the generator version and report mode.
+
+    ``context`` holds extra keyword arguments for the renderer (e.g. ``linked_companies``)
+    and is part of the key when given.
+    """
+    if isinstance(data, Analysis):
+        data = data.to_dict()
+    normalized = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    h = hashlib.sha256(GENERATOR_VERSION.encode("utf-8"))
+    h.update(b"\0")
+    h.update(mode.encode("utf-8"))
+    h.update(b"\0")
+    h.update(normalized.encode("utf-8"))
+    if context:
+        h.update(b"\0")
+        h.update(json.dumps(context, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ReportCache:
+    """In-memory LRU in front of a size- and age-bounded directory of reports."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_memory_items: int = 64,
+                 max_disk_bytes: int = 512 * 1024 * 1024, max_age_seconds: float = 30 * 24 * 3600):
+        self.directory = directory
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age_seconds = max_age_seconds
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "memory_evictions": 0, "disk_evictions": 0, "expired": 0,
+        }
+        os.makedirs(directory, exist_ok=True)
+        self._disk_bytes = sum(size for _, _, size in self._scan())
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached report for ``key``, or None on a miss."""
+        with self._lock:
+            html = self._memory.get(key)
+            if html is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return html
+
+        html = self._read_disk(key)
+        with self._lock:
+            if html is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._remember(key, html)
+        return html
+
+    def put(self, key: str, html: str) -> None:
+        """Store a report in memory and on disk."""
+        with self._lock:
+            self._remember(key, html)
+        self._write_disk(key, html)
+
+    def get_or_render(self, data: Dict, render: Callable[..., str] = generate_html_report,
+                      mode: str = "static", context: Optional[Dict] = None) -> str:
+        """Return the cached report for ``data``, rendering and storing it on a miss.
+
+        ``render`` is called as ``render(data, mode=mode, **context)``.
+        """
+        key = cache_key(data, mode, context)
+        html = self.get(key)
+        if html is None:
+            html = render(data, mode=mode, **(context or {}))
+            self.put(key, html)
+        return html
+
+    def get_or_render_bytes(self, data: Dict, render: Callable[..., str] = generate_html_report,
+                            mode: str = "static", context: Optional[Dict] = None) -> bytes:
+        """Like ``get_or_render``, but read the UTF-8 report straight from its file on disk."""
+        key = cache_key(data, mode, context)
+        path = self.path_for(key)
+        try:
+            if time.time() - os.stat(path).st_mtime <= self.max_age_seconds:
+                with open(path, "rb") as f:
+                    html = f.read()
+                os.utime(path, None)
+                with self._lock:
+                    self._counters["disk_hits"] += 1
+                return html
+        except FileNotFoundError:
+            pass
+        # Missing or expired: get_or_render drops an expired file and stores a fresh one.
+        return self.get_or_render(data, render, mode, context).encode("utf-8")
+
+    def path_for(self, key: str) -> str:
+        """Location of the on-disk entry for ``key``."""
+        return os.path.join(self.directory, key[:2], f"{key}.html")
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters plus current memory and disk occupancy."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_items"] = len(self._memory)
+            stats["disk_bytes"] = self._disk_bytes
+        return stats
+
+    def clear(self) -> None:
+        """Drop every entry from memory and disk."""
+        with self._lock:
+            self._memory.clear()
+        for path, _, _ in self._scan():
+            self._unlink_counted(path)
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    def _remember(self, key: str, html: str) -> None:
+        # Caller holds the lock.
+        self._memory[key] = html
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        try:
+            mtime = os.stat(path).st_mtime
+            if time.time() - mtime > self.max_age_seconds:
+                self._unlink_counted(path)
+                with self._lock:
+                    self._counters["expired"] += 1
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                html = f.read()
+            # Touch on hit so size eviction drops least-recently-used entries first.
+            os.utime(path, None)
+            return html
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, html: str) -> None:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = html.encode("utf-8")
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # Under the lock, so the size being replaced is the one counted.
+            with self._lock:
+                try:
+                    replaced = os.stat(path).st_size
+                except FileNotFoundError:
+                    replaced = 0
+                os.replace(tmp, path)
+                self._disk_bytes += len(data) - replaced
+                over_budget = self._disk_bytes > self.max_disk_bytes
+        except BaseException:
+            self._unlink(tmp)
+            raise
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Remove expired entries, then the least recently used until under 90% of budget."""
+        now = time.time()
+        entries = sorted(self._scan(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_disk_bytes * 0.9
+        evicted = expired = 0
+        for path, mtime, size in entries:
+            if now - mtime > self.max_age_seconds:
+                expired += 1
+            elif total > target:
+                evicted += 1
+            else:
+                continue
+            if self._unlink(path):
+                total -= size
+        with self._lock:
+            self._disk_bytes = total
+            self._counters["disk_evictions"] += evicted
+            self._counters["expired"] += expired
+
+    def _scan(self):
+        """Yield (path, mtime, size) for every report on disk."""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".html"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_mtime, st.st_size
+
+    def _unlink_counted(self, path: str) -> None:
+        """Remove an entry outside of eviction and take its size off the disk total."""
+        with self._lock:
+            try:
+                size = os.stat(path).st_size
+                os.remove(path)
+            except FileNotFoundError:
+                return
+            self._disk_bytes -= size
+
+    @staticmethod
+    def _unlink(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,377 @@
+"""
+Scoring Engine for Kredit Lab
+=============================
+Recompute bank and consolidated scores and grades from the CCRIS/CTOS
+parameter classifications and statuses, and flag analyses whose stated
+numbers disagree.
+
+Scoring rules (see README):
+    - Strict 1   (30%): any failure caps the final grade at E
+    - Strict 2   (30%): any failure caps the final grade at D
+    - Preference (40%): affects the score, and therefore the raw grade
+
+A bank's score is the weighted pass rate of its three categories; a
+category with no parameters counts as fully passed. The consolidated score
+is the mean of the bank scores and the consolidated counts are the sums of
+the bank counts.
+
+Only the weights and the Strict 1/Strict 2 caps come from the README. The
+grade cut-offs and the rate given to an empty category are assumptions of
+this module, so ``ScoringRules`` (or ``--rules rules.json``) can change them
+along with the weights. ``sample_analysis_output.json`` does not follow these
+rules, or any fixed formula: Maybank is stated at 82.0 while SME Bank, with
+lower pass rates, is stated at 85.0, and RHB, CIMB and Standard Chartered keep
+a final grade of B despite a failed Strict 2 parameter. Re-scoring it
+therefore flags every bank; ``tests/test_scoring.py`` pins those results.
+
+Every analysis is encoded into small integer arrays so a whole portfolio
+is scored for all six banks in one batched NumPy evaluation.
+
+Usage:
+    python scoring.py analyses/
+    python scoring.py analyses/ --rules rules.json
+"""
+
+import json
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from analysis_schema import BANK_NAMES, CLASSIFICATIONS, GRADES, STATUSES, loads, validate_analysis
+
+# =============================================================================
+# CODES & RULES
+# =============================================================================
+
+# Codes are list indices; unknown values fall back to code 0, matching the
+# renderer's defaults.
+CLASSIFICATION_CODES = {name: code for code, name in enumerate(CLASSIFICATIONS)}
+STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+GRADE_CODES = {name: code for code, name in enumerate(GRADES)}
+
+STRICT1, STRICT2, PREFERENCE = (CLASSIFICATION_CODES[k] for k in ("Strict 1", "Strict 2", "Preference"))
+PASS, FAIL = STATUS_CODES["PASS"], STATUS_CODES["FAIL"]
+
+# (classification code, JSON key prefix)
+CATEGORIES = [
+    (STRICT1, "strict1"),
+    (STRICT2, "strict2"),
+    (PREFERENCE, "preference"),
+]
+
+COUNT_KEYS = [f"{prefix}_{kind}" for _, prefix in CATEGORIES for kind in ("pass", "total")]
+
+
+@dataclass(frozen=True)
+class ScoringRules:
+    """The tunable parts of scoring.
+
+    ``weights`` are per category prefix (README: 30/30/40).
+    ``grade_thresholds`` give the minimum score for each raw grade, best
+    first; anything lower is E. ``empty_category_rate`` is the pass rate, in
+    percent, of a category with no parameters.
+    """
+    weights: Tuple[Tuple[str, float], ...] = (("strict1", 0.30), ("strict2", 0.30), ("preference", 0.40))
+    grade_thresholds: Tuple[Tuple[float, str], ...] = ((80.0, "A"), (70.0, "B"), (60.0, "C"), (50.0, "D"))
+    empty_category_rate: float = 100.0
+
+    def __post_init__(self):
+        weights = dict(self.weights)
+        if set(weights) != {prefix for _, prefix in CATEGORIES}:
+            raise ValueError(f"weights must cover exactly {', '.join(p for _, p in CATEGORIES)}")
+        for _, letter in self.grade_thresholds:
+            if letter not in GRADE_CODES:
+                raise ValueError(f"Unknown grade {letter!r} in grade_thresholds")
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "ScoringRules":
+        """Rules from JSON such as ``{"weights": {"strict1": 0.3, ...}, "grade_thresholds": {"A": 80, ...}}``.
+
+        Omitted keys keep their defaults.
+        """
+        default = cls()
+        weights = dict(default.weights, **d.get("weights", {}))
+        thresholds = d.get("grade_thresholds")
+        return cls(
+            weights=tuple(weights.items()),
+            grade_thresholds=default.grade_thresholds if thresholds is None else
+            tuple(sorted(((float(v), k) for k, v in thresholds.items()), reverse=True)),
+            empty_category_rate=float(d.get("empty_category_rate", default.empty_category_rate)),
+        )
+
+
+DEFAULT_RULES = ScoringRules()
+
+# =============================================================================
+# ENCODING
+# =============================================================================
+
+
+def _params(bank: Dict) -> List[Dict]:
+    return list(bank.get("ccris", [])) + list(bank.get("ctos", []))
+
+
+def encode_portfolio(analyses: List[Dict]):
+    """Encode analyses into (classification, status, bank_present) arrays.
+
+    ``classification`` and ``status`` have shape (applications, banks,
+    parameters) and are padded with Not Applicable / N/A.
+    """
+    n_params = max((len(_params(a.get("banks", {}).get(bn, {}))) for a in analyses for bn in BANK_NAMES), default=0)
+    shape = (len(analyses), len(BANK_NAMES), n_params)
+    classification = np.zeros(shape, dtype=np.int8)
+    status = np.zeros(shape, dtype=np.int8)
+    present = np.zeros(shape[:2], dtype=bool)
+    for i, analysis in enumerate(analyses):
+        banks = analysis.get("banks", {})
+        for b, bn in enumerate(BANK_NAMES):
+            if bn not in banks:
+                continue
+            present[i, b] = True
+            for p, param in enumerate(_params(banks[bn])):
+                classification[i, b, p] = CLASSIFICATION_CODES.get(param.get("classification"), 0)
+                status[i, b, p] = STATUS_CODES.get(param.get("status"), 0)
+    return classification, status, present
+
+
+# =============================================================================
+# SCORING
+# =============================================================================
+
+@dataclass
+class PortfolioScores:
+    """Computed scores for a batch of analyses.
+
+    Per-bank arrays have shape (applications, banks); consolidated arrays
+    have shape (applications,). Counts are ordered as ``COUNT_KEYS``.
+    """
+    bank_counts: np.ndarray
+    bank_score: np.ndarray
+    bank_raw_grade: np.ndarray
+    bank_final_grade: np.ndarray
+    bank_present: np.ndarray
+    counts: np.ndarray
+    score: np.ndarray
+    raw_grade: np.ndarray
+    final_grade: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.score)
+
+    def bank_result(self, i: int, b: int) -> Dict:
+        result = {"score": float(self.bank_score[i, b]),
+                  "raw_grade": GRADES[self.bank_raw_grade[i, b]],
+                  "final_grade": GRADES[self.bank_final_grade[i, b]]}
+        result.update(zip(COUNT_KEYS, self.bank_counts[i, b].tolist()))
+        return result
+
+    def result(self, i: int) -> Dict:
+        """Computed ``banks`` and ``consolidated`` blocks for analysis ``i``, in the JSON layout."""
+        consolidated = {"score": float(self.score[i]),
+                        "raw_grade": GRADES[self.raw_grade[i]],
+                        "final_grade": GRADES[self.final_grade[i]]}
+        consolidated.update(zip(COUNT_KEYS, self.counts[i].tolist()))
+        banks = {bn: self.bank_result(i, b) for b, bn in enumerate(BANK_NAMES) if self.bank_present[i, b]}
+        return {"banks": banks, "consolidated": consolidated}
+
+
+def _grades(score: np.ndarray, rules: ScoringRules) -> np.ndarray:
+    """Map scores to raw grade codes using ``rules.grade_thresholds``."""
+    grade = np.full(score.shape, GRADE_CODES["E"], dtype=np.int8)
+    # Walk from the lowest threshold up so better grades overwrite worse ones.
+    for threshold, letter in reversed(rules.grade_thresholds):
+        grade[score >= threshold] = GRADE_CODES[letter]
+    return grade
+
+
+def _cap(raw: np.ndarray, strict1_failed: np.ndarray, strict2_failed: np.ndarray) -> np.ndarray:
+    final = np.where(strict2_failed, np.maximum(raw, GRADE_CODES["D"]), raw)
+    return np.where(strict1_failed, GRADE_CODES["E"], final).astype(np.int8)
+
+
+def score_arrays(classification: np.ndarray, status: np.ndarray, present: np.ndarray,
+                 rules: ScoringRules = DEFAULT_RULES) -> PortfolioScores:
+    """Score encoded analyses for every bank at once."""
+    passed = status == PASS
+    failed = status == FAIL
+    weights = dict(rules.weights)
+    counts = []
+    fails = []
+    score = np.zeros(present.shape, dtype=np.float64)
+    for code, prefix in CATEGORIES:
+        in_category = classification == code
+        n_pass = (in_category & passed).sum(axis=-1)
+        n_total = in_category.sum(axis=-1)
+        counts += [n_pass, n_total]
+        fails.append((in_category & failed).any(axis=-1))
+        rate = np.divide(n_pass * 100.0, n_total, out=np.full(n_pass.shape, rules.empty_category_rate),
+                         where=n_total > 0)
+        score += weights[prefix] * rate
+    bank_counts = np.stack(counts, axis=-1).astype(np.int32) * present[..., None]
+    bank_score = np.round(score, 1) * present
+    bank_raw = _grades(bank_score, rules)
+    bank_final = _cap(bank_raw, fails[0], fails[1])
+
+    n_banks = present.sum(axis=1)
+    consolidated_score = np.round(
+        np.divide(bank_score.sum(axis=1), n_banks, out=np.zeros(len(n_banks)), where=n_banks > 0), 1)
+    consolidated_counts = bank_counts.sum(axis=1)
+    raw = _grades(consolidated_score, rules)
+    final = _cap(raw, (fails[0] & present).any(axis=1), (fails[1] & present).any(axis=1))
+    return PortfolioScores(bank_counts, bank_score, bank_raw, bank_final, present,
+                           consolidated_counts, consolidated_score, raw, final)
+
+
+def score_portfolio(analyses: List[Dict], rules: ScoringRules = DEFAULT_RULES) -> PortfolioScores:
+    """Score a batch of analysis dicts."""
+    return score_arrays(*encode_portfolio(analyses), rules=rules)
+
+
+def score_analysis(data: Dict, rules: ScoringRules = DEFAULT_RULES) -> Dict:
+    """Computed ``banks`` and ``consolidated`` blocks for a single analysis."""
+    return score_portfolio([data], rules).result(0)
+
+
+# =============================================================================
+# DISCREPANCIES
+# =============================================================================
+
+def _stated(analyses: List[Dict], scores: PortfolioScores):
+    """Encode the stated numbers into arrays shaped like the computed ones (NaN/-1 when missing)."""
+    n = len(analyses)
+    bank_counts = np.full(scores.bank_counts.shape, -1, dtype=np.int32)
+    bank_score = np.full(scores.bank_score.shape, np.nan)
+    bank_grades = np.full(scores.bank_score.shape + (2,), -1, dtype=np.int8)
+    counts = np.full(scores.counts.shape, -1, dtype=np.int32)
+    score = np.full(n, np.nan)
+    grades = np.full((n, 2), -1, dtype=np.int8)
+
+    def fill(block, counts_out, grades_out):
+        for k, key in enumerate(COUNT_KEYS):
+            value = block.get(key)
+            if isinstance(value, (int, float)):
+                counts_out[k] = value
+        for k, key in enumerate(("raw_grade", "final_grade")):
+            grades_out[k] = GRADE_CODES.get(block.get(key), -1)
+        value = block.get("score")
+        return float(value) if isinstance(value, (int, float)) else np.nan
+
+    for i, analysis in enumerate(analyses):
+        banks = analysis.get("banks", {})
+        for b, bn in enumerate(BANK_NAMES):
+            if bn in banks:
+                bank_score[i, b] = fill(banks[bn], bank_counts[i, b], bank_grades[i, b])
+        score[i] = fill(analysis.get("consolidated", {}), counts[i], grades[i])
+    return bank_counts, bank_score, bank_grades, counts, score, grades
+
+
+def find_discrepancies(analyses: List[Dict], scores: Optional[PortfolioScores] = None,
+                       score_tolerance: float = 0.5, rules: ScoringRules = DEFAULT_RULES) -> List[List[str]]:
+    """List, for each analysis, where the stated scores, counts, or grades disagree with the computed ones."""
+    if scores is None:
+        scores = score_portfolio(analyses, rules)
+    bank_counts, bank_score, bank_grades, counts, score, grades = _stated(analyses, scores)
+
+    computed_bank_grades = np.stack([scores.bank_raw_grade, scores.bank_final_grade], axis=-1)
+    computed_grades = np.stack([scores.raw_grade, scores.final_grade], axis=-1)
+    bank_bad = (
+        (bank_counts != scores.bank_counts).any(axis=-1)
+        | ~(np.abs(bank_score - scores.bank_score) <= score_tolerance)
+        | (bank_grades != computed_bank_grades).any(axis=-1)
+    ) & scores.bank_present
+    bad = (
+        (counts != scores.counts).any(axis=-1)
+        | ~(np.abs(score - scores.score) <= score_tolerance)
+        | (grades != computed_grades).any(axis=-1)
+    )
+
+    # Only the (rare) disagreeing analyses are described field by field.
+    report: List[List[str]] = [[] for _ in analyses]
+    for i in np.flatnonzero(bad | bank_bad.any(axis=1)):
+        computed = scores.result(i)
+        for bn, expected in computed["banks"].items():
+            report[i].extend(_describe(bn, analyses[i]["banks"][bn], expected, score_tolerance))
+        report[i].extend(_describe("Consolidated", analyses[i].get("consolidated", {}),
+                                   computed["consolidated"], score_tolerance))
+    return report
+
+
+def _describe(label: str, stated: Dict, expected: Dict, score_tolerance: float) -> List[str]:
+    problems = []
+    for key, value in expected.items():
+        got = stated.get(key)
+        if key == "score":
+            ok = isinstance(got, (int, float)) and abs(got - value) <= score_tolerance
+        else:
+            ok = got == value
+        if not ok:
+            problems.append(f"{label}: {key} stated {got!r}, computed {value!r}")
+    return problems
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def _load(jobs: Iterable, errors: List[str]) -> List[Dict]:
+    """Read every job; entries that can't be read, parsed, or validated are described in ``errors``."""
+    analyses = []
+    for source, path, text in jobs:
+        try:
+            if text is None:
+                with open(path, "rb") as f:
+                    text = f.read()
+            data = loads(text)
+        except (OSError, ValueError) as e:
+            problems = [f"{type(e).__name__}: {e}"]
+        else:
+            problems = validate_analysis(data)[1]
+        if problems:
+            more = f" (+{len(problems) - 1} more)" if len(problems) > 1 else ""
+            errors.append(f"{source}: {problems[0]}{more}")
+            continue
+        analyses.append(dict(data, _source=source))
+    return analyses
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    import time
+
+    from batch_render import iter_jobs
+
+    parser = argparse.ArgumentParser(description="Re-score analyses and flag disagreeing grades.")
+    parser.add_argument("input", help="Directory, glob pattern, JSON file, or JSONL file")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed score difference (default: 0.5)")
+    parser.add_argument("--rules", help="JSON file of weights, grade_thresholds, and empty_category_rate")
+    args = parser.parse_args(argv)
+
+    rules = DEFAULT_RULES
+    if args.rules:
+        with open(args.rules, "r", encoding="utf-8") as f:
+            rules = ScoringRules.from_dict(json.load(f))
+    errors: List[str] = []
+    analyses = _load(iter_jobs(args.input), errors)
+    for error in errors:
+        print(f"⚠️  Skipped {error}", file=sys.stderr)
+    start = time.perf_counter()
+    scores = score_portfolio(analyses, rules)
+    report = find_discrepancies(analyses, scores, args.tolerance)
+    elapsed = time.perf_counter() - start
+
+    flagged = 0
+    for analysis, problems in zip(analyses, report):
+        if problems:
+            flagged += 1
+            print(f"⚠️  {analysis['_source']}")
+            for problem in problems:
+                print(f"    {problem}")
+    print(f"Scored {len(analyses)} analyses in {elapsed:.3f}s; {flagged} disagree with the computed grades"
+          f" ({len(errors)} invalid entries skipped)")
+    return 1 if flagged or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,525 @@
+"""
+Search Index for Kredit Lab
+===========================
+Local full-text search over the free text of archived analyses: CCRIS/CTOS
+criteria and evidence, strengths, attention items, and critical findings.
+
+Each parameter evaluation (company x bank x parameter) and each
+strength/attention/critical item is one document, ranked with BM25. The
+tokenizer keeps the codes and abbreviations the analyses use intact
+("HSLNFNCE", "CRDTCARD", "R&R", "AKPK"), and a trailing ``*`` in a query
+matches prefixes ("HSL*"). Results can be filtered by bank, parameter
+name, status, and field.
+
+The index is a directory of immutable segments in the style of
+``portfolio_store.py``: every ``ingest`` writes a new segment of NumPy
+postings, so updates never rewrite existing data. Segments are merged in
+tiers: once ``merge_factor`` segments of about the same size exist they are
+merged into one, so each document is rewritten O(log n) times instead of on
+every merge. Searches pin the segments they read, and segments replaced by a
+merge are deleted only after the last such search finishes. Analyses already
+in the index (same JSON) are skipped.
+
+Usage:
+    python search_index.py ingest archive.jsonl analyses/*.json
+    python search_index.py search "HSLNFNCE arrears" --bank Maybank --status FAIL
+    python search_index.py search AKPK --parameter "R&R / AKPK Status" -n 50
+"""
+
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from analysis_schema import loads
+from portfolio_store import BANK_CODES, PARAM_NAMES, analysis_digest, parameter_code, parameter_name
+from scoring import BANK_NAMES, STATUS_CODES, STATUSES
+
+DEFAULT_INDEX_DIR = "search_index"
+_RETIRED = ".old"
+
+# Field codes; "parameter" documents hold a parameter's criteria and evidence.
+FIELDS = ["parameter", "strength", "attention", "critical"]
+_LIST_FIELDS = (("strengths", 1), ("attention_items", 2), ("critical_findings", 3))
+
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+
+_TOKEN = re.compile(r"[0-9a-z]+(?:&[0-9a-z]+)*")
+_STOPWORDS = frozenset("a an and are as at be by for from in is of on or the to was were with".split())
+
+# Per-document columns: name -> dtype. -1 marks "not applicable" (e.g. bank of a strength).
+DOC_COLUMNS = {
+    "analysis": np.int32,
+    "bank": np.int8,
+    "source": np.int8,
+    "param": np.int16,
+    "status": np.int8,
+    "field": np.int8,
+    "length": np.int32,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric runs, keeping "&" inside codes ("R&R") and dropping a few stopwords.
+
+    Punctuation splits tokens, so "R&R/AKPK" gives ["r&r", "akpk"] and "COL TYPE=PROPERTIES" gives
+    ["col", "type", "properties"]; "75%" and "≥2" give "75" and "2".
+    """
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+# =============================================================================
+# SEGMENT WRITER
+# =============================================================================
+
+class _SegmentBuffer:
+    """Documents and postings for one segment, flushed to ``.npy`` files."""
+
+    def __init__(self):
+        typecodes = {np.int32: "i", np.int16: "h", np.int8: "b"}
+        self.columns = {col: array(typecodes[dtype]) for col, dtype in DOC_COLUMNS.items()}
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.texts: List[bytes] = []
+        self.analyses: List[Dict] = []
+        # Banks usually share a parameter's evidence, so each distinct text is tokenized once.
+        self._token_counts: Dict[str, Dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def _counts(self, text: str) -> Dict[str, int]:
+        counts = self._token_counts.get(text)
+        if counts is None:
+            counts = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            self._token_counts[text] = counts
+        return counts
+
+    def _add_doc(self, text: str, analysis: int, bank: int, source: int, param: int, status: int,
+                 field: int) -> None:
+        doc = len(self.texts)
+        counts = self._counts(text)
+        for column, value in zip(DOC_COLUMNS, (analysis, bank, source, param, status, field,
+                                               sum(counts.values()))):
+            self.columns[column].append(value)
+        self.texts.append(text.encode("utf-8"))
+        for token, tf in counts.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = (array("i"), array("h"))
+            postings[0].append(doc)
+            postings[1].append(min(tf, 32767))
+
+    def add(self, data: Dict, digest: str) -> None:
+        local = len(self.analyses)
+        company = data.get("company") or {}
+        meta = data.get("meta") or {}
+        self.analyses.append({"name": company.get("name"), "reg_no": company.get("reg_no"),
+                              "report_date": meta.get("report_date"), "digest": digest})
+        banks = data.get("banks") or {}
+        for b, bn in enumerate(BANK_NAMES):
+            bd = banks.get(bn)
+            if not bd:
+                continue
+            for source, key in enumerate(("ccris", "ctos")):
+                for i, p in enumerate(bd.get(key) or []):
+                    text = f"{p.get('criteria') or ''}\n{p.get('evidence') or ''}".strip()
+                    if text:
+                        self._add_doc(text, local, b, source, i, STATUS_CODES.get(p.get("status"), 0), 0)
+        for key, field in _LIST_FIELDS:
+            for item in data.get(key) or []:
+                if item:
+                    self._add_doc(str(item), local, -1, -1, -1, -1, field)
+
+    def flush(self, path: str) -> None:
+        """Write the segment to ``path`` atomically."""
+        terms = sorted(self.postings)
+        offsets = {}
+        docs, tfs = array("i"), array("h")
+        for term in terms:
+            term_docs, term_tfs = self.postings[term]
+            offsets[term] = [len(docs), len(term_docs)]
+            docs.extend(term_docs)
+            tfs.extend(term_tfs)
+        text_offsets = np.zeros(len(self.texts) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in self.texts], out=text_offsets[1:])
+
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for col, dtype in DOC_COLUMNS.items():
+            np.save(os.path.join(tmp, f"{col}.npy"), np.frombuffer(self.columns[col], dtype=dtype))
+        np.save(os.path.join(tmp, "post_docs.npy"), np.frombuffer(docs, dtype=np.int32))
+        np.save(os.path.join(tmp, "post_tf.npy"), np.frombuffer(tfs, dtype=np.int16))
+        np.save(os.path.join(tmp, "text_offsets.npy"), text_offsets)
+        with open(os.path.join(tmp, "texts.bin"), "wb") as f:
+            f.writelines(self.texts)
+        with open(os.path.join(tmp, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump(offsets, f, ensure_ascii=False, separators=(",", ":"))
+        with open(os.path.join(tmp, "analyses.jsonl"), "w", encoding="utf-8") as f:
+            for analysis in self.analyses:
+                f.write(json.dumps(analysis, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+
+
+# =============================================================================
+# SEGMENT READER
+# =============================================================================
+
+class _Segment:
+    """A memory-mapped segment; term offsets and analysis metadata are loaded into memory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.columns = {col: np.load(os.path.join(path, f"{col}.npy"), mmap_mode="r") for col in DOC_COLUMNS}
+        self.post_docs = np.load(os.path.join(path, "post_docs.npy"), mmap_mode="r")
+        self.post_tf = np.load(os.path.join(path, "post_tf.npy"), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        # Mapped rather than reopened per hit, so a result can be read after the directory is retired.
+        texts = os.path.join(path, "texts.bin")
+        self.texts = np.memmap(texts, dtype=np.uint8, mode="r") if os.path.getsize(texts) else np.zeros(0, np.uint8)
+        with open(os.path.join(path, "terms.json"), "rb") as f:
+            self.terms: Dict[str, List[int]] = loads(f.read())
+        self.sorted_terms = sorted(self.terms)
+        with open(os.path.join(path, "analyses.jsonl"), "rb") as f:
+            self.analyses = [loads(line) for line in f if line.strip()]
+        self.docs = len(self.columns["length"])
+        self.total_length = int(self.columns["length"].sum(dtype=np.int64))
+        # Searches currently using the segment, and whether a merge has replaced it.
+        self.readers = 0
+        self.retired = False
+
+    def expand(self, term: str) -> List[str]:
+        """``term`` itself, or every term with that prefix when it ends in ``*``."""
+        if not term.endswith("*"):
+            return [term] if term in self.terms else []
+        prefix = term[:-1]
+        i = bisect_left(self.sorted_terms, prefix)
+        found = []
+        while i < len(self.sorted_terms) and self.sorted_terms[i].startswith(prefix):
+            found.append(self.sorted_terms[i])
+            i += 1
+        return found
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        start, df = self.terms[term]
+        return self.post_docs[start:start + df], self.post_tf[start:start + df]
+
+    def text(self, doc: int) -> str:
+        start, end = int(self.text_offsets[doc]), int(self.text_offsets[doc + 1])
+        return self.texts[start:end].tobytes().decode("utf-8")
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class SearchIndex:
+    """BM25 full-text index over analysis free text, stored as append-only segments."""
+
+    def __init__(self, directory: str = DEFAULT_INDEX_DIR, merge_factor: int = 4):
+        self.directory = directory
+        self.merge_factor = max(merge_factor, 2)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Left behind by a crash: retired segments (their data is in the merged segment) and
+        # half-written ones, whose name the next flush would otherwise collide with.
+        for name in os.listdir(directory):
+            if name.startswith("seg-") and name.endswith((_RETIRED, ".tmp")):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        self._segments = [_Segment(os.path.join(directory, name)) for name in self._segment_names()]
+        self._digests = {a["digest"] for seg in self._segments for a in seg.analyses}
+        # Digests being added by an ingest that has not flushed yet.
+        self._pending: set = set()
+
+    # -------------------------------------------------------------------------
+    # Ingestion
+    # -------------------------------------------------------------------------
+
+    def ingest(self, analyses: Iterable[Dict]) -> int:
+        """Add analyses as a new segment; returns how many were new."""
+        buffer = _SegmentBuffer()
+        digests = set()
+        try:
+            for data in analyses:
+                digest = analysis_digest(data)
+                # Claimed under the lock so concurrent ingests of the same analysis add it once.
+                with self._lock:
+                    if digest in self._digests or digest in self._pending:
+                        continue
+                    self._pending.add(digest)
+                digests.add(digest)
+                buffer.add(data, digest)
+            if not buffer.analyses:
+                return 0
+            with self._lock:
+                path = self._next_segment_path()
+                buffer.flush(path)
+                self._segments.append(_Segment(path))
+                self._digests |= digests
+                self._merge_tiers()
+            return len(buffer.analyses)
+        finally:
+            with self._lock:
+                self._pending -= digests
+
+    def ingest_jsonl(self, path: str) -> int:
+        """Stream a JSONL file (one analysis per line) into the index."""
+        def lines() -> Iterator[Dict]:
+            with open(path, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        yield loads(line)
+        return self.ingest(lines())
+
+    def merge(self) -> None:
+        """Merge every segment into one."""
+        with self._lock:
+            if len(self._segments) > 1:
+                self._merge(self._segments)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._retire(self._segments)
+            self._segments = []
+            self._digests = set()
+
+    def _segment_names(self) -> List[str]:
+        return sorted(n for n in os.listdir(self.directory)
+                      if n.startswith("seg-") and not n.endswith((".tmp", _RETIRED)))
+
+    def _next_segment_path(self) -> str:
+        names = self._segment_names()
+        last = int(names[-1].split("-")[1]) if names else 0
+        return os.path.join(self.directory, f"seg-{last + 1:06d}")
+
+    def _tier(self, seg: _Segment) -> int:
+        """Size class of a segment: segments within a factor of ``merge_factor`` share a tier."""
+        tier, docs = 0, seg.docs
+        while docs >= self.merge_factor:
+            docs //= self.merge_factor
+            tier += 1
+        return tier
+
+    def _merge_tiers(self) -> None:
+        # Caller holds the lock. Merging a full tier can fill the next one, so repeat until none is full.
+        while True:
+            tiers: Dict[int, List[_Segment]] = {}
+            for seg in self._segments:
+                tiers.setdefault(self._tier(seg), []).append(seg)
+            full = [segs for _, segs in sorted(tiers.items()) if len(segs) >= self.merge_factor]
+            if not full:
+                return
+            self._merge(full[0][:self.merge_factor])
+
+    def _retire(self, segments: List[_Segment]) -> None:
+        # Caller holds the lock. Renamed at once so a restart never loads them next to their merged copy;
+        # deleted once no search is reading them.
+        for seg in segments:
+            retired_path = seg.path + _RETIRED
+            os.replace(seg.path, retired_path)
+            seg.path = retired_path
+            seg.retired = True
+            if seg.readers == 0:
+                shutil.rmtree(seg.path, ignore_errors=True)
+
+    def _acquire(self) -> List[_Segment]:
+        """Snapshot the live segments and pin them until ``_release``."""
+        with self._lock:
+            segments = list(self._segments)
+            for seg in segments:
+                seg.readers += 1
+        return segments
+
+    def _release(self, segments: List[_Segment]) -> None:
+        with self._lock:
+            for seg in segments:
+                seg.readers -= 1
+                if seg.retired and seg.readers == 0:
+                    shutil.rmtree(seg.path, ignore_errors=True)
+
+    def _merge(self, old: List[_Segment]) -> None:
+        # Caller holds the lock. Postings are concatenated with shifted doc ids, so nothing is re-tokenized.
+        buffer = _SegmentBuffer()
+        doc_base = analysis_base = 0
+        for seg in old:
+            for col in DOC_COLUMNS:
+                values = np.asarray(seg.columns[col])
+                if col == "analysis":
+                    values = values + analysis_base
+                buffer.columns[col].extend(values.tolist())
+            blob = seg.texts.tobytes()
+            offsets = seg.text_offsets
+            buffer.texts.extend(blob[offsets[i]:offsets[i + 1]] for i in range(seg.docs))
+            for term, (start, df) in seg.terms.items():
+                postings = buffer.postings.get(term)
+                if postings is None:
+                    postings = buffer.postings[term] = (array("i"), array("h"))
+                postings[0].extend((seg.post_docs[start:start + df] + doc_base).tolist())
+                postings[1].extend(seg.post_tf[start:start + df].tolist())
+            buffer.analyses.extend(seg.analyses)
+            doc_base += seg.docs
+            analysis_base += len(seg.analyses)
+        path = self._next_segment_path()
+        buffer.flush(path)
+        merged = set(map(id, old))
+        self._segments = [seg for seg in self._segments if id(seg) not in merged] + [_Segment(path)]
+        self._retire(old)
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(seg.analyses) for seg in self._segments)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            segments = list(self._segments)
+        return {
+            "analyses": sum(len(seg.analyses) for seg in segments),
+            "documents": sum(seg.docs for seg in segments),
+            "segments": len(segments),
+        }
+
+    def search(self, query: str, bank: Optional[str] = None, parameter: Optional[str] = None,
+               status: Optional[str] = None, field: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Top ``limit`` documents for ``query`` by BM25, most relevant first.
+
+        ``parameter`` is a name from ``CCRIS_PARAM_NAMES``/``CTOS_PARAM_NAMES``
+        and ``status`` one of ``STATUSES``; both only match parameter documents.
+        """
+        segments = self._acquire()
+        try:
+            return self._search(segments, query, bank, parameter, status, field, limit)
+        finally:
+            self._release(segments)
+
+    def _search(self, segments: List[_Segment], query: str, bank: Optional[str], parameter: Optional[str],
+                status: Optional[str], field: Optional[str], limit: int) -> List[Dict]:
+        terms = [t + "*" if raw.endswith("*") else t
+                 for raw in query.split() for t in tokenize(raw.rstrip("*"))]
+        if not terms or not segments:
+            return []
+        total_docs = sum(seg.docs for seg in segments)
+        avg_length = max(sum(seg.total_length for seg in segments) / total_docs, 1.0)
+
+        # Document frequency across all segments, per expanded term.
+        expanded = [[seg.expand(t) for t in terms] for seg in segments]
+        df: Dict[str, int] = {}
+        for seg, seg_terms in zip(segments, expanded):
+            for group in seg_terms:
+                for term in group:
+                    df[term] = df.get(term, 0) + seg.terms[term][1]
+        idf = {term: float(np.log(1 + (total_docs - n + 0.5) / (n + 0.5))) for term, n in df.items()}
+
+        filters = {}
+        if bank is not None:
+            filters["bank"] = BANK_CODES[bank]
+        if parameter is not None:
+            filters["source"], filters["param"] = parameter_code(parameter)
+        if status is not None:
+            filters["status"] = STATUS_CODES[status]
+        if field is not None:
+            filters["field"] = FIELDS.index(field)
+
+        hits: List[Tuple[float, int, int]] = []
+        for s, (seg, seg_terms) in enumerate(zip(segments, expanded)):
+            docs_parts, score_parts = [], []
+            for term in dict.fromkeys(t for group in seg_terms for t in group):
+                docs, tf = seg.postings(term)
+                tf = tf.astype(np.float32)
+                length = seg.columns["length"][docs]
+                docs_parts.append(docs)
+                score_parts.append(idf[term] * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length)))
+            if not docs_parts:
+                continue
+            candidates, inverse = np.unique(np.concatenate(docs_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+            mask = np.ones(len(candidates), dtype=bool)
+            for col, value in filters.items():
+                mask &= seg.columns[col][candidates] == value
+            candidates, scores = candidates[mask], scores[mask]
+            if len(candidates) > limit:
+                top = np.argpartition(-scores, limit)[:limit]
+                candidates, scores = candidates[top], scores[top]
+            hits.extend((float(score), s, int(doc)) for score, doc in zip(scores, candidates))
+
+        hits.sort(key=lambda h: -h[0])
+        return [self._result(segments[s], doc, score) for score, s, doc in hits[:limit]]
+
+    @staticmethod
+    def _result(seg: _Segment, doc: int, score: float) -> Dict:
+        columns = {col: int(seg.columns[col][doc]) for col in DOC_COLUMNS}
+        analysis = seg.analyses[columns["analysis"]]
+        is_param = columns["field"] == 0
+        return {
+            "score": round(score, 4),
+            "company": analysis["name"],
+            "reg_no": analysis["reg_no"],
+            "report_date": analysis["report_date"],
+            "field": FIELDS[columns["field"]],
+            "bank": BANK_NAMES[columns["bank"]] if is_param else None,
+            "parameter": parameter_name(columns["source"], columns["param"]) if is_param else None,
+            "status": STATUSES[columns["status"]] if is_param else None,
+            "text": seg.text(doc),
+        }
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Full-text search over Kredit Lab analyses.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_DIR, help=f"Index directory (default: {DEFAULT_INDEX_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Index JSONL files or JSON analyses")
+    ingest.add_argument("paths", nargs="+")
+    sub.add_parser("merge", help="Merge all segments into one")
+
+    search = sub.add_parser("search", help="Ranked search; end a word with * to match prefixes")
+    search.add_argument("query")
+    search.add_argument("--bank", choices=BANK_NAMES)
+    search.add_argument("--parameter", choices=[name for names in PARAM_NAMES for name in names])
+    search.add_argument("--status", choices=STATUSES)
+    search.add_argument("--field", choices=FIELDS)
+    search.add_argument("-n", "--limit", type=int, default=20)
+
+    args = parser.parse_args(argv)
+    index = SearchIndex(args.index)
+
+    if args.command == "ingest":
+        total = 0
+        for path in args.paths:
+            if path.endswith(".jsonl"):
+                total += index.ingest_jsonl(path)
+            else:
+                with open(path, "rb") as f:
+                    total += index.ingest([loads(f.read())])
+        print(f"Indexed {total} new analyses into {args.index} ({json.dumps(index.stats())})")
+    elif args.command == "merge":
+        index.merge()
+        print(json.dumps(index.stats()))
+    else:
+        results = index.search(args.query, args.bank, args.parameter, args.status, args.field, args.limit)
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
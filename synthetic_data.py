@@ -0,0 +1,158 @@
+"""
+Synthetic Analyses for Kredit Lab
+=================================
+Generate analyses that follow the schema of ``sample_analysis_output.json``
+at any size, for benchmarks and load tests.
+
+Entity count, evidence text length, parameters per bank, and number of banks
+(up to the six the schema accepts) can all be scaled. Output is deterministic
+for a given seed, and scores, pass counts, and grades are computed with
+``scoring.py`` so they are consistent with the parameters.
+
+Usage:
+    python synthetic_data.py -n 1000 -o synthetic.jsonl
+    python synthetic_data.py --entities 200 --evidence-chars 1000 --ccris 64 -o large.json
+"""
+
+import argparse
+import json
+import random
+import sys
+from typing import Dict, Iterator, List, Optional
+
+from analysis_schema import BANK_NAMES, SUPPORTED_SCHEMA_MAJOR
+from scoring import score_analysis
+
+_WORDS = ("facility", "conduct", "MIA", "arrears", "limit", "outstanding", "utilization", "director",
+          "company", "months", "settled", "HSLNFNCE", "OD", "CRDTCARD", "legal", "status", "property",
+          "record", "balance", "approved", "pending", "bureau", "ratio", "within", "policy", "0", "12", "75%")
+_NAMES = ("Ahmad", "Siti", "Tan", "Lim", "Kumar", "Nurul", "Wong", "Farid", "Aisyah", "Raj", "Chong", "Zainal")
+_CRITERIA = ("≥2 years track record", "Any entity owns property", "No declined applications",
+             "≤3 WC applications", "No pending applications", "No SAA flag", "No R&R / AKPK",
+             "OD utilization ≤80%", "CC utilization ≤70%", "MIA 0 for 12 months", "No current arrears",
+             "No non-bank lender", "No legal suits", "Not a defendant", "Clean trade bureau",
+             "Settlement letter available")
+_CLASSIFICATION_WEIGHTS = (("Strict 1", 1), ("Strict 2", 4), ("Preference", 4), ("Informational", 1),
+                           ("Not Applicable", 1))
+_STATUS_WEIGHTS = (("PASS", 9), ("FAIL", 1))
+
+
+def _text(rng: random.Random, chars: int) -> str:
+    words: List[str] = []
+    length = -1
+    while length < chars:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:max(chars, 1)]
+
+
+def _weighted(rng: random.Random, weights) -> str:
+    return rng.choices([v for v, _ in weights], [w for _, w in weights])[0]
+
+
+def _parameters(rng: random.Random, kinds: List[str], evidence_chars: int, first_id: int) -> List[Dict]:
+    params = []
+    for i, classification in enumerate(kinds):
+        if classification == "Informational":
+            status = "INFO"
+        elif classification == "Not Applicable":
+            status = "N/A"
+        else:
+            status = _weighted(rng, _STATUS_WEIGHTS)
+        params.append({
+            "id": first_id + i,
+            "classification": classification,
+            "status": status,
+            "criteria": _CRITERIA[(first_id + i) % len(_CRITERIA)],
+            "evidence": _text(rng, evidence_chars),
+        })
+    return params
+
+
+def make_analysis(seed: int = 0, entities: int = 2, evidence_chars: int = 40, ccris: int = 16,
+                  ctos: int = 4, banks: int = 6) -> Dict:
+    """Build one synthetic analysis; the same arguments always give the same analysis."""
+    if not 1 <= banks <= len(BANK_NAMES):
+        raise ValueError(f"banks must be between 1 and {len(BANK_NAMES)}")
+    rng = random.Random(seed)
+    company = f"Synthetic {seed} Sdn Bhd"
+
+    # Each parameter has a usual classification that some banks override, as in real policies.
+    usual = [_weighted(rng, _CLASSIFICATION_WEIGHTS) for _ in range(ccris + ctos)]
+    bank_data = {}
+    for bank in BANK_NAMES[:banks]:
+        kinds = [k if rng.random() > 0.2 else _weighted(rng, _CLASSIFICATION_WEIGHTS) for k in usual]
+        bank_data[bank] = {
+            "ccris": _parameters(rng, kinds[:ccris], evidence_chars, 1),
+            "ctos": _parameters(rng, kinds[ccris:], evidence_chars, ccris + 1),
+        }
+
+    data = {
+        "_schema_version": f"{SUPPORTED_SCHEMA_MAJOR}.0",
+        "_description": f"Synthetic Kredit Lab Analysis for {company}",
+        "company": {"name": company, "reg_no": f"{100000 + seed % 900000}-{'XKMPW'[seed % 5]}"},
+        "meta": {
+            "report_date": f"2024-{1 + seed % 12:02d}-{1 + seed % 28:02d}",
+            "analysis_date": f"2024-{1 + seed % 12:02d}-{1 + seed % 28:02d}",
+            "prepared_by": "Kredit Lab System",
+        },
+        "entities": [
+            {
+                "type": "Director" if i < 2 or rng.random() < 0.5 else "Shareholder",
+                "name": f"{rng.choice(_NAMES)} {rng.choice(_NAMES)} {i + 1}",
+                "ic": f"{rng.randint(600101, 991231)}-{rng.randint(10, 14)}-{rng.randint(1000, 9999)}",
+                "shareholding": f"{rng.randint(1, 60)}%",
+            }
+            for i in range(entities)
+        ],
+        "banks": bank_data,
+        "critical_findings": [],
+        "strengths": [_text(rng, 60) for _ in range(rng.randint(0, 4))],
+        "attention_items": [_text(rng, 60) for _ in range(rng.randint(0, 4))],
+    }
+
+    scores = score_analysis(data)
+    for bank, result in scores["banks"].items():
+        bank_data[bank] = {**result, **bank_data[bank]}
+    data["consolidated"] = {**scores["consolidated"], "explanation": _text(rng, 200)}
+    return data
+
+
+def iter_analyses(count: int, seed: int = 0, **sizes) -> Iterator[Dict]:
+    """Yield ``count`` distinct synthetic analyses of the same size."""
+    for i in range(count):
+        yield make_analysis(seed + i, **sizes)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic Kredit Lab analyses.")
+    parser.add_argument("-n", "--count", type=int, default=1, help="Number of analyses (default: 1)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="Output file; .jsonl or more than one analysis writes one per line (default: stdout)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--entities", type=int, default=2)
+    parser.add_argument("--evidence-chars", type=int, default=40)
+    parser.add_argument("--ccris", type=int, default=16, help="CCRIS parameters per bank")
+    parser.add_argument("--ctos", type=int, default=4, help="CTOS parameters per bank")
+    parser.add_argument("--banks", type=int, default=6, choices=range(1, len(BANK_NAMES) + 1))
+    args = parser.parse_args(argv)
+
+    analyses = iter_analyses(args.count, args.seed, entities=args.entities, evidence_chars=args.evidence_chars,
+                             ccris=args.ccris, ctos=args.ctos, banks=args.banks)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        if args.count == 1 and not args.output.endswith(".jsonl"):
+            json.dump(next(analyses), out, ensure_ascii=False, indent=2)
+            out.write("\n")
+        else:
+            for data in analyses:
+                out.write(json.dumps(data, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
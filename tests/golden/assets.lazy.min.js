@@ -0,0 +1 @@
+var bankData=JSON.parse(document.getElementById('bank-data').textContent),builtBanks={};var typeBadges=["<span class=\"type-badge type-na\">⚪ N/A</span>","<span class=\"type-badge type-strict1\">🔴 S1</span>","<span class=\"type-badge type-strict2\">🟣 S2</span>","<span class=\"type-badge type-pref\">🟡 Pref</span>","<span class=\"type-badge type-info\">🔵 Info</span>"],statusBadges=["<span class=\"status-badge status-na\">⚪ N/A</span>","<span class=\"status-badge status-pass\">✅ Pass</span>","<span class=\"status-badge status-fail\">❌ Fail</span>","<span class=\"status-badge status-info\">ℹ Info</span>"],paramNames=[["CCRIS Vintage","Property Ownership","Declined (12mo)","WC Applications (12mo)","Credit App Status","Status A (Accepted)","Status T (Pending)","Status P (Pending Approval)","Special Attention Account","R&R / AKPK Status","Overdraft Utilization","Credit Card Utilization","Conduct of Account (12mo)","Current Month Arrears","Non-Bank Lender","Director Personal Loan"],["No Legal Suits","Legal Suit (Defendant)","Trade Bureau","Legal Status on Loan"]];function paramRows(params,names){var html='';for(var i=0;i<params.length;i++){var p=params[i];html+='<tr><td>'+(i+1)+'</td><td>'+(i<names.length?names[i]:'Param '+(i+1))+'</td><td>'+typeBadges[p[0]]+'</td><td>'+p[2]+'</td><td>'+statusBadges[p[1]]+'</td><td>'+p[3]+'</td></tr>';}return html;}function buildBank(bankId){if(builtBanks[bankId])return;builtBanks[bankId]=true;var bodies=document.getElementById('bank-'+bankId).getElementsByTagName('tbody');bodies[0].innerHTML=paramRows(bankData[bankId][0],paramNames[0]);bodies[1].innerHTML=paramRows(bankData[bankId][1],paramNames[1]);}function showBank(bankId){buildBank(bankId);document.querySelectorAll('.bank-content').forEach(el=>el.classList.remove('active'));document.querySelectorAll('.bank-tab').forEach(el=>el.classList.remove('active'));document.getElementById('bank-'+bankId).classList.add('active');event.target.classList.add('active');}buildBank('rhb');
\ No newline at end of file
@@ -0,0 +1 @@
+function showBank(bankId){document.querySelectorAll('.bank-content').forEach(el=>el.classList.remove('active'));document.querySelectorAll('.bank-tab').forEach(el=>el.classList.remove('active'));document.getElementById('bank-'+bankId).classList.add('active');event.target.classList.add('active');}
\ No newline at end of file
@@ -0,0 +1,40 @@
+import copy
+
+import pytest
+
+from analysis_archive import AnalysisArchive
+from synthetic_data import make_analysis
+
+
+@pytest.fixture
+def analysis():
+    return make_analysis(seed=7)
+
+
+def _revised(data, score):
+    data = copy.deepcopy(data)
+    data["banks"]["RHB"]["score"] = score
+    return data
+
+
+def test_companies_without_identity_are_not_archived(tmp_path, analysis):
+    archive = AnalysisArchive(str(tmp_path))
+    for name, reg_no in (("N/A", "N/A"), ("", "")):
+        nameless = copy.deepcopy(analysis)
+        nameless["company"] = {"name": name, "reg_no": reg_no}
+        assert archive.add(nameless) == 0
+        assert archive.changes_since_previous(_revised(nameless, 12.5)) is None
+    assert archive.stats()["versions"] == 0
+
+
+def test_writers_in_two_processes_share_one_chain(tmp_path, analysis):
+    app, cli = AnalysisArchive(str(tmp_path)), AnalysisArchive(str(tmp_path))
+    versions = [_revised(analysis, score) for score in (10.0, 20.0, 30.0, 40.0)]
+    assert app.add(versions[0]) == 1
+    assert cli.add(versions[1]) == 2
+    # ``app`` last read the log before ``cli`` appended to it.
+    assert app.add(versions[2]) == 3
+    assert cli.add(versions[3]) == 4
+    for archive in (app, cli):
+        assert [archive.get(analysis, n)["banks"]["RHB"]["score"] for n in range(1, 5)] == [10.0, 20.0, 30.0, 40.0]
+    assert app.changes_since_previous(versions[3])["banks"] == [{"bank": "RHB", "changes": {"score": [30.0, 40.0]}}]
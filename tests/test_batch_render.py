@@ -0,0 +1,154 @@
+import copy
+import gzip
+import json
+import os
+
+import pytest
+
+from batch_render import iter_jobs, main, render_job, render_job_with_data
+from html_generator import generate_html_report, report_filename
+
+from conftest import ROOT
+
+
+@pytest.fixture(scope="module")
+def sample():
+    with open(os.path.join(ROOT, "sample_analysis_output.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _company(sample, n):
+    data = copy.deepcopy(sample)
+    data["company"]["name"] = f"Company {n} Sdn Bhd"
+    return data
+
+
+def _write_jsonl(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+# =============================================================================
+# JOB DISCOVERY
+# =============================================================================
+
+def test_jsonl_yields_one_job_per_non_blank_line(sample, tmp_path):
+    analyses = [_company(sample, n) for n in range(3)]
+    jsonl = tmp_path / "month_end.jsonl"
+    _write_jsonl(jsonl, [json.dumps(analyses[0]), "", json.dumps(analyses[1]), "   ", json.dumps(analyses[2])])
+
+    jobs = list(iter_jobs(str(jsonl)))
+
+    assert [source for source, _, _ in jobs] == [f"{jsonl}:1", f"{jsonl}:3", f"{jsonl}:5"]
+    assert all(path == str(jsonl) for _, path, _ in jobs)
+    assert [json.loads(text)["company"]["name"] for _, _, text in jobs] == [d["company"]["name"] for d in analyses]
+
+
+def test_directory_yields_json_files_and_jsonl_lines(sample, tmp_path):
+    analyses = [_company(sample, n) for n in range(3)]
+    (tmp_path / "b.json").write_text(json.dumps(analyses[0]), encoding="utf-8")
+    _write_jsonl(tmp_path / "a.jsonl", [json.dumps(d) for d in analyses[1:]])
+    (tmp_path / "notes.txt").write_text("not an analysis", encoding="utf-8")
+
+    jobs = list(iter_jobs(str(tmp_path)))
+
+    a, b = str(tmp_path / "a.jsonl"), str(tmp_path / "b.json")
+    assert [source for source, _, _ in jobs] == [f"{a}:1", f"{a}:2", b]
+    # Whole files are left for the worker to read.
+    assert jobs[-1] == (b, b, None)
+
+
+def test_render_job_reads_jsonl_line(sample, tmp_path):
+    data = _company(sample, 4)
+    jsonl = tmp_path / "one.jsonl"
+    _write_jsonl(jsonl, [json.dumps(data)])
+    out_dir = tmp_path / "reports"
+    out_dir.mkdir()
+
+    result = render_job(next(iter_jobs(str(jsonl))), str(out_dir))
+
+    assert result.error is None
+    assert result.source == f"{jsonl}:1"
+    assert result.company == data["company"]["name"]
+    with open(result.output, "r", encoding="utf-8") as f:
+        assert f.read() == generate_html_report(data)
+
+
+# =============================================================================
+# INVALID INPUT
+# =============================================================================
+
+def test_invalid_files_are_reported_not_raised(tmp_path):
+    out_dir = tmp_path / "reports"
+    out_dir.mkdir()
+    malformed = tmp_path / "malformed.json"
+    malformed.write_text("{not json", encoding="utf-8")
+    invalid = tmp_path / "invalid.json"
+    invalid.write_text(json.dumps({"company": {"name": "No Banks"}}), encoding="utf-8")
+    missing = tmp_path / "missing.json"
+
+    results = {}
+    for path in (malformed, invalid, missing):
+        result, data = render_job_with_data((str(path), str(path), None), str(out_dir))
+        assert data is None
+        assert result.output is None and result.bytes_written == 0
+        results[path.name] = result.error
+
+    assert results["malformed.json"].startswith("JSONDecodeError")
+    assert results["invalid.json"].startswith("AnalysisValidationError")
+    assert results["missing.json"].startswith("FileNotFoundError")
+    assert os.listdir(out_dir) == []
+
+
+def test_cli_exit_code_reports_failures(sample, tmp_path, capsys):
+    good = tmp_path / "good.json"
+    good.write_text(json.dumps(_company(sample, 1)), encoding="utf-8")
+    (tmp_path / "bad.json").write_text("{", encoding="utf-8")
+    out_dir = str(tmp_path / "reports")
+
+    assert main([str(tmp_path / "*.json"), "-o", out_dir, "-j", "1"]) == 1
+    out = capsys.readouterr().out
+    assert "Rendered 1/2 analyses" in out
+    assert f"{tmp_path / 'bad.json'}: JSONDecodeError" in out
+
+    assert main([str(tmp_path / "nothing-*.json"), "-o", out_dir, "-j", "1"]) == 2
+
+
+# =============================================================================
+# OUTPUT FILES
+# =============================================================================
+
+def test_existing_report_gets_numeric_suffix(sample, tmp_path):
+    data = _company(sample, 2)
+    job = ("inline", "inline", json.dumps(data))
+    out_dir = tmp_path / "reports"
+    out_dir.mkdir()
+    existing = out_dir / report_filename(data)
+    existing.write_text("keep me", encoding="utf-8")
+
+    outputs = [render_job(job, str(out_dir)).output for _ in range(2)]
+
+    stem = os.path.splitext(str(existing))[0]
+    assert outputs == [f"{stem}_2.html", f"{stem}_3.html"]
+    assert existing.read_text(encoding="utf-8") == "keep me"
+
+    assert render_job(job, str(out_dir), overwrite=True).output == str(existing)
+    assert existing.read_text(encoding="utf-8") == generate_html_report(data)
+
+
+def test_compressed_only_report_is_not_clobbered(sample, tmp_path):
+    data = _company(sample, 3)
+    job = ("inline", "inline", json.dumps(data))
+    out_dir = tmp_path / "reports"
+    out_dir.mkdir()
+
+    first = render_job(job, str(out_dir), compress=["gzip"], keep_html=False)
+    second = render_job(job, str(out_dir), compress=["gzip"], keep_html=False)
+
+    assert first.output != second.output
+    assert sorted(os.listdir(out_dir)) == sorted(os.path.basename(p) for p in (first.output, second.output))
+    for result in (first, second):
+        assert result.output.endswith(".html.gz")
+        with gzip.open(result.output, "rt", encoding="utf-8") as f:
+            assert f.read() == generate_html_report(data)
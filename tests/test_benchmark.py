@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from benchmark import CASES, DEFAULT_THRESHOLDS, TIMINGS, check_thresholds, load_case, main
+
+
+def _results(**cases):
+    return {"cases": cases}
+
+
+# =============================================================================
+# ABSOLUTE LIMITS
+# =============================================================================
+
+def test_within_limits_passes():
+    thresholds = {"cases": {"sample": {"render_us": 100}}}
+    assert check_thresholds(_results(sample={"render_us": 100, "html_bytes": 10**9}), thresholds) == []
+
+
+def test_limit_exceeded_is_reported():
+    thresholds = {"cases": {"sample": {"render_us": 100}}}
+    assert check_thresholds(_results(sample={"render_us": 1500.5}), thresholds) == [
+        "sample.render_us = 1,500.5 exceeds limit 100"]
+
+
+def test_star_case_applies_to_every_case_and_can_be_overridden():
+    thresholds = {"cases": {"*": {"render_us": 100}, "large": {"render_us": 1000}}}
+    results = _results(sample={"render_us": 150}, large={"render_us": 500}, other={"render_us": 50})
+    assert check_thresholds(results, thresholds) == ["sample.render_us = 150 exceeds limit 100"]
+
+
+def test_metrics_missing_from_results_are_ignored():
+    thresholds = {"cases": {"sample": {"render_lazy_us": 1}}}
+    assert check_thresholds(_results(sample={"render_us": 10}), thresholds) == []
+
+
+# =============================================================================
+# REGRESSIONS
+# =============================================================================
+
+def test_regression_against_baseline():
+    thresholds = {"max_regression": {"render_us": 0.5}}
+    baseline = _results(sample={"render_us": 100, "html_bytes": 1000})
+    assert check_thresholds(_results(sample={"render_us": 150, "html_bytes": 5000}), thresholds, baseline) == []
+    assert check_thresholds(_results(sample={"render_us": 151}), thresholds, baseline) == [
+        "sample.render_us = 151 regressed +51% from 100 (allowed +50%)"]
+
+
+def test_star_regression_is_the_fallback():
+    thresholds = {"max_regression": {"*": 0.1, "html_bytes": 0.0}}
+    baseline = _results(sample={"render_us": 100, "html_bytes": 1000})
+    violations = check_thresholds(_results(sample={"render_us": 105, "html_bytes": 1001}), thresholds, baseline)
+    assert violations == ["sample.html_bytes = 1,001 regressed +0% from 1,000 (allowed +0%)"]
+
+
+def test_regression_skips_cases_and_metrics_without_a_baseline():
+    thresholds = {"max_regression": {"*": 0.0}}
+    baseline = _results(sample={"render_us": 0})
+    results = _results(sample={"render_us": 10, "parse_us": 10}, large={"render_us": 10})
+    assert check_thresholds(results, thresholds, baseline) == []
+    assert check_thresholds(results, thresholds) == []
+
+
+# =============================================================================
+# FILES
+# =============================================================================
+
+def test_shipped_thresholds_name_known_cases_and_metrics():
+    with open(DEFAULT_THRESHOLDS, "r", encoding="utf-8") as f:
+        thresholds = json.load(f)
+    metrics = set(TIMINGS) | {"render_peak_bytes", "end_to_end_peak_bytes", "html_bytes", "html_lazy_bytes",
+                              "input_bytes"}
+    assert set(thresholds["cases"]) <= set(CASES) | {"*"}
+    for limits in thresholds["cases"].values():
+        assert set(limits) <= metrics
+    assert set(thresholds["max_regression"]) <= metrics | {"*"}
+
+
+def test_runs_from_another_directory(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    assert load_case("sample")["company"]["name"]
+    assert main(["--cases", "sample", "--repeat", "1", "-o", "results.json"]) in (0, 1)
+    with open(tmp_path / "results.json", "r", encoding="utf-8") as f:
+        assert set(json.load(f)["cases"]) == {"sample"}
+    out = capsys.readouterr()
+    assert "threshold" in out.out + out.err
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_every_case_loads(name):
+    assert load_case(name)["banks"]
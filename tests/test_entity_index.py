@@ -0,0 +1,53 @@
+import pytest
+
+from entity_index import EntityIndex, company_key, party_key
+
+
+def _analysis(name, reg_no, entities):
+    return {"company": {"name": name, "reg_no": reg_no}, "meta": {"report_date": "2024-12-20"},
+            "entities": [{"type": "Shareholder", "name": n, "ic": ic, "shareholding": "50%"} for n, ic in entities]}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return EntityIndex(str(tmp_path / "entity_index.jsonl"))
+
+
+@pytest.mark.parametrize("value", ["", "N/A", "n/a", "—", "-", None])
+def test_placeholders_are_not_keys(value):
+    assert party_key({"name": value, "ic": value}) == ""
+    assert company_key({"name": value, "reg_no": value}) == ""
+
+
+def test_placeholder_parties_do_not_link_companies(index):
+    index.add(_analysis("Alpha Sdn Bhd", "111111-A", [("N/A", "N/A"), ("Ahmad", "800101-14-5555")]))
+    index.add(_analysis("Beta Sdn Bhd", "222222-B", [("N/A", "N/A"), ("", "—")]))
+    assert index.linked_companies("reg:111111A") == []
+    assert index.groups() == []
+    assert index.companies_for_name("N/A") == []
+
+
+def test_real_parties_still_link(index):
+    index.add(_analysis("Alpha Sdn Bhd", "111111-A", [("Ahmad", "800101-14-5555")]))
+    index.add(_analysis("Beta Sdn Bhd", "222222-B", [("Dato' Ahmad", "800101145555")]))
+    assert [link["key"] for link in index.linked_companies("reg:111111A")] == ["reg:222222B"]
+
+
+def test_companies_without_identity_are_not_merged(index):
+    assert index.add(_analysis("N/A", "N/A", [("Ahmad", "800101-14-5555")])) == ""
+    assert index.add(_analysis("", "", [("Lim", "750505-10-1234")])) == ""
+    assert len(index) == 0
+    index.add(_analysis("Alpha Sdn Bhd", "111111-A", [("Ahmad", "800101-14-5555")]))
+    assert len(index) == 1
+
+
+def test_old_placeholder_keys_are_rederived_on_load(tmp_path):
+    path = str(tmp_path / "entity_index.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for name, reg_no in (("Alpha", "111111-A"), ("Beta", "222222-B")):
+            f.write('{"key": "reg:%s", "name": "%s", "reg_no": "%s", "report_date": null, '
+                    '"parties": [["name:N A", "N A", "Director", "N/A", "N/A", "—"]]}\n'
+                    % (reg_no.replace("-", ""), name, reg_no))
+    index = EntityIndex(path)
+    assert len(index) == 2
+    assert index.groups() == []
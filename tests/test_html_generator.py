@@ -0,0 +1,118 @@
+import copy
+import json
+import os
+import re
+
+import pytest
+
+from analysis_schema import AnalysisValidationError, parse_analysis
+from html_generator import BANK_IDS, generate_html_report
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def sample():
+    with open(os.path.join(ROOT, "sample_analysis_output.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# =============================================================================
+# INVALID VALUES
+# =============================================================================
+
+def test_invalid_bank_grade_is_shown_as_given(sample):
+    sample["banks"]["RHB"]["final_grade"] = "B+"
+    html = generate_html_report(sample)
+    assert '<div class="summary-grade grade-c">B+</div>' in html
+    assert "→ Final: B+" in html
+
+
+def test_invalid_consolidated_grade_is_shown_as_given(sample):
+    sample["consolidated"]["final_grade"] = "B+"
+    html = generate_html_report(sample)
+    assert '<div class="grade-display grade-c">B+</div>' in html
+
+
+def test_string_score_is_shown_as_given(sample):
+    sample["banks"]["CIMB"]["score"] = "75"
+    sample["consolidated"]["score"] = "81"
+    html = generate_html_report(sample)
+    assert "Score: 75%" in html
+    assert '<div class="kpi-value">81%</div>' in html
+
+
+def test_numeric_shareholding_is_shown_as_given(sample):
+    sample["entities"][0]["shareholding"] = 60
+    html = generate_html_report(sample)
+    assert f'<td>{sample["entities"][0]["ic"]}</td><td>60</td>' in html
+
+
+def test_missing_fields_get_defaults(sample):
+    del sample["banks"]["RHB"]["final_grade"]
+    del sample["banks"]["RHB"]["score"]
+    del sample["company"]["name"]
+    html = generate_html_report(sample)
+    assert "<title>Kredit Lab Report - Unknown Company</title>" in html
+    assert '<h3>RHB</h3><div class="summary-grade grade-c">C</div><div class="summary-score">Score: 0%</div>' in html
+
+
+def test_rendering_does_not_modify_input(sample):
+    sample["banks"]["RHB"]["final_grade"] = "B+"
+    before = copy.deepcopy(sample)
+    generate_html_report(sample)
+    assert sample == before
+
+
+def test_parse_analysis_still_rejects_invalid_values(sample):
+    sample["banks"]["RHB"]["final_grade"] = "B+"
+    with pytest.raises(AnalysisValidationError) as e:
+        parse_analysis(json.dumps(sample))
+    assert "banks.RHB.final_grade" in str(e.value)
+
+
+# =============================================================================
+# LAZY MODE
+# =============================================================================
+
+def _lazy_rows(html):
+    """Bank id -> (CCRIS rows, CTOS rows) as the lazy report's script would build them."""
+    payload = re.search(r'<script type="application/json" id="bank-data">(.*?)</script>', html, re.S).group(1)
+    script = re.search(r"var typeBadges = (\[.*?\]), statusBadges = (\[.*?\]), "
+                       r"paramNames = \[(\[.*?\]), (\[.*?\])\];", html)
+    type_badges, status_badges, *param_names = (json.loads(g) for g in script.groups())
+    rows = {}
+    for bid, tables in json.loads(payload).items():
+        rows[bid] = tuple(
+            "".join(f"<tr><td>{i + 1}</td><td>{names[i] if i < len(names) else f'Param {i + 1}'}</td>"
+                    f"<td>{type_badges[t]}</td><td>{criteria}</td><td>{status_badges[st]}</td>"
+                    f"<td>{evidence}</td></tr>"
+                    for i, (t, st, criteria, evidence) in enumerate(params))
+            for params, names in zip(tables, param_names)
+        )
+    return rows
+
+
+def _static_rows(html, bid):
+    content = re.search(rf'<div id="bank-{bid}" class="bank-content.*?<tfoot>', html, re.S).group(0)
+    return tuple(re.findall(r"<tbody>(.*?)</tbody>", content, re.S))
+
+
+def test_lazy_payload_builds_the_static_tables(sample):
+    rhb = sample["banks"]["RHB"]
+    rhb["ccris"][0]["evidence"] = "Closed </script><script>alert(1)</script> <!-- note -->"
+    rhb["ctos"][0]["criteria"] = "No </SCRIPT> or <!-- here"
+    static = generate_html_report(sample)
+    lazy = generate_html_report(sample, mode="lazy")
+    rows = _lazy_rows(lazy)
+    assert set(rows) == set(BANK_IDS.values())
+    for bid in BANK_IDS.values():
+        assert rows[bid] == _static_rows(static, bid)
+
+
+def test_lazy_payload_cannot_close_its_script_element(sample):
+    sample["banks"]["RHB"]["ccris"][0]["evidence"] = "</script><!--"
+    lazy = generate_html_report(sample, mode="lazy")
+    payload = re.search(r'id="bank-data">(.*?)</script>', lazy, re.S).group(1)
+    assert "</" not in payload and "<!--" not in payload
+    assert json.loads(payload)[BANK_IDS["RHB"]][0][0][3] == "</script><!--"
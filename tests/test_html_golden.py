@@ -0,0 +1,121 @@
+"""Byte-for-byte comparison of rendered reports against checked-in golden files.
+
+The static files in ``tests/golden/`` were rendered by the original
+f-string ``generate_html_report`` (before the template engine) and the
+``.lazy.html`` files by lazy mode when it was added, so any change to the
+output of a valid analysis shows up here. Regenerate one only when the
+report is meant to change:
+
+    KREDITLAB_UPDATE_GOLDEN=1 python -m pytest tests/test_html_golden.py
+"""
+
+import copy
+import json
+import os
+
+import pytest
+
+from html_generator import generate_html_report, write_html_report
+
+from conftest import ROOT
+
+GOLDEN_DIR = os.path.join(ROOT, "tests", "golden")
+
+
+def _drop_banks(d):
+    for bank in ("CIMB", "SME Bank", "Bank Rakyat"):
+        del d["banks"][bank]
+
+
+def _flip_statuses(d):
+    for bd in d["banks"].values():
+        for p in bd["ccris"] + bd["ctos"]:
+            p["status"] = {"PASS": "FAIL", "FAIL": "PASS"}.get(p["status"], p["status"])
+        bd["score"], bd["raw_grade"], bd["final_grade"] = 41.5, "E", "E"
+
+
+def _markup_text(d):
+    d["company"]["name"] = 'Syarikat "A&B" <Niaga> Sdn Bhd'
+    d["entities"][0]["name"] = "O'Brien & <Sons>"
+    d["banks"]["RHB"]["ccris"][0]["evidence"] = "<script>alert(1)</script> & 5 > 3"
+    d["strengths"].append("Uses <b>tags</b> & ampersands")
+
+
+def _empty_lists(d):
+    d["entities"] = []
+    d["critical_findings"] = []
+    d["strengths"] = []
+    d["attention_items"] = []
+
+
+def _other_meta(d):
+    d["meta"].update(report_date="2025-03-01", analysis_date="2025-03-04", prepared_by="Credit Desk")
+    d["consolidated"].update(score=88.25, raw_grade="A", final_grade="A")
+
+
+def _unicode(d):
+    d["company"]["name"] = "Syarikat Maju Jaya 成功 Sdn Bhd — ≥ 2 tahun"
+    d["banks"]["Maybank"]["ctos"][0]["evidence"] = "Tiada rekod ✓ • 零"
+
+
+def _long_evidence(d):
+    for bd in d["banks"].values():
+        for p in bd["ccris"]:
+            p["evidence"] = (p["evidence"] + " ") * 20
+
+
+VARIANTS = {
+    "sample": lambda d: None,
+    "three_banks": _drop_banks,
+    "flipped_statuses": _flip_statuses,
+    "markup_text": _markup_text,
+    "empty_lists": _empty_lists,
+    "other_meta": _other_meta,
+    "unicode_text": _unicode,
+    "long_evidence": _long_evidence,
+}
+
+
+def _variant(sample, name):
+    data = copy.deepcopy(sample)
+    VARIANTS[name](data)
+    return data
+
+
+@pytest.fixture(scope="module")
+def sample():
+    with open(os.path.join(ROOT, "sample_analysis_output.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Lazy mode differs from static only in the bank tables and footer script.
+LAZY_VARIANTS = ["sample", "three_banks", "markup_text", "empty_lists", "unicode_text"]
+
+
+def _golden(name, html):
+    path = os.path.join(GOLDEN_DIR, f"{name}.html")
+    if os.environ.get("KREDITLAB_UPDATE_GOLDEN"):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(html)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", VARIANTS)
+def test_report_matches_golden(sample, name):
+    html = generate_html_report(_variant(sample, name))
+    assert html == _golden(name, html)
+
+
+@pytest.mark.parametrize("name", VARIANTS)
+def test_streamed_report_matches_golden(sample, name, tmp_path):
+    path = tmp_path / "report.html"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        write_html_report(_variant(sample, name), f)
+    assert path.read_text(encoding="utf-8") == _golden(name, generate_html_report(_variant(sample, name)))
+
+
+@pytest.mark.parametrize("name", LAZY_VARIANTS)
+def test_lazy_report_matches_golden(sample, name):
+    html = generate_html_report(_variant(sample, name), mode="lazy")
+    assert html == _golden(f"{name}.lazy", html)
@@ -0,0 +1,127 @@
+import copy
+import json
+import os
+
+import pytest
+
+from analysis_schema import normalize_analysis, parse_analysis, validate_analysis
+from html_generator import generate_html_report
+from model import Analysis, Classification, Status, iter_analyses_jsonl, load_analysis
+
+from conftest import ROOT
+
+SAMPLE = os.path.join(ROOT, "sample_analysis_output.json")
+GOLDEN_DIR = os.path.join(ROOT, "tests", "golden")
+
+
+@pytest.fixture(scope="module")
+def sample():
+    with open(SAMPLE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _three_banks(d):
+    for bank in ("CIMB", "SME Bank", "Bank Rakyat"):
+        del d["banks"][bank]
+
+
+def _empty_lists(d):
+    d["entities"] = []
+    d["critical_findings"] = []
+    d["strengths"] = []
+    d["attention_items"] = []
+
+
+def _renamed(d):
+    d["company"].update(name="Syarikat Lain Sdn Bhd", reg_no="654321-Y")
+    d["meta"]["analysis_date"] = None
+
+
+VARIANTS = {"sample": lambda d: None, "three_banks": _three_banks, "empty_lists": _empty_lists, "renamed": _renamed}
+
+
+def _variant(sample, name):
+    data = copy.deepcopy(sample)
+    VARIANTS[name](data)
+    return data
+
+
+def _plain(data):
+    """``data`` as it would come back from disk: plain dicts and lists only."""
+    return json.loads(json.dumps(data))
+
+
+def _normalized(data):
+    """``normalize_analysis(data)`` without the unknown keys the model does not keep."""
+    d = _plain(normalize_analysis(data))
+    d.pop("_description", None)
+    return d
+
+
+# =============================================================================
+# ROUND TRIP
+# =============================================================================
+
+@pytest.mark.parametrize("name", VARIANTS)
+def test_to_dict_is_the_normalized_analysis(sample, name):
+    data = _variant(sample, name)
+    assert _plain(Analysis.from_dict(data).to_dict()) == _normalized(data)
+
+
+@pytest.mark.parametrize("name", VARIANTS)
+def test_round_trip_through_json_is_stable(sample, name):
+    data = _variant(sample, name)
+    first = Analysis.from_dict(data).to_dict()
+
+    normalized, errors = validate_analysis(_plain(first))
+    assert errors == []
+    assert _plain(normalized) == _plain(first)
+    assert _plain(Analysis.from_dict(_plain(first)).to_dict()) == _plain(first)
+
+
+def test_to_dict_passes_through_normalize_analysis_unchanged(sample):
+    d = Analysis.from_dict(sample).to_dict()
+    assert normalize_analysis(d) is d
+
+
+def test_invalid_values_become_schema_defaults(sample):
+    data = _plain(sample)
+    data["banks"]["RHB"]["ccris"][0]["status"] = "MAYBE"
+    analysis = Analysis.from_dict(data)
+    assert _plain(analysis.to_dict()) == _normalized(data)
+    assert analysis.banks["RHB"].ccris[0].status is Status(0)
+
+
+def test_codes_and_interned_criteria_are_shared(sample):
+    a, b = Analysis.from_dict(sample), Analysis.from_dict(_plain(sample))
+    pa, pb = a.banks["RHB"].ccris[0], b.banks["RHB"].ccris[0]
+    assert isinstance(pa.classification, Classification) and isinstance(pa.status, Status)
+    assert pa.criteria is pb.criteria
+
+
+def test_loaders_match_from_dict(sample, tmp_path):
+    jsonl = tmp_path / "two.jsonl"
+    expected = [sample, _variant(sample, "renamed")]
+    jsonl.write_text(json.dumps(expected[0]) + "\n\n" + json.dumps(expected[1]) + "\n", encoding="utf-8")
+
+    assert _plain(load_analysis(SAMPLE).to_dict()) == _normalized(parse_analysis(json.dumps(sample)))
+    assert [_plain(a.to_dict()) for a in iter_analyses_jsonl(str(jsonl))] == \
+        [_normalized(d) for d in expected]
+
+
+# =============================================================================
+# RENDERING
+# =============================================================================
+
+@pytest.mark.parametrize("mode, golden", [("static", "sample.html"), ("lazy", "sample.lazy.html")])
+def test_model_renders_like_dict_and_golden(sample, mode, golden):
+    html = generate_html_report(Analysis.from_dict(sample), mode=mode)
+    assert html == generate_html_report(sample, mode=mode)
+    with open(os.path.join(GOLDEN_DIR, golden), "r", encoding="utf-8", newline="") as f:
+        assert html == f.read()
+
+
+@pytest.mark.parametrize("name", VARIANTS)
+def test_model_renders_like_dict_for_variants(sample, name):
+    data = _variant(sample, name)
+    assert generate_html_report(Analysis.from_dict(data)) == generate_html_report(data)
@@ -0,0 +1,26 @@
+import threading
+
+import perf
+
+
+def test_enable_thread_does_not_leak_to_other_threads(monkeypatch):
+    monkeypatch.setattr(perf, "ENABLED", False)
+    seen = {}
+
+    def other():
+        with perf.capture() as run, perf.phase("test.other"):
+            pass
+        seen["enabled"], seen["run"] = perf.enabled(), run
+
+    perf.enable_thread(True)
+    try:
+        with perf.capture() as run, perf.phase("test.here"):
+            pass
+        t = threading.Thread(target=other)
+        t.start()
+        t.join()
+    finally:
+        perf.enable_thread(None)
+    assert "test.here" in run
+    assert seen == {"enabled": False, "run": {}}
+    assert not perf.enabled()
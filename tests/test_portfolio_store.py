@@ -0,0 +1,71 @@
+import copy
+import json
+import os
+
+import pytest
+
+from portfolio_store import PortfolioStore, main
+
+from conftest import ROOT
+
+
+def iter_analyses(count, first=0):
+    """Copies of the sample analysis, each under its own company name."""
+    with open(os.path.join(ROOT, "sample_analysis_output.json"), "r", encoding="utf-8") as f:
+        sample = json.load(f)
+    for n in range(first, first + count):
+        data = copy.deepcopy(sample)
+        data["company"]["name"] = f"Company {n} Sdn Bhd"
+        yield data
+
+
+def _write_jsonl(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def test_cli_ingests_all_paths_into_one_chunk_and_skips_duplicates(tmp_path, capsys):
+    analyses = list(iter_analyses(4))
+    jsonl = tmp_path / "archive.jsonl"
+    _write_jsonl(jsonl, [json.dumps(d) for d in analyses[:3]])
+    single = tmp_path / "extra.json"
+    single.write_text(json.dumps(analyses[3]), encoding="utf-8")
+    duplicate = tmp_path / "again.json"
+    duplicate.write_text(json.dumps(analyses[0]), encoding="utf-8")
+    store_dir = str(tmp_path / "store")
+
+    assert main(["--store", store_dir, "ingest", str(jsonl), str(single), str(duplicate)]) == 0
+    assert "Ingested 4 new analyses" in capsys.readouterr().out
+    assert len(os.listdir(store_dir)) == 1
+
+    assert main(["--store", store_dir, "ingest", str(jsonl)]) == 0
+    assert "Ingested 0 new analyses" in capsys.readouterr().out
+    assert len(PortfolioStore(store_dir)) > 0
+
+
+def test_invalid_lines_are_skipped_not_fatal(tmp_path):
+    good = list(iter_analyses(2))
+    jsonl = tmp_path / "archive.jsonl"
+    _write_jsonl(jsonl, [json.dumps(good[0]), "{broken", json.dumps({"company": None}), json.dumps(good[1])])
+    store = PortfolioStore(str(tmp_path / "store"), chunk_rows=1)
+    errors = []
+    assert store.ingest_jsonl(str(jsonl), errors) == 2
+    assert [e.split(": ")[0] for e in errors] == [f"{jsonl}:2", f"{jsonl}:3"]
+
+
+def test_half_written_chunk_does_not_block_ingest(tmp_path):
+    store_dir = tmp_path / "store"
+    os.makedirs(store_dir / "chunk-000001.tmp")
+    store = PortfolioStore(str(store_dir))
+    assert store.ingest(iter_analyses(1)) == 1
+    os.makedirs(store_dir / "chunk-000002.tmp")
+    assert store.ingest(iter_analyses(1, first=1)) == 1
+    assert sorted(os.listdir(store_dir)) == ["chunk-000001", "chunk-000002"]
+
+
+def test_fail_rate_cli_reports_unknown_parameter(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exc:
+        main(["--store", str(tmp_path), "fail-rate", "No Such Parameter"])
+    assert exc.value.code == 2
+    assert "Unknown parameter: 'No Such Parameter'" in capsys.readouterr().err
@@ -0,0 +1,89 @@
+import copy
+import json
+import os
+
+import pytest
+
+from analysis_schema import parse_analysis
+from render_pool import RenderPool, parse_upload, render_report, render_upload
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def raw():
+    with open(os.path.join(ROOT, "sample_analysis_output.json"), "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = RenderPool(workers=1, fragment_dir=str(tmp_path / "fragments"))
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_recovers_after_a_worker_dies(pool, raw):
+    assert pool.submit("a", parse_upload, raw).result(timeout=60)[0]["company"]["name"]
+    for process in list(pool._executor._processes.values()):
+        process.kill()
+        process.join()
+    results = []
+    for _ in range(3):
+        job = pool.submit("a", parse_upload, raw)
+        job.wait(60)
+        results.append(job.status)
+    # A job that meets the dead worker may fail; the ones after it run on a fresh executor.
+    assert results[-1] == "done"
+    assert pool.stats()["restarts"] == 1
+
+
+def test_render_upload_returns_the_parsed_analysis(pool, raw, tmp_path):
+    result, data = pool.submit("a", render_upload, "sample.json", raw, str(tmp_path)).result(timeout=60)
+    assert result.error is None and os.path.exists(result.output)
+    assert data == parse_analysis(raw)
+
+
+def test_render_upload_reports_errors_without_data(pool, tmp_path):
+    result, data = pool.submit("a", render_upload, "bad.json", b"{", str(tmp_path)).result(timeout=60)
+    assert result.error and data is None
+
+
+def test_workers_share_rendered_fragments(raw, tmp_path):
+    data = json.loads(raw)
+    revised = copy.deepcopy(data)
+    revised["banks"]["CIMB"]["score"] = 12.5
+    first = RenderPool(workers=1, fragment_dir=str(tmp_path / "fragments"))
+    second = RenderPool(workers=1, fragment_dir=str(tmp_path / "fragments"))
+    try:
+        _, log, _ = first.submit("a", render_report, data).result(timeout=60)
+        assert not any(log.values())
+        # A different process renders the revision and reuses everything but CIMB's sections.
+        _, log, _ = second.submit("a", render_report, revised).result(timeout=60)
+    finally:
+        first.shutdown()
+        second.shutdown()
+    assert log["entities"] and log["bank:RHB"]
+    assert not log["bank:CIMB"]
+
+
+def test_fragments_are_not_reused_across_generator_versions(raw, tmp_path, monkeypatch):
+    import html_generator
+    from report_cache import ReportCache
+
+    data = json.loads(raw)
+    fragments = str(tmp_path / "fragments")
+    log = {}
+    html_generator.generate_html_report(data, fragment_cache=ReportCache(fragments), fragment_log=log)
+    assert log and not any(log.values())
+    html_generator.generate_html_report(data, fragment_cache=ReportCache(fragments), fragment_log=log)
+    assert all(log.values())
+
+    monkeypatch.setattr(html_generator, "GENERATOR_VERSION", "999.0.0")
+    log = {}
+    html_generator.generate_html_report(data, fragment_cache=ReportCache(fragments), fragment_log=log)
+    assert log and not any(log.values())
+
+    log = {}
+    html_generator.generate_html_report(data, mode="lazy", fragment_cache=ReportCache(fragments), fragment_log=log)
+    assert log and not any(log.values())
@@ -0,0 +1,63 @@
+import asyncio
+import os
+
+import pytest
+
+from render_service import RenderService, _read_response
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def body():
+    with open(os.path.join(ROOT, "sample_analysis_output.json"), "rb") as f:
+        return f.read()
+
+
+async def _request(port: int, raw: bytes):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        return await _read_response(reader)
+    finally:
+        writer.close()
+
+
+def _post(body: bytes, length: int = None) -> bytes:
+    length = len(body) if length is None else length
+    return (f"POST /render HTTP/1.1\r\nHost: test\r\nContent-Length: {length}\r\n\r\n").encode("latin-1") + body
+
+
+def _run(test):
+    async def main():
+        service = RenderService(workers=1)
+        _, port = await service.start("127.0.0.1", 0)
+        try:
+            await test(service, port)
+        finally:
+            await service.close()
+    asyncio.run(main())
+
+
+def test_negative_content_length_is_rejected(body):
+    async def test(service, port):
+        status, _, _ = await _request(port, _post(b"", length=-1))
+        assert status == 400
+        status, _, html = await _request(port, _post(body))
+        assert status == 200 and html.startswith(b"<!DOCTYPE")
+    _run(test)
+
+
+def test_pool_is_replaced_after_a_worker_dies(body):
+    async def test(service, port):
+        assert (await _request(port, _post(body)))[0] == 200
+        for process in list(service._pool._processes.values()):
+            process.kill()
+            process.join()
+        statuses = [(await _request(port, _post(body)))[0] for _ in range(3)]
+        # The request that finds the pool broken gets 503; later ones render on the new pool.
+        assert statuses[-1] == 200
+        assert set(statuses) <= {200, 503}
+        assert service.health()["pool_restarts"] == 1
+    _run(test)
@@ -0,0 +1,154 @@
+"""Shared report assets: minification, compression, and reports that link them.
+
+The minified stylesheet and scripts are pinned in ``tests/golden/`` next to
+the reports, along with the sample report rendered with ``assets_url``.
+Regenerate them only when the output is meant to change:
+
+    KREDITLAB_UPDATE_GOLDEN=1 python -m pytest tests/test_report_assets.py
+"""
+
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from html_generator import LAZY_REPORT_JS_FILE, REPORT_CSS_FILE, REPORT_JS_FILE, generate_html_report
+from report_assets import asset_contents, compress_file, minify_css, minify_js, write_assets
+
+from conftest import ROOT
+
+GOLDEN_DIR = os.path.join(ROOT, "tests", "golden")
+
+# Golden names leave out the generator version, so a version bump alone does not touch them.
+ASSET_GOLDEN = {
+    REPORT_CSS_FILE: "assets.min.css",
+    REPORT_JS_FILE: "assets.min.js",
+    LAZY_REPORT_JS_FILE: "assets.lazy.min.js",
+}
+
+
+@pytest.fixture(scope="module")
+def sample():
+    with open(os.path.join(ROOT, "sample_analysis_output.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _golden(name, text):
+    path = os.path.join(GOLDEN_DIR, name)
+    if os.environ.get("KREDITLAB_UPDATE_GOLDEN"):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+# =============================================================================
+# MINIFICATION
+# =============================================================================
+
+@pytest.mark.parametrize("name", ASSET_GOLDEN)
+def test_minified_asset_matches_golden(name):
+    content = asset_contents()[name]
+    assert content == _golden(ASSET_GOLDEN[name], content)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+@pytest.mark.parametrize("name", [REPORT_JS_FILE, LAZY_REPORT_JS_FILE])
+def test_minified_script_is_valid_javascript(name, tmp_path):
+    path = tmp_path / "asset.js"
+    path.write_text(asset_contents()[name], encoding="utf-8")
+    result = subprocess.run(["node", "--check", str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_minify_keeps_strings_and_drops_comments():
+    script = 'var a = 1; // first\nvar b = "x // y"; /* note */ var c = \'/* z */\';'
+    assert minify_js(script) == 'var a=1;var b="x // y";var c=\'/* z */\';'
+    assert minify_css("a > b { color: red; /* x */ }") == "a>b{color:red}"
+
+
+def test_minify_line_comment_does_not_swallow_the_next_line():
+    assert minify_js("var a = 1 // one\nvar b = 2") == "var a=1\nvar b=2"
+
+
+def test_minify_keeps_line_breaks_that_end_statements():
+    assert minify_js("var a = b\nreturn\nx") == "var a=b\nreturn\nx"
+
+
+@pytest.mark.parametrize("source", ['var a = "oops', "var a = 'it\\'s", "a { } /* open"])
+def test_minify_rejects_unterminated_input(source):
+    with pytest.raises(ValueError, match="unterminated"):
+        minify_js(source)
+
+
+# =============================================================================
+# LINKED REPORTS
+# =============================================================================
+
+@pytest.mark.parametrize("mode", ["static", "lazy"])
+def test_linked_report_matches_golden(sample, mode):
+    html = generate_html_report(sample, mode=mode, assets_url="assets")
+    name = "sample.linked.html" if mode == "static" else "sample.linked.lazy.html"
+    assert html == _golden(name, html)
+
+
+@pytest.mark.parametrize("mode", ["static", "lazy"])
+def test_linked_report_references_written_assets(sample, mode, tmp_path):
+    written = {os.path.basename(p) for p in write_assets(str(tmp_path / "assets"))}
+    html = generate_html_report(sample, mode=mode, assets_url="assets")
+    linked = set(re.findall(r'"assets/([^"]+)"', html))
+    assert linked <= written
+    script = LAZY_REPORT_JS_FILE if mode == "lazy" else REPORT_JS_FILE
+    assert linked == {REPORT_CSS_FILE, script}
+    assert "<style>" not in html and "function showBank" not in html
+
+
+# =============================================================================
+# COMPRESSION AND WRITING
+# =============================================================================
+
+def test_compress_file_gzip_round_trip(sample, tmp_path):
+    path = tmp_path / "report.html"
+    payload = generate_html_report(sample).encode("utf-8")
+    path.write_bytes(payload)
+
+    written = compress_file(str(path), ["gzip"])
+
+    assert written == [(str(path), len(payload)), (str(path) + ".gz", os.path.getsize(str(path) + ".gz"))]
+    with gzip.open(str(path) + ".gz", "rb") as f:
+        assert f.read() == payload
+    # mtime=0: the same input always compresses to the same bytes.
+    first = (tmp_path / "report.html.gz").read_bytes()
+    compress_file(str(path), ["gzip"])
+    assert (tmp_path / "report.html.gz").read_bytes() == first
+
+
+def test_compress_file_can_drop_the_original(tmp_path):
+    path = tmp_path / "report.html"
+    path.write_bytes(b"<html></html>")
+    written = compress_file(str(path), ["gzip"], keep_original=False)
+    assert [p for p, _ in written] == [str(path) + ".gz"]
+    assert not path.exists()
+    assert gzip.decompress((tmp_path / "report.html.gz").read_bytes()) == b"<html></html>"
+
+
+def test_write_assets_writes_each_asset_once(tmp_path):
+    directory = tmp_path / "assets"
+    paths = write_assets(str(directory), ["gzip"])
+
+    contents = asset_contents()
+    assert sorted(os.path.basename(p) for p in paths) == sorted(contents)
+    for path in paths:
+        name = os.path.basename(path)
+        assert open(path, encoding="utf-8").read() == contents[name]
+        assert gzip.decompress(open(path + ".gz", "rb").read()).decode("utf-8") == contents[name]
+    assert not [n for n in os.listdir(directory) if n.endswith(".tmp")]
+
+    # Versioned names never change content, so an existing file is left alone.
+    (directory / REPORT_CSS_FILE).write_text("kept", encoding="utf-8")
+    write_assets(str(directory))
+    assert (directory / REPORT_CSS_FILE).read_text(encoding="utf-8") == "kept"
@@ -0,0 +1,32 @@
+import os
+import time
+
+from report_cache import ReportCache
+
+
+def _disk_total(cache):
+    return sum(size for _, _, size in cache._scan())
+
+
+def test_overwriting_a_key_counts_its_size_once(tmp_path):
+    cache = ReportCache(str(tmp_path))
+    for html in ("<p>first</p>", "<p>second, longer</p>", "<p>3</p>"):
+        cache._write_disk("ab" * 20, html)
+    assert cache.stats()["disk_bytes"] == _disk_total(cache) == len("<p>3</p>")
+
+
+def test_expired_entries_leave_the_disk_total(tmp_path):
+    cache = ReportCache(str(tmp_path), max_age_seconds=60)
+    cache._write_disk("cd" * 20, "<p>old</p>")
+    cache._write_disk("ef" * 20, "<p>kept</p>")
+    old = time.time() - 3600
+    os.utime(cache.path_for("cd" * 20), (old, old))
+    assert cache._read_disk("cd" * 20) is None
+    assert cache.stats()["disk_bytes"] == _disk_total(cache) == len("<p>kept</p>")
+
+
+def test_clear_resets_the_disk_total(tmp_path):
+    cache = ReportCache(str(tmp_path))
+    cache.put("12" * 20, "<p>report</p>")
+    cache.clear()
+    assert cache.stats()["disk_bytes"] == 0
@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from scoring import DEFAULT_RULES, ScoringRules, find_discrepancies, score_analysis
+
+SAMPLE = os.path.join(ROOT, "sample_analysis_output.json")
+
+# Computed by the default rules; the sample's own stated numbers differ (see README).
+EXPECTED_SCORES = {
+    "RHB": (90.5, "A", "D"),
+    "Maybank": (95.0, "A", "A"),
+    "CIMB": (88.7, "A", "D"),
+    "Standard Chartered": (89.0, "A", "D"),
+    "SME Bank": (92.0, "A", "A"),
+    "Bank Rakyat": (92.0, "A", "A"),
+}
+
+
+@pytest.fixture
+def sample():
+    with open(SAMPLE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _grades(block):
+    return block["score"], block["raw_grade"], block["final_grade"]
+
+
+def test_sample_scores_are_pinned(sample):
+    result = score_analysis(sample)
+    assert {bank: _grades(b) for bank, b in result["banks"].items()} == EXPECTED_SCORES
+    assert _grades(result["consolidated"]) == (91.2, "A", "D")
+    assert result["consolidated"]["strict2_pass"] == 41
+    assert result["consolidated"]["strict2_total"] == 44
+
+
+def test_sample_discrepancies_are_pinned(sample):
+    (problems,) = find_discrepancies([sample])
+    flagged_banks = {p.split(":")[0] for p in problems}
+    assert flagged_banks == set(EXPECTED_SCORES) | {"Consolidated"}
+    assert "Maybank: score stated 82.0, computed 95.0" in problems
+    assert "RHB: final_grade stated 'B', computed 'D'" in problems
+
+
+def test_custom_rules_change_grades(sample):
+    strict = ScoringRules.from_dict({"grade_thresholds": {"A": 95, "B": 90, "C": 85, "D": 80}})
+    result = score_analysis(sample, strict)
+    assert _grades(result["banks"]["Maybank"]) == (95.0, "A", "A")
+    assert _grades(result["banks"]["SME Bank"]) == (92.0, "B", "B")
+    assert _grades(result["banks"]["CIMB"]) == (88.7, "C", "D")
+
+
+def test_custom_weights_and_empty_rate(sample):
+    rules = ScoringRules.from_dict({"weights": {"strict1": 0.0, "strict2": 0.5, "preference": 0.5},
+                                    "empty_category_rate": 0})
+    maybank = score_analysis(sample, rules)["banks"]["Maybank"]
+    assert maybank["score"] == pytest.approx(0.5 * 100 + 0.5 * 7 / 8 * 100, abs=0.05)
+
+
+def test_from_dict_keeps_defaults():
+    assert ScoringRules.from_dict({}) == DEFAULT_RULES
+
+
+@pytest.mark.parametrize("rules", [
+    {"weights": {"strict3": 0.1}},
+    {"grade_thresholds": {"Z": 10}},
+])
+def test_invalid_rules_rejected(rules):
+    with pytest.raises(ValueError):
+        ScoringRules.from_dict(rules)
+
+
+def test_cli_rules_file(tmp_path):
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps({"grade_thresholds": {"A": 99}}), encoding="utf-8")
+    out = subprocess.run([sys.executable, "scoring.py", SAMPLE, "--rules", str(rules)],
+                         cwd=ROOT, capture_output=True, text=True)
+    assert "Maybank: raw_grade stated 'A', computed 'E'" in out.stdout
+
+
+def test_cli_skips_invalid_entries_and_keeps_going(tmp_path, sample):
+    jsonl = tmp_path / "batch.jsonl"
+    jsonl.write_text("\n".join([json.dumps(sample), "{not json", json.dumps({"banks": []}),
+                                json.dumps(sample)]) + "\n", encoding="utf-8")
+    out = subprocess.run([sys.executable, "scoring.py", str(jsonl)], cwd=ROOT, capture_output=True, text=True)
+    assert out.returncode == 1
+    assert f"Skipped {jsonl}:2: JSONDecodeError" in out.stderr
+    assert f"Skipped {jsonl}:3: " in out.stderr
+    assert "Scored 2 analyses" in out.stdout
+    assert "(2 invalid entries skipped)" in out.stdout
+    assert f"⚠️  {jsonl}:4" in out.stdout
@@ -0,0 +1,83 @@
+import os
+import threading
+
+from search_index import SearchIndex
+from synthetic_data import iter_analyses, make_analysis
+
+
+def _segment_dirs(index):
+    return sorted(n for n in os.listdir(index.directory) if n.startswith("seg-"))
+
+
+def test_merges_are_tiered(tmp_path):
+    index = SearchIndex(str(tmp_path), merge_factor=4)
+    rewrites = 0
+    for data in iter_analyses(40, seed=1):
+        before = {seg.path for seg in index._segments}
+        index.ingest([data])
+        rewrites += len(before - {seg.path for seg in index._segments})
+    assert len(index) == 40
+    # Merging everything once past a segment cap would rewrite far more than this.
+    assert rewrites < 40 * 3
+    assert index.stats()["segments"] < 8
+    assert len(SearchIndex(str(tmp_path))) == 40
+
+
+def test_search_keeps_merged_segments_until_it_finishes(tmp_path):
+    index = SearchIndex(str(tmp_path), merge_factor=2)
+    index.ingest([make_analysis(seed=1)])
+    pinned = index._acquire()
+    index.ingest([make_analysis(seed=2)])
+    assert all(seg.retired for seg in pinned)
+    # The retired segment is renamed, not loaded by a new index, and still readable here.
+    assert len(SearchIndex(str(tmp_path))) == 2
+    assert pinned[0].text(0)
+    index._release(pinned)
+    assert not any(n.endswith(".old") for n in _segment_dirs(index))
+
+
+def test_concurrent_search_and_merge(tmp_path):
+    index = SearchIndex(str(tmp_path), merge_factor=2)
+    index.ingest([make_analysis(seed=0)])
+    errors = []
+    done = threading.Event()
+
+    def search():
+        while not done.is_set():
+            try:
+                index.search("arrears")
+            except Exception as exc:
+                errors.append(exc)
+
+    readers = [threading.Thread(target=search) for _ in range(3)]
+    for t in readers:
+        t.start()
+    for data in iter_analyses(30, seed=5):
+        index.ingest([data])
+    done.set()
+    for t in readers:
+        t.join()
+    assert errors == []
+
+
+def test_concurrent_ingest_of_same_analysis_is_deduplicated(tmp_path):
+    index = SearchIndex(str(tmp_path))
+    data = make_analysis(seed=3)
+    counts = []
+    threads = [threading.Thread(target=lambda: counts.append(index.ingest([data]))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(counts) == [0] * 7 + [1]
+    assert len(index) == 1
+
+
+def test_half_written_segment_does_not_block_ingest(tmp_path):
+    os.makedirs(tmp_path / "seg-000001.tmp")
+    index = SearchIndex(str(tmp_path))
+    assert index.ingest([make_analysis(seed=4)]) == 1
+    os.makedirs(tmp_path / "seg-000002.tmp")
+    assert index.ingest([make_analysis(seed=5)]) == 1
+    assert len(SearchIndex(str(tmp_path))) == 2
+    assert not any(n.endswith(".tmp") for n in _segment_dirs(index))